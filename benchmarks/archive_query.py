@@ -0,0 +1,98 @@
+import asyncio
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+from obspy import UTCDateTime, read
+
+from src.server.archive_reader import ArchiveReader
+from src.server.seismometer import MSEED_FILES_DIRECTORY
+from src.server.stream_manager import StreamManager, NOMINAL_SAMPLING_RATE, archive_file_path
+
+SEISMOMETER_ID = 'vertical_pendulum'
+UPLOAD_INTERVAL = 4
+BATCH_SIZE = NOMINAL_SAMPLING_RATE * UPLOAD_INTERVAL
+# Batches are flushed to file once a minute, as the server does
+BATCHES_PER_FLUSH = 60 // UPLOAD_INTERVAL
+POINTS = 2000
+REPEATS = 20
+
+
+async def _write_day(directory: Path, midnight: float) -> None:
+    stream_manager = StreamManager(directory)
+    await stream_manager.get_wrapped_stream()
+    rng = numpy.random.default_rng(0)
+    for index in range(24 * 60 * 60 // UPLOAD_INTERVAL):
+        # An outage between 10:00 and 10:30 leaves a gap in the file
+        if 10 * 60 * 60 <= index * UPLOAD_INTERVAL < 10.5 * 60 * 60:
+            continue
+        values = rng.normal(0, 200, BATCH_SIZE).astype('int16')
+        await stream_manager.append_values(values, midnight + index * UPLOAD_INTERVAL, NOMINAL_SAMPLING_RATE)
+        if index % BATCHES_PER_FLUSH == 0:
+            await stream_manager.save_to_file()
+    await stream_manager.save_to_file()
+
+
+def _reference_min_max(stream, starttime: UTCDateTime, sample_count: int, bucket_count: int) -> tuple:
+    bucket_size = -(-sample_count // bucket_count)
+    minimum = numpy.full(-(-sample_count // bucket_size), numpy.inf)
+    maximum = numpy.full(len(minimum), -numpy.inf)
+    for trace in stream:
+        positions = numpy.arange(len(trace.data)) + round((trace.stats.starttime - starttime) * NOMINAL_SAMPLING_RATE)
+        inside = (positions >= 0) & (positions < sample_count)
+        values = trace.data[inside].astype('float64')
+        numpy.minimum.at(minimum, positions[inside] // bucket_size, values)
+        numpy.maximum.at(maximum, positions[inside] // bucket_size, values)
+    return [None if numpy.isinf(value) else value for value in minimum.tolist()], \
+        [None if numpy.isinf(value) else value for value in maximum.tolist()]
+
+
+def _time_ms(function, repeats: int = 1) -> float:
+    t1 = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - t1) / repeats * 1000
+
+
+if __name__ == "__main__":
+    directory = Path(tempfile.mkdtemp())
+    mseed_directory = directory / SEISMOMETER_ID / MSEED_FILES_DIRECTORY
+    mseed_directory.mkdir(parents=True)
+    starttime = UTCDateTime(UTCDateTime().date)
+    endtime = starttime + 24 * 60 * 60
+    asyncio.run(_write_day(mseed_directory, starttime.timestamp))
+    file_path = archive_file_path(mseed_directory, starttime.date)
+    int16_file = io.BytesIO()
+    read(str(file_path), dtype='int16').write(int16_file, format='MSEED', reclen=512, encoding='INT16')
+    print('Day file of %.1f MB, %.1f MB in INT16 records' % (file_path.stat().st_size / 1e6,
+                                                            len(int16_file.getvalue()) / 1e6))
+
+    def obspy_query() -> tuple:
+        # The baseline, a full decode of the day followed by the same downsampling
+        return _reference_min_max(read(str(file_path), dtype='int16'), starttime,
+                                  round((endtime - starttime) * NOMINAL_SAMPLING_RATE), POINTS // 2)
+
+    reader = ArchiveReader(directory)
+    print('obspy.read and downsample:   %7.2f ms' % _time_ms(obspy_query, 3))
+    print('First query, index built:    %7.2f ms' %
+          _time_ms(lambda: reader.query(SEISMOMETER_ID, starttime, endtime, POINTS)))
+
+    def uncached_query() -> None:
+        reader._messages.clear()
+        reader.query(SEISMOMETER_ID, starttime, endtime, POINTS)
+
+    print('Query, index kept:           %7.2f ms' % _time_ms(uncached_query, REPEATS))
+    print('Query, answer cached:        %7.2f ms' %
+          _time_ms(lambda: reader.query(SEISMOMETER_ID, starttime, endtime, POINTS), REPEATS))
+    hour = starttime + 9.75 * 60 * 60
+    print('One hour across the gap:     %7.2f ms' %
+          _time_ms(lambda: reader.query(SEISMOMETER_ID, hour, hour + 60 * 60, POINTS)))
+
+    message = json.loads(reader.query(SEISMOMETER_ID, starttime, endtime, POINTS))
+    minimum, maximum = obspy_query()
+    print('Same envelope as obspy: %s, %d of %d buckets empty' %
+          (message['min'] == minimum and message['max'] == maximum,
+           message['min'].count(None), len(message['min'])))
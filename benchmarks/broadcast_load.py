@@ -0,0 +1,66 @@
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+import numpy
+
+from src.server.broadcaster import Broadcaster
+
+SEISMOMETER_ID = 'benchmark'
+WEB_CLIENTS = 3000
+SLOW_CLIENT_FRACTION = 0.05
+BATCHES = 50
+BATCH_INTERVAL = 0.1
+
+
+class SimulatedWebClient(object):
+    send_delay: float
+    latencies: List[float]
+
+    def __init__(self, send_delay: float):
+        self.send_delay = send_delay
+        self.latencies = []
+
+    async def send(self, message: str) -> None:
+        await asyncio.sleep(self.send_delay)
+        self.latencies.append(time.perf_counter() - json.loads(message)['sent_at'])
+
+    async def close(self) -> None:
+        pass
+
+
+async def _main() -> None:
+    broadcaster = Broadcaster()
+    rng = random.Random(0)
+    clients = []
+    for _ in range(WEB_CLIENTS):
+        # A few clients are far slower than the batch interval and will have messages dropped
+        slow = rng.random() < SLOW_CLIENT_FRACTION
+        client = SimulatedWebClient(2.0 if slow else rng.uniform(0, 0.005))
+        clients.append(client)
+        broadcaster.subscribe(SEISMOMETER_ID, client)
+
+    values = list(range(120))
+    publish_latencies = []
+    for _ in range(BATCHES):
+        t1 = time.perf_counter()
+        message = json.dumps({'type': 'data', 'values': values, 'stats': {}, 'sent_at': t1})
+        broadcaster.publish(SEISMOMETER_ID, message)
+        publish_latencies.append(time.perf_counter() - t1)
+        await asyncio.sleep(BATCH_INTERVAL)
+    await asyncio.sleep(1)
+
+    fast_latencies = numpy.concatenate([c.latencies for c in clients if c.send_delay < 1]) * 1000
+    dropped = sum(s.dropped_messages for s in broadcaster.subscribers[SEISMOMETER_ID].values())
+    publish_latencies = numpy.array(publish_latencies) * 1000
+    print('clients: %d, batches: %d' % (WEB_CLIENTS, BATCHES))
+    print('ingest publish: median %.2f ms, max %.2f ms' % (numpy.median(publish_latencies), publish_latencies.max()))
+    print('delivery to fast clients: median %.2f ms, p99 %.2f ms' %
+          (numpy.median(fast_latencies), numpy.percentile(fast_latencies, 99)))
+    print('messages dropped for slow clients:', dropped)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,24 @@
+import queue
+
+from src.client.adc_config import AdcConfig
+from src.client.adc_wrapper import AdcWrapper
+from src.client.data_box import DataBox
+from src.client.data_sampler import DataSampler
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+
+SAMPLING_RATES = [750, 1500, 3000]
+BATCH_SECONDS = 2
+
+if __name__ == "__main__":
+    print('rate   actual    missed  deadline_p99_us  interval_p99_us  interval_max_us')
+    for sampling_rate in SAMPLING_RATES:
+        data_queue = queue.Queue()
+        adc = AdcWrapper(AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, mock_adc=True))
+        data_sampler = DataSampler(adc, data_queue, DataBox(sampling_rate * BATCH_SECONDS), 8, sampling_rate)
+        data_sampler.sample_batch()
+        data = data_queue.get()
+        stats = data.timing_stats
+        print('%-6d %-9.2f %-7d %-16.1f %-16.1f %.1f' % (sampling_rate, data.actual_sampling_rate,
+                                                        stats['missed_slots'], stats['deadline_error_p99_us'],
+                                                        stats['interval_error_p99_us'],
+                                                        stats['interval_error_max_us']))
@@ -0,0 +1,78 @@
+import time
+
+import numpy
+from scipy import signal
+
+from src.client.data_filter_config import DataFilterConfig
+from src.client.decimating_filter import DecimatingFilter
+
+SAMPLING_RATE = 750
+UPLOAD_INTERVAL = 4
+CHUNKS = 150
+REPEATS = 5
+FILTER_CUTOFF_FREQ = 6
+FILTER_ORDER = 8
+DECIMATED_SAMPLING_RATES = [150, 75, 30, 10]
+
+
+class _PreviousFilter(object):
+    # The Butterworth filter in (b, a) form run at the full rate, then every Mth sample kept
+    def __init__(self, filter_config: DataFilterConfig, decimation_factor: int):
+        self.b, self.a = signal.butter(filter_config.filter_order, filter_config.filter_cutoff_freq,
+                                       fs=filter_config.data_sampling_freq, btype='low', analog=False)
+        self.decimation_factor = decimation_factor
+        self.zi = None
+
+    def process(self, data: numpy.ndarray) -> numpy.ndarray:
+        if self.zi is None:
+            self.zi = signal.lfilter_zi(self.b, self.a) * data[0]
+        filtered_data, self.zi = signal.lfilter(self.b, self.a, data, zi=self.zi)
+        return filtered_data[::self.decimation_factor]
+
+
+class _ReferenceFilter(_PreviousFilter):
+    # The same filter as second-order sections, numerically sound but just as much work
+    def __init__(self, filter_config: DataFilterConfig, decimation_factor: int):
+        super().__init__(filter_config, decimation_factor)
+        self.sos = signal.butter(filter_config.filter_order, filter_config.filter_cutoff_freq,
+                                 fs=filter_config.data_sampling_freq, btype='low', output='sos')
+
+    def process(self, data: numpy.ndarray) -> numpy.ndarray:
+        if self.zi is None:
+            self.zi = signal.sosfilt_zi(self.sos) * data[0]
+        filtered_data, self.zi = signal.sosfilt(self.sos, data, zi=self.zi)
+        return filtered_data[::self.decimation_factor]
+
+
+def _run(filter_class, filter_config: DataFilterConfig, decimation_factor: int, chunks: numpy.ndarray):
+    cpu_per_chunk = []
+    for _ in range(REPEATS):
+        data_filter = filter_class(filter_config, decimation_factor)
+        outputs = []
+        t1 = time.process_time()
+        for chunk in chunks:
+            outputs.append(data_filter.process(chunk))
+        cpu_per_chunk.append((time.process_time() - t1) / len(chunks) * 1_000_000)
+    return numpy.concatenate(outputs), min(cpu_per_chunk)
+
+
+if __name__ == "__main__":
+    rng = numpy.random.default_rng(0)
+    t = numpy.arange(SAMPLING_RATE * UPLOAD_INTERVAL * CHUNKS) / SAMPLING_RATE
+    values = numpy.rint(16000 + 800 * numpy.sin(2 * numpy.pi * 1.3 * t) + rng.normal(0, 200, len(t)))
+    chunks = values.reshape(CHUNKS, -1)
+    filter_config = DataFilterConfig(filter_enabled=True, data_sampling_freq=SAMPLING_RATE,
+                                     filter_cutoff_freq=FILTER_CUTOFF_FREQ, filter_order=FILTER_ORDER)
+
+    print('%d Hz chunks of %d samples, Butterworth order %d at %d Hz' %
+          (SAMPLING_RATE, chunks.shape[1], FILTER_ORDER, FILTER_CUTOFF_FREQ))
+    print('%8s %14s %14s %14s %16s %16s' % ('output', 'previous us', 'sos us', 'decimating us',
+                                             'max diff prev', 'max diff sos'))
+    for decimated_sampling_rate in DECIMATED_SAMPLING_RATES:
+        decimation_factor = SAMPLING_RATE // decimated_sampling_rate
+        previous, previous_us = _run(_PreviousFilter, filter_config, decimation_factor, chunks)
+        reference, reference_us = _run(_ReferenceFilter, filter_config, decimation_factor, chunks)
+        decimated, decimated_us = _run(DecimatingFilter, filter_config, decimation_factor, chunks)
+        print('%6d Hz %14.0f %14.0f %14.0f %16.3g %16.3g' %
+              (decimated_sampling_rate, previous_us, reference_us, decimated_us,
+               numpy.abs(decimated - previous).max(), numpy.abs(decimated - reference).max()))
@@ -0,0 +1,104 @@
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+from benchmarks.uplink_format import logger_frames
+from src.server.history_cache import HistoryCache, HISTORY_CACHE_SECONDS
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+from src.shared.downlink_frame import DownlinkFrame, DOWNLINK_FORMATS, Message
+
+# The logger's upload interval of 4 s
+BATCH_SIZE = 4 * NOMINAL_SAMPLING_RATE
+BATCHES = 450
+HISTORY_MESSAGES = 20
+# A minute of the logger's batches, their stats are sent on in turn
+LOGGER_BATCHES = 15
+
+
+def _logger_stats() -> List[Dict[str, Any]]:
+    # The stats as the server forwards them to the web clients, without the logger's metrics summary
+    stats = [frame.stats for frame in logger_frames(LOGGER_BATCHES)]
+    for batch_stats in stats:
+        batch_stats.pop('metrics', None)
+    return stats
+
+
+def _samples(count: int) -> numpy.ndarray:
+    # Slowly varying ground motion in the noise, as the seismometers record between quakes
+    rng = numpy.random.default_rng(0)
+    t = numpy.arange(count) / NOMINAL_SAMPLING_RATE
+    return (numpy.sin(2 * numpy.pi * 0.05 * t) * 400 + numpy.sin(2 * numpy.pi * 0.7 * t) * 60 +
+            rng.normal(0, 12, count)).astype('int16')
+
+
+def _deflate() -> PerMessageDeflate:
+    # The settings websockets negotiates by default, the context is kept between the messages of a connection
+    return PerMessageDeflate(False, False, 12, 12, {'memLevel': 5})
+
+
+def _deflated_size(deflate: PerMessageDeflate, message: Message) -> int:
+    if isinstance(message, str):
+        return len(deflate.encode(Frame(Opcode.TEXT, message.encode())).data)
+    return len(deflate.encode(Frame(Opcode.BINARY, message)).data)
+
+
+def _timed(function: Callable[[], Message], times: List[float]) -> Message:
+    t1 = time.perf_counter()
+    message = function()
+    times.append(time.perf_counter() - t1)
+    return message
+
+
+def _measure(downlink_format: str, batches: List[numpy.ndarray], stats: List[Dict[str, Any]],
+             history_cache: HistoryCache) -> Dict[str, Tuple[float, ...]]:
+    encode_times: List[float] = []
+    deflate_times: List[float] = []
+    sizes: List[int] = []
+    deflated_sizes: List[int] = []
+    deflate = _deflate()
+    for index, values in enumerate(batches):
+        batch_stats = stats[index % len(stats)]
+        message = _timed(lambda: DownlinkFrame(values, batch_stats).encode(downlink_format), encode_times)
+        t1 = time.perf_counter()
+        deflated_sizes.append(_deflated_size(deflate, message))
+        deflate_times.append(time.perf_counter() - t1)
+        sizes.append(len(message))
+        # The reference decoder gives back the samples
+        assert numpy.array_equal(DownlinkFrame.decode(message).values, values)
+
+    history_times: List[float] = []
+    for _ in range(HISTORY_MESSAGES):
+        history_cache.invalidate()
+        history = _timed(lambda: history_cache.get_message(HISTORY_CACHE_SECONDS, downlink_format=downlink_format),
+                         history_times)
+    t1 = time.perf_counter()
+    history_deflated = _deflated_size(_deflate(), history)
+    history_deflate_time = time.perf_counter() - t1
+    assert numpy.array_equal(DownlinkFrame.decode(history).values, history_cache.last_seconds(HISTORY_CACHE_SECONDS))
+
+    return {
+        'batch': (numpy.mean(sizes), numpy.mean(deflated_sizes), numpy.median(encode_times) * 1e6,
+                  numpy.median(deflate_times) * 1e6),
+        'history': (len(history), history_deflated, numpy.median(history_times) * 1e6, history_deflate_time * 1e6)
+    }
+
+
+if __name__ == "__main__":
+    samples = _samples(BATCHES * BATCH_SIZE)
+    batches = list(samples.reshape(-1, BATCH_SIZE))
+    stats = _logger_stats()
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE)
+    history_cache.append(samples[-HISTORY_CACHE_SECONDS * NOMINAL_SAMPLING_RATE:], stats[-1])
+
+    results = {downlink_format: _measure(downlink_format, batches, stats, history_cache)
+               for downlink_format in DOWNLINK_FORMATS}
+    for name, description in [('batch', '%d samples a batch, mean of %d' % (BATCH_SIZE, BATCHES)),
+                              ('history', '%d s history message' % HISTORY_CACHE_SECONDS)]:
+        print(description)
+        print('%-8s %10s %14s %12s %14s' % ('format', 'bytes', 'deflate_bytes', 'encode_us', 'deflate_us'))
+        for downlink_format, result in results.items():
+            size, deflated, encode_us, deflate_us = result[name]
+            print('%-8s %10.0f %14.0f %12.1f %14.1f' % (downlink_format, size, deflated, encode_us, deflate_us))
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy
+import websockets
+from obspy import UTCDateTime
+
+from src.client.data_filter_config import DataFilterConfig
+from src.client.data_processor import DataProcessor
+from src.client.data_uploader import DataUploader
+from src.client.data_uploader_data import DataUploaderData
+from src.client.decimating_filter import DecimatingFilter
+from src.client.streaming_statistics import StreamingStatistics
+from src.server.archive_reader import ArchiveReader
+from src.server.plot_executor import PlotExecutor
+from src.server.seismometer import Seismometer
+from src.server.server_request_handler import ServerRequestHandler, AuthenticatingWebSocket, WS_CLIENT_PATH, \
+    WS_DATA_LOGGER_PATH, DEFAULT_PLOT_WORKERS
+from src.shared.Constants import SEISMOMETER_IDS
+from src.shared.uplink_frame import UPLINK_FORMAT_BINARY
+
+PORT = 8766
+AUTH_TOKEN = 'benchmark'
+SAMPLING_RATE = 750
+DECIMATED_SAMPLING_RATE = 30
+UPLOAD_INTERVAL = 4
+TICK_INTERVAL = 0.01
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = numpy.array(values) * 1000
+    return {'p50_ms': float(numpy.percentile(values, 50)), 'p90_ms': float(numpy.percentile(values, 90)),
+            'p99_ms': float(numpy.percentile(values, 99)), 'max_ms': float(values.max()), 'count': len(values)}
+
+
+def _cpu_seconds(pid: str) -> float:
+    with open('/proc/%s/stat' % pid) as file:
+        fields = file.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def _child_pids() -> List[str]:
+    pids = []
+    for task in Path('/proc/self/task').iterdir():
+        pids.extend((task / 'children').read_text().split())
+    return pids
+
+
+def _memory_kb(pid: str = 'self') -> Dict[str, int]:
+    with open('/proc/%s/status' % pid) as file:
+        fields = dict(line.split(':', 1) for line in file)
+    return {key: int(fields[key].split()[0]) for key in ['VmRSS', 'VmHWM']}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class SimulatedLogger(object):
+    # The logger's own processing and frame format, fed with a MockAdc-like sine and some noise
+    seismometer_id: str
+    uploader: DataUploader
+    rng: numpy.random.Generator
+    starttime: float
+    batches_sent: int
+
+    def __init__(self, seismometer_id: str, seed: int):
+        statistics = StreamingStatistics(75, invalid_value=-1)
+        filter_config = DataFilterConfig(filter_enabled=True, data_sampling_freq=SAMPLING_RATE,
+                                         filter_cutoff_freq=6, filter_order=8)
+        data_processor = DataProcessor(SAMPLING_RATE, DECIMATED_SAMPLING_RATE, statistics, False,
+                                       DecimatingFilter(filter_config, SAMPLING_RATE // DECIMATED_SAMPLING_RATE))
+        self.seismometer_id = seismometer_id
+        self.uploader = DataUploader(None, None, data_processor, statistics, 2 ** 15, SAMPLING_RATE,
+                                     DECIMATED_SAMPLING_RATE, UPLINK_FORMAT_BINARY, None)
+        self.rng = numpy.random.default_rng(seed)
+        # Batches are timestamped from midnight, so sped up runs stay within the day
+        self.starttime = UTCDateTime(UTCDateTime().date).timestamp
+        self.batches_sent = 0
+
+    def next_frame(self) -> bytes:
+        t = self.batches_sent * UPLOAD_INTERVAL + numpy.arange(SAMPLING_RATE * UPLOAD_INTERVAL) / SAMPLING_RATE
+        values = numpy.rint(numpy.sin(2 * t) * 100 + self.rng.normal(0, 5, len(t))).astype(numpy.int64)
+        data = DataUploaderData(values=values, bias_point=None, actual_sampling_rate=SAMPLING_RATE,
+                                start_time=self.starttime + self.batches_sent * UPLOAD_INTERVAL,
+                                timing_stats={'sent_at': time.monotonic()})
+        self.batches_sent += 1
+        return self.uploader._create_frame(data).to_bytes()
+
+
+async def _run_logger(logger: SimulatedLogger, interval: float, deadline: float) -> None:
+    uri = 'ws://localhost:%d%s?seismometer_id=%s' % (PORT, WS_DATA_LOGGER_PATH, logger.seismometer_id)
+    async with websockets.connect(uri, extra_headers={'Authorization': AUTH_TOKEN}, max_size=None) as ws:
+        next_send = time.monotonic()
+        while time.monotonic() < deadline:
+            await ws.send(logger.next_frame())
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+
+async def _run_web_client(seismometer_id: str, deadline: float, latencies: List[float]) -> int:
+    uri = 'ws://localhost:%d%s?seismometer_id=%s&history_length=30' % (PORT, WS_CLIENT_PATH, seismometer_id)
+    received = 0
+    async with websockets.connect(uri, max_size=None) as ws:
+        while True:
+            try:
+                message = await asyncio.wait_for(ws.recv(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                return received
+            data = json.loads(message)
+            sent_at = (data.get('stats') or {}).get('sent_at')
+            # The history message sent on connect carries an old timestamp and isn't a delivery
+            if data.get('type') == 'data' and sent_at is not None and received > 0:
+                latencies.append(time.monotonic() - sent_at)
+            received += 1
+
+
+async def _run_load(seismometer_ids: List[str], web_clients: int, duration: float,
+                    interval: float) -> Dict[str, Any]:
+    deadline = time.monotonic() + duration
+    latencies: List[float] = []
+    clients = [asyncio.ensure_future(_run_web_client(seismometer_ids[index % len(seismometer_ids)],
+                                                     deadline + 1, latencies))
+               for index in range(web_clients)]
+    # Web clients connect first, so the first logger messages already have an audience
+    await asyncio.sleep(1)
+    loggers = [SimulatedLogger(seismometer_id, index) for index, seismometer_id in enumerate(seismometer_ids)]
+    await asyncio.gather(*[_run_logger(logger, interval, deadline) for logger in loggers])
+    received = await asyncio.gather(*clients)
+    return {'latencies': latencies, 'logger_messages': sum(logger.batches_sent for logger in loggers),
+            'client_messages': sum(received)}
+
+
+def run_load_process(seismometer_ids: List[str], web_clients: int, duration: float, interval: float,
+                     connection: Connection) -> None:
+    connection.send(asyncio.run(_run_load(seismometer_ids, web_clients, duration, interval)))
+    connection.close()
+
+
+class InstrumentedServer(object):
+    # The server's request handler, with timings taken around the steps a regression would show up in
+    handler: ServerRequestHandler
+    ingest_times: List[float]
+    minute_save_times: List[float]
+    loop_stalls: List[float]
+
+    def __init__(self, seismometer_ids: List[str], directory: Path, plot_workers: int):
+        self.handler = ServerRequestHandler()
+        self.handler._create_broadcaster()
+        self.handler.plot_executor = PlotExecutor(plot_workers)
+        self.handler.archive_reader = ArchiveReader(directory)
+        self.handler.seismometers = {}
+        self.ingest_times = []
+        self.minute_save_times = []
+        self.loop_stalls = []
+        for seismometer_id in seismometer_ids:
+            seismometer = Seismometer(seismometer_id, directory / seismometer_id, self.handler.plot_executor)
+            seismometer.create_folders()
+            seismometer.save_plots_and_mseed = self._timed_save(seismometer)
+            self.handler.seismometers[seismometer_id] = seismometer
+        self.handler.handle_data = self._timed(self.handler.handle_data, self.ingest_times)
+
+    @staticmethod
+    def _timed(function, times: List[float]):
+        async def timed(*args):
+            t1 = time.perf_counter()
+            await function(*args)
+            times.append(time.perf_counter() - t1)
+        return timed
+
+    def _timed_save(self, seismometer: Seismometer):
+        save_plots_and_mseed = seismometer.save_plots_and_mseed
+
+        async def timed() -> None:
+            # Only the calls that crossed into a new minute render plots and flush to file
+            last_saved_minute = seismometer.last_saved_minute
+            t1 = time.perf_counter()
+            await save_plots_and_mseed()
+            if seismometer.last_saved_minute != last_saved_minute:
+                self.minute_save_times.append(time.perf_counter() - t1)
+        return timed
+
+    async def measure_loop_stalls(self, until: asyncio.Future) -> None:
+        while not until.done():
+            t1 = time.perf_counter()
+            await asyncio.sleep(TICK_INTERVAL)
+            self.loop_stalls.append(time.perf_counter() - t1 - TICK_INTERVAL)
+
+
+async def _main(arguments: argparse.Namespace, directory: Path) -> Dict[str, Any]:
+    os.environ['AUTH_TOKEN'] = AUTH_TOKEN
+    seismometer_ids = ['benchmark_%d' % index for index in range(arguments.loggers)]
+    # Registered like the configured seismometers, so the server accepts them
+    SEISMOMETER_IDS.extend(seismometer_ids)
+    server = InstrumentedServer(seismometer_ids, directory, arguments.plot_workers)
+    ws_server = await websockets.serve(server.handler.socket_handler, 'localhost', PORT,
+                                       create_protocol=AuthenticatingWebSocket,
+                                       process_request=server.handler.process_http_request, max_size=None)
+    for seismometer in server.handler.seismometers.values():
+        await seismometer.get_history_cache()
+
+    context = multiprocessing.get_context('spawn')
+    connection, load_connection = context.Pipe(duplex=False)
+    load_process = context.Process(target=run_load_process,
+                                   args=(seismometer_ids, arguments.web_clients, arguments.duration,
+                                         arguments.interval, load_connection))
+    cpu_before = _cpu_seconds('self')
+    load_process.start()
+    load_connection.close()
+
+    result = asyncio.get_event_loop().run_in_executor(None, connection.recv)
+    stall_measurement = asyncio.ensure_future(server.measure_loop_stalls(result))
+    t1 = time.monotonic()
+    load = await result
+    elapsed = time.monotonic() - t1
+    await stall_measurement
+    server_cpu = _cpu_seconds('self') - cpu_before
+    plot_worker_cpu = sum(_cpu_seconds(pid) for pid in _child_pids() if pid != str(load_process.pid))
+    memory = _memory_kb()
+
+    load_process.join()
+    ws_server.close()
+    await ws_server.wait_closed()
+    server.handler.plot_executor.shutdown()
+
+    return {
+        'revision': _git_revision(),
+        'time': UTCDateTime().isoformat(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'config': vars(arguments),
+        'elapsed_s': elapsed,
+        'logger_messages_per_s': load['logger_messages'] / elapsed,
+        'client_messages_per_s': load['client_messages'] / elapsed,
+        'ingest_to_client_latency': _percentiles(load['latencies']),
+        'server_ingest_time': _percentiles(server.ingest_times),
+        'minute_save_time': _percentiles(server.minute_save_times),
+        'event_loop_stall': _percentiles(server.loop_stalls),
+        'server_cpu_percent': 100 * server_cpu / elapsed,
+        'plot_workers_cpu_s': plot_worker_cpu,
+        'server_rss_kb': memory['VmRSS'],
+        'server_peak_rss_kb': memory['VmHWM']
+    }
+
+
+def _print_summary(result: Dict[str, Any]) -> None:
+    print('%s loggers, %s web clients, %.0f s' % (result['config']['loggers'], result['config']['web_clients'],
+                                                  result['elapsed_s']))
+    print('logger messages/s %.1f, client messages/s %.1f' % (result['logger_messages_per_s'],
+                                                             result['client_messages_per_s']))
+    for key in ['ingest_to_client_latency', 'server_ingest_time', 'minute_save_time', 'event_loop_stall']:
+        percentiles = result[key]
+        if percentiles:
+            print('%-26s p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms  max %8.2f ms  (%d)' % (
+                key, percentiles['p50_ms'], percentiles['p90_ms'], percentiles['p99_ms'], percentiles['max_ms'],
+                percentiles['count']))
+    print('server CPU %.1f %%, plot workers %.1f CPU s, RSS %d kB, peak RSS %d kB' % (
+        result['server_cpu_percent'], result['plot_workers_cpu_s'], result['server_rss_kb'],
+        result['server_peak_rss_kb']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='End to end load and latency benchmark of the server')
+    parser.add_argument('--loggers', type=int, default=2)
+    parser.add_argument('--web-clients', type=int, default=100)
+    # Long enough to cross at least one minute boundary, when plots are rendered and data is flushed
+    parser.add_argument('--duration', type=float, default=130)
+    parser.add_argument('--interval', type=float, default=UPLOAD_INTERVAL,
+                        help='seconds between messages of each logger, below %d runs faster than real time'
+                             % UPLOAD_INTERVAL)
+    parser.add_argument('--plot-workers', type=int, default=DEFAULT_PLOT_WORKERS)
+    parser.add_argument('--json', help='file to append the results to, one JSON object per line')
+    arguments = parser.parse_args()
+
+    # The server's per client prints and the tracebacks of closing clients would drown the results
+    logging.getLogger('websockets').setLevel(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        result = asyncio.run(_main(arguments, Path(directory)))
+    _print_summary(result)
+    if arguments.json:
+        with open(arguments.json, 'a') as file:
+            file.write(json.dumps(result) + '\n')
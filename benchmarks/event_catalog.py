@@ -0,0 +1,86 @@
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy
+from obspy import Catalog, UTCDateTime
+from obspy.core.event import Event, Magnitude, Origin
+
+from src.server.event_catalog import EventCatalog, FileCatalogSource, CATALOG_QUERIES
+
+EVENTS = 2000
+DAYS = 3
+SERVICE_DELAY = 2.0
+TICK_INTERVAL = 0.01
+
+
+def _write_quakeml(path: Path, now: UTCDateTime) -> None:
+    # Events spread over the last days, a few near Sweden and the rest anywhere
+    rng = numpy.random.default_rng(0)
+    events = []
+    for index in range(EVENTS):
+        near = index % 4 == 0
+        origin = Origin(time=now - float(rng.uniform(0, DAYS * 24 * 60 * 60)),
+                        latitude=float(rng.uniform(50, 68) if near else rng.uniform(-60, 60)),
+                        longitude=float(rng.uniform(5, 30) if near else rng.uniform(-180, 180)))
+        magnitude = Magnitude(mag=float(rng.uniform(1, 5.9) if near else rng.uniform(4, 8)))
+        events.append(Event(origins=[origin], magnitudes=[magnitude]))
+    Catalog(events).write(str(path), format='QUAKEML')
+
+
+async def _longest_stall(work: Callable[[], None]) -> float:
+    # The longest the event loop went without running a tick while the work was going on
+    stalls: List[float] = []
+
+    async def ticker() -> None:
+        while True:
+            t1 = time.perf_counter()
+            await asyncio.sleep(TICK_INTERVAL)
+            stalls.append(time.perf_counter() - t1 - TICK_INTERVAL)
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(TICK_INTERVAL * 2)
+    await work()
+    await asyncio.sleep(TICK_INTERVAL * 2)
+    task.cancel()
+    return max(stalls)
+
+
+async def _main(directory: Path) -> None:
+    now = UTCDateTime()
+    _write_quakeml(directory / 'events.xml', now)
+    source = FileCatalogSource(directory / 'events.xml', SERVICE_DELAY)
+    day_start = UTCDateTime(now.date) - 24 * 60 * 60
+    day_end = day_start + 24 * 60 * 60
+
+    async def fetch_in_loop() -> None:
+        # What the day plot used to do, every query synchronous when the plot is made
+        catalog = Catalog()
+        for query in CATALOG_QUERIES.values():
+            catalog += source.get_events(starttime=day_start, endtime=day_end, **query)
+
+    catalog = EventCatalog(directory / 'catalog', source)
+
+    async def refresh_in_background() -> None:
+        await asyncio.get_event_loop().run_in_executor(None, catalog.refresh, now)
+
+    print('stand-in service answering in %.1f s' % SERVICE_DELAY)
+    print('event loop stall, synchronous fetch:   %8.1f ms' % (await _longest_stall(fetch_in_loop) * 1000))
+    print('event loop stall, background refresh:  %8.1f ms' % (await _longest_stall(refresh_in_background) * 1000))
+
+    t1 = time.perf_counter()
+    refreshed = catalog.refresh(now + 60)
+    print('refresh within the TTL:                %8.1f ms, queried %s' % ((time.perf_counter() - t1) * 1000,
+                                                                            refreshed))
+
+    t1 = time.perf_counter()
+    events = EventCatalog(directory / 'catalog').get_events(day_start, day_end)
+    print('day plot catalog read from disk:       %8.1f ms, %d events' % ((time.perf_counter() - t1) * 1000,
+                                                                          len(events)))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_main(Path(directory)))
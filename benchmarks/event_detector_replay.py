@@ -0,0 +1,41 @@
+import time
+
+import numpy
+
+from src.server.event_detector import EventDetector, DETECTOR_RECURSIVE, DETECTOR_CLASSIC
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE, SAMPLES_PER_DAY
+
+BATCH_SIZE = NOMINAL_SAMPLING_RATE * 4
+EVENT_INTERVAL_SECONDS = 2 * 60 * 60
+
+
+def _synthetic_day() -> numpy.ndarray:
+    rng = numpy.random.default_rng(0)
+    t = numpy.arange(SAMPLES_PER_DAY) / NOMINAL_SAMPLING_RATE
+    values = 16000 + rng.normal(0, 20, SAMPLES_PER_DAY) + 30 * numpy.sin(2 * numpy.pi * t / 7)
+    # A decaying burst every two hours
+    for start in range(EVENT_INTERVAL_SECONDS, 24 * 60 * 60, EVENT_INTERVAL_SECONDS):
+        burst = numpy.arange(60 * NOMINAL_SAMPLING_RATE)
+        index = start * NOMINAL_SAMPLING_RATE
+        values[index:index + len(burst)] += 400 * numpy.exp(-burst / (10 * NOMINAL_SAMPLING_RATE)) * \
+            numpy.sin(2 * numpy.pi * 2 * burst / NOMINAL_SAMPLING_RATE)
+    return values.astype('int16')
+
+
+if __name__ == "__main__":
+    values = _synthetic_day()
+    starttime = time.time()
+    for method in [DETECTOR_RECURSIVE, DETECTOR_CLASSIC]:
+        event_detector = EventDetector(NOMINAL_SAMPLING_RATE, method)
+        batch_times = []
+        events = []
+        for index in range(0, len(values), BATCH_SIZE):
+            t1 = time.perf_counter()
+            events += event_detector.process(values[index:index + BATCH_SIZE],
+                                             starttime + index / NOMINAL_SAMPLING_RATE)
+            batch_times.append(time.perf_counter() - t1)
+        batch_times = numpy.array(batch_times)
+        hours = batch_times.reshape(24, -1).sum(axis=1)
+        print('%-9s %6.0fx real time, %.1f us per batch, first/last hour %.3f/%.3f s, %d events' %
+              (method, 24 * 60 * 60 / batch_times.sum(), numpy.median(batch_times) * 1e6,
+               hours[0], hours[-1], len(events)))
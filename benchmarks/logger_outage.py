@@ -0,0 +1,192 @@
+import asyncio
+import queue
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy
+import websocket
+import websockets
+from obspy import UTCDateTime, read
+
+from src.client.data_filter_config import DataFilterConfig
+from src.client.data_processor import DataProcessor
+from src.client.data_uploader import DataUploader
+from src.client.data_uploader_data import DataUploaderData
+from src.client.decimating_filter import DecimatingFilter
+from src.client.spool import Spool
+from src.client.streaming_statistics import StreamingStatistics
+from src.server.plot_executor import PlotExecutor
+from src.server.seismometer import Seismometer, MSEED_FILES_DIRECTORY
+from src.server.server_request_handler import ServerRequestHandler
+from src.server.stream_manager import archive_file_path
+from src.shared.uplink_frame import UplinkFrame, UPLINK_FORMAT_BINARY, UPLINK_FLAG_REPLAY
+
+PORT = 8765
+SEISMOMETER_ID = 'benchmark'
+SAMPLING_RATE = 750
+DECIMATED_SAMPLING_RATE = 30
+UPLOAD_INTERVAL = 4
+OUTAGE_HOURS = 24
+LIVE_BATCHES = 50
+# Live batches are fed ten times faster than real time while the backlog drains
+LIVE_BATCH_INTERVAL = UPLOAD_INTERVAL / 10
+REPLAY_INTERVAL = 0.1
+
+
+class LoggerServer(object):
+    # The server's request handler and storage behind a websocket that can be taken down
+    directory: Path
+    frames: List[UplinkFrame]
+    loop: asyncio.AbstractEventLoop
+    server: Optional[websockets.WebSocketServer]
+    handler: Optional[ServerRequestHandler]
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.frames = []
+        self.server = None
+        self.handler = None
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    async def _handler(self, ws, path: str) -> None:
+        async for message in ws:
+            self.frames.append(UplinkFrame.from_bytes(message))
+            await self.handler.handle_logger_message(SEISMOMETER_ID, message)
+
+    async def _start(self) -> None:
+        if self.handler is None:
+            self.handler = ServerRequestHandler()
+            self.handler._create_broadcaster()
+            self.handler.plot_executor = PlotExecutor(1)
+            seismometer = Seismometer(SEISMOMETER_ID, self.directory / SEISMOMETER_ID, self.handler.plot_executor)
+            seismometer.create_folders()
+            self.handler.seismometers = {SEISMOMETER_ID: seismometer}
+        self.server = await websockets.serve(self._handler, 'localhost', PORT)
+
+    async def _flush(self) -> None:
+        await self.handler.seismometers[SEISMOMETER_ID].stream_manager.save_to_file()
+
+    async def _stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    def start(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+
+    def archived_samples(self, starttime: UTCDateTime, count: int) -> numpy.ndarray:
+        # What the server wrote to the day files, -1 where a sample is missing
+        asyncio.run_coroutine_threadsafe(self._flush(), self.loop).result()
+        archived = numpy.full(count, -1, dtype='int32')
+        mseed_directory = self.directory / SEISMOMETER_ID / MSEED_FILES_DIRECTORY
+        day = UTCDateTime(starttime.date)
+        while day < starttime + count / DECIMATED_SAMPLING_RATE:
+            if archive_file_path(mseed_directory, day.date).exists():
+                for trace in read(str(archive_file_path(mseed_directory, day.date))):
+                    index = round((trace.stats.starttime - starttime) * DECIMATED_SAMPLING_RATE)
+                    archived[max(index, 0):index + trace.stats.npts] = trace.data[max(-index, 0):]
+            day += 24 * 60 * 60
+        return archived
+
+
+def _memory_kb() -> Dict[str, int]:
+    with open('/proc/self/status') as file:
+        fields = dict(line.split(':', 1) for line in file)
+    return {key: int(fields[key].split()[0]) for key in ['RssAnon', 'RssFile']}
+
+
+def _wait_for(condition, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    server = LoggerServer(Path(tempfile.mkdtemp()))
+    server.start()
+
+    chunk_size = SAMPLING_RATE * UPLOAD_INTERVAL
+    decimation_factor = SAMPLING_RATE // DECIMATED_SAMPLING_RATE
+    statistics = StreamingStatistics(75, invalid_value=-1)
+    filter_config = DataFilterConfig(filter_enabled=True, data_sampling_freq=SAMPLING_RATE,
+                                     filter_cutoff_freq=6, filter_order=8)
+    data_processor = DataProcessor(SAMPLING_RATE, DECIMATED_SAMPLING_RATE, statistics, False,
+                                   DecimatingFilter(filter_config, decimation_factor))
+    data_queue = queue.Queue()
+    spool = Spool(Path(tempfile.mkdtemp()))
+    ws = websocket.WebSocketApp('ws://localhost:%d/' % PORT)
+    uploader = DataUploader(ws, data_queue, data_processor, statistics, 2 ** 15, SAMPLING_RATE,
+                            DECIMATED_SAMPLING_RATE, UPLINK_FORMAT_BINARY, spool, replay_interval=REPLAY_INTERVAL)
+    ws.on_open = lambda _: uploader.on_connection_opened()
+    ws.on_reconnect = lambda _: uploader.on_connection_opened()
+    ws.on_error = lambda _, error: uploader.on_connection_closed()
+    threading.Thread(target=uploader.run, daemon=True).start()
+    threading.Thread(target=uploader.run_sender, daemon=True).start()
+    threading.Thread(target=ws.run_forever, kwargs={'reconnect': 1}, daemon=True).start()
+    _wait_for(uploader.connected.is_set, 10)
+
+    rng = numpy.random.default_rng(0)
+    starttime = time.time() - OUTAGE_HOURS * 60 * 60
+    batches_sent = 0
+
+    def feed_batch() -> None:
+        global batches_sent
+        values = numpy.rint(16000 + rng.normal(0, 200, chunk_size)).astype(numpy.int64)
+        data_queue.put(DataUploaderData(values=values, bias_point=None, actual_sampling_rate=SAMPLING_RATE,
+                                        start_time=starttime + batches_sent * UPLOAD_INTERVAL, timing_stats={}))
+        batches_sent += 1
+
+    for _ in range(LIVE_BATCHES):
+        feed_batch()
+    _wait_for(lambda: len(server.frames) == LIVE_BATCHES, 10)
+
+    server.stop()
+    outage_batches = OUTAGE_HOURS * 60 * 60 // UPLOAD_INTERVAL
+    memory = [_memory_kb()]
+    t1 = time.perf_counter()
+    for index in range(outage_batches):
+        feed_batch()
+        # Like the sampler, hand over one batch at a time
+        data_queue.join()
+        if index % (outage_batches // 8) == 0:
+            memory.append(_memory_kb())
+    memory.append(_memory_kb())
+    print('%d h outage, %d batches processed and spooled in %.1f s' %
+          (OUTAGE_HOURS, outage_batches, time.perf_counter() - t1))
+    print('RssAnon kB during outage: %s' % [m['RssAnon'] for m in memory])
+    print('RssFile kB during outage: %s' % [m['RssFile'] for m in memory])
+
+    server.start()
+    t1 = time.perf_counter()
+    while not (spool.is_empty() and uploader.outbox.empty() and data_queue.empty()):
+        feed_batch()
+        time.sleep(LIVE_BATCH_INTERVAL)
+    _wait_for(lambda: sum(len(frame.values) for frame in server.frames) ==
+              batches_sent * chunk_size // decimation_factor, 10)
+    print('Backlog replayed in %.1f s while live batches kept arriving' % (time.perf_counter() - t1))
+
+    replay_frames = [frame for frame in server.frames if frame.flags & UPLINK_FLAG_REPLAY]
+    frames = sorted(server.frames, key=lambda frame: frame.starttime)
+    gaps = [b.starttime - (a.starttime + len(a.values) / a.sampling_rate) for a, b in zip(frames, frames[1:])]
+    print('%d frames received, %d of them replay frames holding %d samples' %
+          (len(server.frames), len(replay_frames), sum(len(frame.values) for frame in replay_frames)))
+    print('%d of %d samples received, largest gap or overlap %.3g s' %
+          (sum(len(frame.values) for frame in server.frames), batches_sent * chunk_size // decimation_factor,
+           max(abs(gap) for gap in gaps)))
+
+    # The outage spans midnight, the backlog from the day before has to end up in that day's file
+    sample_count = batches_sent * chunk_size // decimation_factor
+    archived = server.archived_samples(UTCDateTime(starttime), sample_count)
+    expected = numpy.concatenate([frame.values for frame in frames])
+    print('%d of %d samples archived by the server over %s, %d differ from those sent' %
+          ((archived != -1).sum(), sample_count, ' and '.join(sorted({str(UTCDateTime(starttime).date),
+                                                                      str(UTCDateTime().date)})),
+           (archived != expected).sum()))
@@ -0,0 +1,89 @@
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import matplotlib.image
+import numpy
+from obspy import UTCDateTime
+
+from src.server.stream_manager import StreamManager, NOMINAL_SAMPLING_RATE, SAMPLES_PER_DAY
+from src.server.stream_plotter import render_waveform_plot, IMAGE_SIZE_HOURLY, OUTFILE_DPI, IMAGE_FORMAT, \
+    _save_atomically
+from src.server.trace_snapshot import TraceSnapshot
+
+MINUTES = 60
+PLOTS = [('last_10_minutes', 10), ('last_60_minutes', 60)]
+
+
+def _previous_render(snapshot: TraceSnapshot, image_file_path: Path, figure_key: str, color: str,
+                     starttime: UTCDateTime, endtime: UTCDateTime) -> None:
+    # A new figure from Stream.plot for every image
+    stream = snapshot.to_stream()
+    _save_atomically(image_file_path, lambda outfile: stream.plot(
+        color=color,
+        size=IMAGE_SIZE_HOURLY,
+        dpi=OUTFILE_DPI,
+        outfile=outfile,
+        format=IMAGE_FORMAT,
+        starttime=starttime,
+        endtime=endtime))
+
+
+def _peak_rss_kb() -> int:
+    with open('/proc/self/status') as file:
+        fields = dict(line.split(':', 1) for line in file)
+    return int(fields['VmHWM'].split()[0])
+
+
+async def _render_minutes(directory: Path, persistent: bool) -> Dict[str, Any]:
+    render = render_waveform_plot if persistent else _previous_render
+    stream_manager = StreamManager(directory / 'mseed')
+    stream = await stream_manager.get_wrapped_stream()
+    t = numpy.arange(SAMPLES_PER_DAY) / NOMINAL_SAMPLING_RATE
+    noise = numpy.random.default_rng(0).normal(0, 20, SAMPLES_PER_DAY)
+    await stream_manager.append_values((numpy.sin(2 * t) * 100 + noise).astype('int16'),
+                                       UTCDateTime(UTCDateTime().date).timestamp, NOMINAL_SAMPLING_RATE)
+    last_endtime = stream[0].stats.endtime
+
+    # The first minute pays for imports, fonts and building the figures, it is reported on its own
+    minute_times = []
+    for minute in range(MINUTES + 1):
+        endtime = last_endtime - (MINUTES - minute) * 60
+        t1 = time.perf_counter()
+        for name, minutes in PLOTS:
+            snapshot = TraceSnapshot.from_lod_pyramid(stream, stream_manager.lod_pyramid, IMAGE_SIZE_HOURLY[0],
+                                                      endtime - minutes * 60, endtime)
+            render(snapshot, directory / (name + '.png'), str(directory / name), 'black',
+                   endtime - minutes * 60, endtime)
+        minute_times.append(time.perf_counter() - t1)
+    return {'first_minute_s': minute_times[0], 'minute_s': minute_times[1:], 'peak_rss_kb': _peak_rss_kb(),
+            'images': {name: matplotlib.image.imread(directory / (name + '.png')) for name, _ in PLOTS}}
+
+
+def _run(directory: str, persistent: bool) -> Dict[str, Any]:
+    return asyncio.run(_render_minutes(Path(directory), persistent))
+
+
+if __name__ == "__main__":
+    # Every path runs in a fresh process, so the peak memory of one doesn't hide in the other's
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name, persistent in [('stream.plot', False), ('persistent', True)]:
+        with tempfile.TemporaryDirectory() as directory, context.Pool(1) as pool:
+            results[name] = pool.apply(_run, (directory, persistent))
+
+    print('%d minutes of %s' % (MINUTES, ' and '.join(name for name, _ in PLOTS)))
+    print('%-12s %10s %10s %10s %10s %14s' % ('renderer', 'first_s', 'p50_s', 'p99_s', 'max_s', 'peak_rss_kB'))
+    for name, result in results.items():
+        minute_s = numpy.array(result['minute_s'])
+        print('%-12s %10.3f %10.3f %10.3f %10.3f %14d' % (name, result['first_minute_s'],
+                                                          numpy.percentile(minute_s, 50),
+                                                          numpy.percentile(minute_s, 99), minute_s.max(),
+                                                          result['peak_rss_kb']))
+    for name, _ in PLOTS:
+        previous, persistent = results['stream.plot']['images'][name], results['persistent']['images'][name]
+        print('%s: %d of %d pixels differ' % (name, numpy.any(previous != persistent, axis=2).sum(),
+                                               previous.shape[0] * previous.shape[1]))
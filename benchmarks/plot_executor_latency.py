@@ -0,0 +1,58 @@
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+from obspy import UTCDateTime
+
+from src.server.plot_executor import PlotExecutor
+from src.server.seismometer import Seismometer
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+
+TICK_INTERVAL = 0.01
+HOURS_OF_DATA = 6
+
+
+async def _measure_loop_stalls(seismometer: Seismometer, plot_executor: PlotExecutor) -> numpy.ndarray:
+    stream = await seismometer.stream_manager.get_wrapped_stream()
+    lod_pyramid = seismometer.stream_manager.lod_pyramid
+    stalls = []
+    rendering = True
+
+    async def tick() -> None:
+        while rendering:
+            t1 = time.perf_counter()
+            await asyncio.sleep(TICK_INTERVAL)
+            stalls.append(time.perf_counter() - t1 - TICK_INTERVAL)
+
+    ticker = asyncio.ensure_future(tick())
+    await seismometer.stream_plotter.save_last_10_minutes_plot(stream, lod_pyramid)
+    await seismometer.stream_plotter.save_last_60_minutes_plot(stream, lod_pyramid)
+    await seismometer.stream_plotter.save_hour_plot(stream, lod_pyramid, 0)
+    while not plot_executor.is_idle():
+        await asyncio.sleep(TICK_INTERVAL)
+    rendering = False
+    await ticker
+    return numpy.array(stalls) * 1000
+
+
+async def _main(directory: Path) -> None:
+    plot_executor = PlotExecutor(max_workers=2)
+    seismometer = Seismometer('benchmark', directory, plot_executor)
+    seismometer.create_folders()
+    t = numpy.arange(HOURS_OF_DATA * 60 * 60 * NOMINAL_SAMPLING_RATE) / NOMINAL_SAMPLING_RATE
+    await seismometer.stream_manager.append_values((numpy.sin(2 * t) * 100).astype('int16'),
+                                                   UTCDateTime(UTCDateTime().date).timestamp, NOMINAL_SAMPLING_RATE)
+
+    # The first round pays for spawning the workers and importing obspy in them
+    await _measure_loop_stalls(seismometer, plot_executor)
+    stalls = await _measure_loop_stalls(seismometer, plot_executor)
+    print('event loop stall while rendering: median %.2f ms, max %.2f ms over %d ticks' %
+          (numpy.median(stalls), stalls.max(), len(stalls)))
+    plot_executor.shutdown()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_main(Path(directory)))
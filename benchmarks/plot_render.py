@@ -0,0 +1,56 @@
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy
+from obspy import Catalog, UTCDateTime
+
+from src.server.stream_manager import StreamManager, NOMINAL_SAMPLING_RATE, SAMPLES_PER_DAY
+from src.server.stream_plotter import render_waveform_plot, plot_day, IMAGE_SIZE_HOURLY, IMAGE_SIZE_DAY_PLOT, \
+    DAY_PLOT_LINES
+from src.server.trace_snapshot import TraceSnapshot
+
+
+def _time_render(render: Callable[[], None]) -> float:
+    t1 = time.perf_counter()
+    render()
+    return time.perf_counter() - t1
+
+
+async def _main(directory: Path) -> None:
+    stream_manager = StreamManager(directory)
+    stream = await stream_manager.get_wrapped_stream()
+    t = numpy.arange(SAMPLES_PER_DAY) / NOMINAL_SAMPLING_RATE
+    noise = numpy.random.default_rng(0).normal(0, 20, SAMPLES_PER_DAY)
+    await stream_manager.append_values((numpy.sin(2 * t) * 100 + noise).astype('int16'),
+                                       UTCDateTime(UTCDateTime().date).timestamp, NOMINAL_SAMPLING_RATE)
+
+    endtime = stream[0].stats.endtime
+    # Warm up matplotlib's font cache and imports so they don't count against the first plot
+    warm_up = TraceSnapshot.from_stream(stream, endtime - 60, endtime)
+    render_waveform_plot(warm_up, directory / 'warm_up.png', 'warm_up', 'black', endtime - 60, endtime)
+
+    print('plot               raw_s   lod_s   raw_points  lod_points')
+    for name, minutes in [('last_10_minutes', 10), ('last_60_minutes', 60), ('hour', 60)]:
+        starttime = endtime - minutes * 60
+        raw = TraceSnapshot.from_stream(stream, starttime, endtime)
+        lod = TraceSnapshot.from_lod_pyramid(stream, stream_manager.lod_pyramid, IMAGE_SIZE_HOURLY[0],
+                                             starttime, endtime)
+        raw_time = _time_render(lambda: render_waveform_plot(raw, directory / 'raw.png', name, 'black',
+                                                             starttime, endtime))
+        lod_time = _time_render(lambda: render_waveform_plot(lod, directory / 'lod.png', name, 'black',
+                                                             starttime, endtime))
+        print('%-16s %7.2f %7.2f %12d %11d' % (name, raw_time, lod_time, len(raw.data), len(lod.data)))
+
+    raw = TraceSnapshot.from_stream(stream)
+    lod = TraceSnapshot.from_lod_pyramid(stream, stream_manager.lod_pyramid, IMAGE_SIZE_DAY_PLOT[0] * DAY_PLOT_LINES)
+    raw_time = _time_render(lambda: plot_day(raw.to_stream(), Catalog(), directory / 'raw.png'))
+    lod_time = _time_render(lambda: plot_day(lod.to_stream(), Catalog(), directory / 'lod.png'))
+    print('%-16s %7.2f %7.2f %12d %11d' % ('day', raw_time, lod_time, len(raw.data), len(lod.data)))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_main(Path(directory)))
@@ -0,0 +1,99 @@
+import argparse
+import queue
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy
+from obspy import Trace, UTCDateTime
+
+from src.client.adc_wrapper import AdcWrapper
+from src.client.data_box import DataBox
+from src.client.data_processor import DataProcessor
+from src.client.data_sampler import DataSampler
+from src.client.data_uploader import DataUploader, ENCODE_SECONDS
+from src.client.decimating_filter import DecimatingFilter
+from src.client.seismometer_config import SeismometerConfig
+from src.client.spool import Spool
+from src.client.streaming_statistics import StreamingStatistics
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE, archive_file_path, write_archive_file
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+from src.shared.metrics import METRICS
+
+RECORDED_HOURS = 2
+STAGES = ['logger_adc_read_seconds', 'logger_process_seconds', 'logger_encode_seconds']
+
+
+def _write_recording(directory: Path) -> None:
+    # Filtered values around mid-scale of a 12 bit ADC times the scale factor, with a few quakes in the noise
+    rng = numpy.random.default_rng(0)
+    t = numpy.arange(RECORDED_HOURS * 3600 * NOMINAL_SAMPLING_RATE) / NOMINAL_SAMPLING_RATE
+    values = 16384 + 80 * numpy.sin(2 * numpy.pi * 0.2 * t) + rng.normal(0, 20, len(t))
+    for onset in range(600, RECORDED_HOURS * 3600, 1800):
+        after = numpy.clip(t - onset, 0, None)
+        values += (after > 0) * 3000 * numpy.exp(-after / 30) * numpy.sin(2 * numpy.pi * 1.5 * after)
+    starttime = UTCDateTime(2024, 1, 1)
+    trace = Trace(numpy.rint(values).astype(numpy.int32),
+                  header={'sampling_rate': NOMINAL_SAMPLING_RATE, 'starttime': starttime})
+    path = archive_file_path(directory, starttime.date)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_archive_file(path, [trace], False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replays a recording through the logger pipeline without a server')
+    parser.add_argument('--directory', type=Path,
+                        help='archive to replay, a synthetic recording is written when not given')
+    parser.add_argument('--speed', type=float, default=1000)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of wall clock time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        directory = args.directory
+        if directory is None:
+            directory = Path(temp_directory) / 'mseed'
+            _write_recording(directory)
+
+        config = SeismometerConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False, args.speed)
+        config.adc_config.replay_directory = directory
+        data_queue = queue.Queue()
+        statistics = StreamingStatistics(config.rolling_average_size, invalid_value=-config.scale_factor)
+        data_processor = DataProcessor(config.sampling_rate, config.decimated_sampling_rate, statistics, False,
+                                       DecimatingFilter(config.filter_config,
+                                                        config.sampling_rate // config.decimated_sampling_rate))
+        sampler = DataSampler(AdcWrapper(config.adc_config), data_queue, DataBox(config.chunk_size),
+                              config.scale_factor, config.sampling_rate, config.adc_config.block_size, args.speed)
+        uploader = DataUploader(None, data_queue, data_processor, statistics,
+                                2 ** config.adc_config.adc_bit_resolution * config.scale_factor,
+                                config.sampling_rate, config.decimated_sampling_rate, config.uplink_format,
+                                Spool(Path(temp_directory) / 'spool'))
+        threading.Thread(target=sampler.run, daemon=True).start()
+
+        # The uploader's processing and encoding, the frames are dropped instead of sent
+        batches = 0
+        sent_bytes = 0
+        t1 = time.monotonic()
+        while time.monotonic() - t1 < args.duration:
+            try:
+                data = data_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            frame = uploader._create_frame(data)
+            with ENCODE_SECONDS.time():
+                sent_bytes += len(frame.to_bytes())
+            batches += 1
+        elapsed = time.monotonic() - t1
+
+        recorded_seconds = batches * config.upload_interval
+        print('replay at %gx for %.0f s, %d batches queued behind' % (args.speed, elapsed, data_queue.qsize()))
+        print('%.0f s of recording, %.0fx real time, %.0f samples/s in, %.0f kB/s out' %
+              (recorded_seconds, recorded_seconds / elapsed, recorded_seconds * config.sampling_rate / elapsed,
+               sent_bytes / elapsed / 1000))
+        summary = METRICS.summary()
+        for stage in STAGES:
+            stage_summary = summary[stage]
+            mean = stage_summary['sum'] / stage_summary['count'] if stage_summary['count'] else 0
+            print('%-26s mean %8.3f ms  p99 < %8.3f ms  (%d)' % (stage, mean * 1000,
+                                                                 stage_summary['quantiles']['0.99'] * 1000,
+                                                                 stage_summary['count']))
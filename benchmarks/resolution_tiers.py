@@ -0,0 +1,132 @@
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy
+
+from src.server.broadcaster import Broadcaster
+from src.server.history_cache import HistoryCache
+from src.server.resolution_tiers import ResolutionTier, min_max_envelope
+from src.server.server_request_handler import ServerRequestHandler, WebClientParams
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+
+SEISMOMETER_ID = 'benchmark'
+CLIENT_COUNTS = [30, 300, 3000]
+RATES: List[Optional[int]] = [None, 10, 1]
+BATCHES = 200
+# Not a whole number of buckets of the slowest rate, so the envelopes carry samples between batches
+BATCH_SIZE = 45
+
+
+class CountingWebClient(object):
+    messages: List[str]
+
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message: str) -> None:
+        self.messages.append(message)
+
+    async def close(self) -> None:
+        pass
+
+
+def _batches() -> List[numpy.ndarray]:
+    rng = numpy.random.default_rng(0)
+    return [rng.integers(-2000, 2000, BATCH_SIZE).astype('int16') for _ in range(BATCHES)]
+
+
+def _per_client_publish(broadcaster: Broadcaster, tiers: Dict[object, ResolutionTier], values: numpy.ndarray,
+                        stats: Dict) -> None:
+    # Every subscriber reduced and encoded on its own, the cost the shared tiers avoid
+    for websocket, subscriber in broadcaster.subscribers[SEISMOMETER_ID].items():
+        if subscriber.rate is None:
+            message = json.dumps({'type': 'data', 'values': values.tolist(), 'stats': stats})
+        else:
+            tier = tiers.setdefault(websocket, ResolutionTier(NOMINAL_SAMPLING_RATE // subscriber.rate))
+            message = json.dumps({'type': 'data', 'rate': subscriber.rate,
+                                  'values': tier.envelope(values).tolist(), 'stats': stats})
+        broadcaster._enqueue(SEISMOMETER_ID, subscriber, message)
+
+
+async def _publish_times(clients: int, shared: bool) -> Dict[str, object]:
+    handler = ServerRequestHandler()
+    handler.broadcaster = Broadcaster(queue_size=BATCHES + 1)
+    handler.resolution_tiers = {}
+    web_clients = []
+    for index in range(clients):
+        web_client = CountingWebClient()
+        web_clients.append((RATES[index % len(RATES)], web_client))
+        handler.broadcaster.subscribe(SEISMOMETER_ID, web_client, rate=RATES[index % len(RATES)])
+
+    per_client_tiers: Dict[object, ResolutionTier] = {}
+    stats = {'average': 0}
+    times = []
+    for values in _batches():
+        t1 = time.perf_counter()
+        if shared:
+            await handler.publish_data_to_webclients(SEISMOMETER_ID, values, stats)
+        else:
+            _per_client_publish(handler.broadcaster, per_client_tiers, values, stats)
+        times.append(time.perf_counter() - t1)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+    for _, web_client in web_clients:
+        handler.broadcaster.unsubscribe(SEISMOMETER_ID, web_client)
+    await asyncio.sleep(0)
+
+    bytes_per_second = {}
+    for rate, web_client in web_clients[:len(RATES)]:
+        bytes_per_second[rate] = sum(len(message) for message in web_client.messages) / \
+            (BATCHES * BATCH_SIZE / NOMINAL_SAMPLING_RATE)
+    return {'times': numpy.array(times), 'bytes_per_second': bytes_per_second}
+
+
+async def _check_history_alignment() -> bool:
+    # A client subscribing mid-stream gets a history and live envelopes that together are the envelope of the samples
+    batches = _batches()
+    handler = ServerRequestHandler()
+    handler.broadcaster = Broadcaster(queue_size=BATCHES + 1)
+    handler.resolution_tiers = {}
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE)
+    first = CountingWebClient()
+    handler.broadcaster.subscribe(SEISMOMETER_ID, first, rate=1)
+    late = CountingWebClient()
+    for index, values in enumerate(batches):
+        if index == BATCHES // 2:
+            params = WebClientParams.from_query({'history_length': ['60'], 'rate': ['1']})
+            pending = handler.get_resolution_tiers(SEISMOMETER_ID).pending(params.rate)
+            handler.broadcaster.subscribe(SEISMOMETER_ID, late,
+                                          history_cache.get_message(params.history_length, params.rate, pending),
+                                          params.rate)
+        await handler.publish_data_to_webclients(SEISMOMETER_ID, values, {})
+        history_cache.append(values)
+    await asyncio.sleep(0.1)
+    for web_client in [first, late]:
+        handler.broadcaster.unsubscribe(SEISMOMETER_ID, web_client)
+    await asyncio.sleep(0)
+
+    received = numpy.concatenate([json.loads(message)['values'] for message in late.messages])
+    samples = numpy.concatenate(batches)
+    expected = min_max_envelope(samples[len(samples) % NOMINAL_SAMPLING_RATE:], NOMINAL_SAMPLING_RATE)
+    return numpy.array_equal(received, expected[-len(received):])
+
+
+async def _main() -> None:
+    print('%d batches of %d samples, clients spread over rates %s' % (BATCHES, BATCH_SIZE, RATES))
+    print('%-8s %-12s %12s %12s' % ('clients', 'reduction', 'median_ms', 'p99_ms'))
+    bytes_per_second = {}
+    for clients in CLIENT_COUNTS:
+        for name, shared in [('per client', False), ('shared', True)]:
+            result = await _publish_times(clients, shared)
+            times = result['times'] * 1000
+            print('%-8d %-12s %12.3f %12.3f' % (clients, name, numpy.median(times), numpy.percentile(times, 99)))
+            bytes_per_second = result['bytes_per_second']
+    for rate, rate_bytes in bytes_per_second.items():
+        print('rate %-6s %8.0f bytes/s per client' % ('raw' if rate is None else rate, rate_bytes))
+    print('history and live envelopes line up:', await _check_history_alignment())
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+from obspy import UTCDateTime
+
+from src.server.plot_executor import PlotExecutor
+from src.server.seismometer import Seismometer
+from src.server.server_request_handler import ServerRequestHandler
+from src.server.sharded_request_handler import ShardedServerRequestHandler
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+from src.shared.uplink_frame import UplinkFrame
+
+UPLOAD_INTERVAL = 4
+BATCH_SIZE = NOMINAL_SAMPLING_RATE * UPLOAD_INTERVAL
+# Two hours of data per seismometer
+BATCHES = 2 * 60 * 60 // UPLOAD_INTERVAL
+
+
+def _frames(count: int):
+    midnight = UTCDateTime(UTCDateTime().date).timestamp
+    rng = numpy.random.default_rng(0)
+    return [UplinkFrame(index, midnight + index * UPLOAD_INTERVAL, NOMINAL_SAMPLING_RATE,
+                        rng.normal(0, 200, BATCH_SIZE).astype('int16'), {'mean': 0}).to_bytes()
+            for index in range(count)]
+
+
+async def _run_in_process(seismometer_count: int, frames, directory: Path) -> float:
+    handler = ServerRequestHandler()
+    handler._create_broadcaster()
+    handler.seismometers = {}
+    plot_executor = PlotExecutor(1)
+    for index in range(seismometer_count):
+        seismometer_id = 'seismometer_%d' % index
+        seismometer = Seismometer(seismometer_id, directory / seismometer_id, plot_executor)
+        seismometer.create_folders()
+        handler.seismometers[seismometer_id] = seismometer
+        await seismometer.get_history_cache()
+
+    t1 = time.perf_counter()
+    for frame in frames:
+        for seismometer_id in handler.seismometers:
+            await handler.handle_logger_message(seismometer_id, frame)
+    elapsed = time.perf_counter() - t1
+    plot_executor.shutdown()
+    return elapsed
+
+
+async def _run_sharded(seismometer_count: int, frames, directory: Path) -> float:
+    handler = ShardedServerRequestHandler()
+    handler._create_broadcaster()
+    handler.workers = {}
+    loop = asyncio.get_event_loop()
+    for index in range(seismometer_count):
+        seismometer_id = 'seismometer_%d' % index
+        worker = ShardedServerRequestHandler.start_worker(seismometer_id, str(directory / seismometer_id), 1)
+        loop.add_reader(worker.connection.fileno(), handler.on_worker_message, seismometer_id)
+        handler.workers[seismometer_id] = worker
+
+    expected = len(frames) * BATCH_SIZE
+
+    async def wait_for_workers(totals) -> None:
+        while any(worker.history_cache.total < total for worker, total in zip(handler.workers.values(), totals)):
+            await asyncio.sleep(0.005)
+
+    # Wait until every worker has loaded its history, then count from there
+    await handler.handle_logger_message('seismometer_0', frames[0])
+    await wait_for_workers([BATCH_SIZE] + [0] * (seismometer_count - 1))
+    start_totals = [worker.history_cache.total for worker in handler.workers.values()]
+
+    t1 = time.perf_counter()
+    for frame in frames:
+        for seismometer_id in handler.workers:
+            await handler.handle_logger_message(seismometer_id, frame)
+        # Let the front end read the notifications as they arrive, as it would between logger messages
+        await asyncio.sleep(0)
+    await wait_for_workers([total + expected for total in start_totals])
+    elapsed = time.perf_counter() - t1
+
+    for worker in handler.workers.values():
+        loop.remove_reader(worker.connection.fileno())
+        worker.close()
+    return elapsed
+
+
+if __name__ == "__main__":
+    max_seismometers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    frames = _frames(BATCHES)
+    print('%d batches of %d samples per seismometer, %d CPUs' % (BATCHES, BATCH_SIZE, os.cpu_count()))
+    for seismometer_count in range(1, max_seismometers + 1):
+        with tempfile.TemporaryDirectory() as in_process_directory, \
+                tempfile.TemporaryDirectory() as sharded_directory:
+            in_process = asyncio.run(_run_in_process(seismometer_count, frames, Path(in_process_directory)))
+            sharded = asyncio.run(_run_sharded(seismometer_count, frames, Path(sharded_directory)))
+        total_batches = BATCHES * seismometer_count
+        print('%d seismometers: in process %6.0f batches/s, sharded %6.0f batches/s' %
+              (seismometer_count, total_batches / in_process, total_batches / sharded))
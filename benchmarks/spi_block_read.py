@@ -0,0 +1,40 @@
+import queue
+import time
+
+from src.client.adc_config import AdcConfig, SPI_BACKEND_SIMULATED
+from src.client.adc_wrapper import AdcWrapper
+from src.client.data_box import DataBox
+from src.client.data_sampler import DataSampler
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM, SEISMOMETER_ID_LEHMAN
+
+SAMPLES = 100_000
+
+if __name__ == "__main__":
+    print('adc                 per_sample_reads/s  block_reads/s')
+    for seismometer_id in [SEISMOMETER_ID_VERTICAL_PENDULUM, SEISMOMETER_ID_LEHMAN]:
+        config = AdcConfig(seismometer_id, mock_adc=False)
+        config.spi_backend = SPI_BACKEND_SIMULATED
+        adc = AdcWrapper(config)
+
+        t1 = time.perf_counter()
+        for _ in range(SAMPLES // 10):
+            adc.read_coil()
+        per_sample_rate = SAMPLES // 10 / (time.perf_counter() - t1)
+
+        t1 = time.perf_counter()
+        for _ in range(SAMPLES // config.block_size):
+            adc.read_coil_block(config.block_size, 0)
+        block_rate = SAMPLES // config.block_size * config.block_size / (time.perf_counter() - t1)
+        print('%-19s %18.0f %14.0f' % ('%d bit (%s)' % (config.adc_bit_resolution, seismometer_id),
+                                       per_sample_rate, block_rate))
+
+    # A full sampler batch through the deadline scheduler in block mode
+    config = AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, mock_adc=False)
+    config.spi_backend = SPI_BACKEND_SIMULATED
+    data_queue = queue.Queue()
+    data_sampler = DataSampler(AdcWrapper(config), data_queue, DataBox(3000), 8, 750, config.block_size)
+    t1 = time.process_time()
+    data_sampler.sample_batch()
+    data = data_queue.get()
+    print('block mode batch of 3000 at 750 Hz: actual rate %.2f Hz, CPU %.1f ms' %
+          (data.actual_sampling_rate, (time.process_time() - t1) * 1000))
@@ -0,0 +1,60 @@
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+from obspy import UTCDateTime
+
+from src.server.stream_manager import StreamManager, NOMINAL_SAMPLING_RATE
+
+UPLOAD_INTERVAL = 4
+BATCH_SIZE = NOMINAL_SAMPLING_RATE * UPLOAD_INTERVAL
+BATCHES_PER_HOUR = 60 * 60 // UPLOAD_INTERVAL
+
+
+def _synthetic_batch(index: int) -> numpy.ndarray:
+    t = numpy.arange(index * BATCH_SIZE, (index + 1) * BATCH_SIZE) / NOMINAL_SAMPLING_RATE
+    return (numpy.sin(2 * t) * 100).astype('int16')
+
+
+async def _run_stream_manager(directory: Path) -> numpy.ndarray:
+    stream_manager = StreamManager(directory)
+    await stream_manager.get_wrapped_stream()
+    midnight = UTCDateTime(UTCDateTime().date).timestamp
+    latencies = numpy.empty(24 * BATCHES_PER_HOUR)
+    for index in range(len(latencies)):
+        values = _synthetic_batch(index)
+        t1 = time.perf_counter_ns()
+        await stream_manager.append_values(values, midnight + index * UPLOAD_INTERVAL, NOMINAL_SAMPLING_RATE)
+        latencies[index] = time.perf_counter_ns() - t1
+    return latencies
+
+
+def _run_numpy_append() -> numpy.ndarray:
+    # The previous implementation, kept here as the baseline
+    data = numpy.array([], dtype='int16')
+    latencies = numpy.empty(24 * BATCHES_PER_HOUR)
+    for index in range(len(latencies)):
+        values = _synthetic_batch(index)
+        t1 = time.perf_counter_ns()
+        data = numpy.append(data, numpy.array(values, dtype='int16'))
+        latencies[index] = time.perf_counter_ns() - t1
+    return latencies
+
+
+def _print_per_hour(name: str, latencies: numpy.ndarray) -> None:
+    print(name)
+    print('hour   median_us   p99_us   max_us')
+    for hour, hour_latencies in enumerate(latencies.reshape(24, BATCHES_PER_HOUR)):
+        hour_latencies = hour_latencies / 1000
+        print('%02d:00 %11.1f %8.1f %8.1f' % (hour,
+                                              numpy.median(hour_latencies),
+                                              numpy.percentile(hour_latencies, 99),
+                                              hour_latencies.max()))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        _print_per_hour('StreamManager.append_values', asyncio.run(_run_stream_manager(Path(directory))))
+    _print_per_hour('numpy.append baseline', _run_numpy_append())
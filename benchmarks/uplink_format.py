@@ -0,0 +1,80 @@
+import json
+import queue
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy
+
+from src.client.seism_logger import SeismLogger
+from src.client.seismometer_config import SeismometerConfig
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+from src.shared.uplink_frame import UplinkFrame
+
+ITERATIONS = 5000
+# A minute of batches, the logger sends its metrics summary with one of them
+BATCHES = 15
+
+
+def _cpu_per_call(function: Callable[[], object]) -> float:
+    t1 = time.process_time()
+    for _ in range(ITERATIONS):
+        function()
+    return (time.process_time() - t1) / ITERATIONS * 1_000_000
+
+
+def _encode_json_previous(values: numpy.ndarray, stats: dict) -> str:
+    # The format sent by the logger before the binary frame existed
+    return json.dumps({'type': 'post_data', 'values': numpy.rint(values).tolist(), 'stats': stats})
+
+
+def _decode_json_previous(message: str) -> numpy.ndarray:
+    return numpy.array(json.loads(message)['values'], dtype='int16')
+
+
+def logger_frames(batches: int) -> List[UplinkFrame]:
+    # Frames as the logger builds them, from its own sampler, processor and uploader with a mocked ADC sampled on a
+    # sped up clock, so the stats hold everything a real frame carries
+    with tempfile.TemporaryDirectory() as directory:
+        config = SeismometerConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, True, 1000)
+        config.spool_directory = Path(directory)
+        logger = SeismLogger(config, None)
+        data_queue: queue.Queue = logger.data_sampler.data_queue
+        logger.data_sampler.next_deadline_ns = logger.data_sampler._now_ns()
+        frames = []
+        for _ in range(batches):
+            logger.data_sampler.sample_batch()
+            frames.append(logger.data_uploader._create_frame(data_queue.get()))
+        logger.data_uploader.spool.close()
+        return frames
+
+
+def _mean_size(frames: List[UplinkFrame], encode: Callable[[UplinkFrame], object]) -> float:
+    return float(numpy.mean([len(encode(frame)) for frame in frames]))
+
+
+if __name__ == "__main__":
+    frames = logger_frames(BATCHES)
+    # A frame without the metrics summary, as 14 of the 15 a minute are
+    frame = frames[-1]
+    values = frame.values.astype(numpy.float64)
+    json_message = frame.to_json()
+    binary_message = frame.to_bytes()
+
+    print('%d samples a batch, sizes of a batch without and with the metrics summary, and the mean over a minute'
+          % len(frame.values))
+    print('format          logger_us  server_us  bytes  with_metrics  mean_bytes')
+    print('%-14s %10.1f %10.1f %6d %13d %11.0f' % (
+        'json (before)',
+        _cpu_per_call(lambda: _encode_json_previous(values, frame.stats)),
+        _cpu_per_call(lambda: _decode_json_previous(json_message)),
+        len(_encode_json_previous(values, frame.stats)), len(_encode_json_previous(values, frames[0].stats)),
+        _mean_size(frames, lambda f: _encode_json_previous(f.values.astype(numpy.float64), f.stats))))
+    print('%-14s %10.1f %10.1f %6d %13d %11.0f' % (
+        'json', _cpu_per_call(lambda: frame.to_json()), _cpu_per_call(lambda: UplinkFrame.from_json(json_message)),
+        len(json_message), len(frames[0].to_json()), _mean_size(frames, UplinkFrame.to_json)))
+    print('%-14s %10.1f %10.1f %6d %13d %11.0f' % (
+        'binary', _cpu_per_call(lambda: frame.to_bytes()),
+        _cpu_per_call(lambda: UplinkFrame.from_bytes(binary_message)),
+        len(binary_message), len(frames[0].to_bytes()), _mean_size(frames, UplinkFrame.to_bytes)))
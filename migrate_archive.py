@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from obspy import read, Trace
+
+from src.server.seismometer import MSEED_FILES_DIRECTORY
+from src.server.server_request_handler import SEISMOMETER_FILES_DIRECTORY
+from src.server.stream_manager import archive_file_path, write_archive_file
+from src.shared.Constants import SEISMOMETER_IDS
+
+LEGACY_FILE_PATTERN = 'day_*.mseed'
+
+
+def migrate_file(directory: Path, legacy_path: Path) -> bool:
+    stream = read(str(legacy_path), dtype='int16')
+    stream.sort(['starttime'])
+
+    # A day_N file holds whichever month's day N was written last, the date is taken from its records
+    traces_by_date: Dict[object, List[Trace]] = {}
+    for trace in stream:
+        traces_by_date.setdefault(trace.stats.starttime.date, []).append(trace)
+
+    migrated = True
+    for date, traces in traces_by_date.items():
+        path = archive_file_path(directory, date)
+        if path.exists():
+            print("Skipping", legacy_path, "for", date, "since", path, "already exists")
+            migrated = False
+            continue
+
+        write_archive_file(path, traces, False)
+        written_samples = sum(trace.stats.npts for trace in read(str(path)))
+        if written_samples != sum(trace.stats.npts for trace in traces):
+            print("Sample count of", path, "doesn't match", legacy_path)
+            migrated = False
+            continue
+        print("Migrated", legacy_path, "to", path)
+    return migrated
+
+
+if __name__ == "__main__":
+    keep_legacy_files = '--keep' in sys.argv[1:]
+    for seismometer_id in SEISMOMETER_IDS:
+        mseed_directory = Path(SEISMOMETER_FILES_DIRECTORY + seismometer_id) / MSEED_FILES_DIRECTORY
+        for legacy_path in sorted(mseed_directory.glob(LEGACY_FILE_PATTERN)):
+            if migrate_file(mseed_directory, legacy_path) and not keep_legacy_files:
+                legacy_path.unlink()
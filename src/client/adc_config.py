@@ -1,7 +1,16 @@
+import os
+from pathlib import Path
 from typing import Optional
 
 from src.shared.Constants import SEISMOMETER_ID_LEHMAN, SEISMOMETER_ID_VERTICAL_PENDULUM
 
+SPI_BACKEND_BITBANG = 'bitbang'
+SPI_BACKEND_SPIDEV = 'spidev'
+SPI_BACKEND_SIMULATED = 'simulated'
+SPI_BACKENDS = [SPI_BACKEND_BITBANG, SPI_BACKEND_SPIDEV, SPI_BACKEND_SIMULATED]
+MAX_REPLAY_SPEED = 1000
+DEFAULT_SAMPLING_RATE = 750
+
 
 class AdcConfig(object):
     mock_adc: bool
@@ -12,9 +21,34 @@ class AdcConfig(object):
     MISO: int
     MOSI: int
     CS: int
+    spi_backend: str
+    spi_bus: int
+    spi_device: int
+    spi_speed_hz: int
+    block_size: int
+    # The rate the sampler reads at, replays and the simulated bus produce their samples at it
+    sampling_rate: int
+    # Recorded data is replayed instead of read from the ADC when a speed-up is given
+    replay_speed: Optional[float]
+    replay_directory: Path
+    replay_scale_factor: int
 
-    def __init__(self, seismometer_id: str, mock_adc: bool):
+    def __init__(self, seismometer_id: str, mock_adc: bool, replay_speed: Optional[float] = None,
+                 scale_factor: int = 1, sampling_rate: int = DEFAULT_SAMPLING_RATE):
         self.mock_adc = mock_adc
+        self.sampling_rate = sampling_rate
+        self.replay_speed = replay_speed
+        self.replay_directory = Path(os.environ.get('REPLAY_DIRECTORY', 'files/%s/mseed' % seismometer_id))
+        self.replay_scale_factor = scale_factor
+        # The bit-banged GPIO pins below are used unless the ADC is wired to the hardware SPI pins
+        self.spi_backend = os.environ.get('SPI_BACKEND', SPI_BACKEND_BITBANG)
+        if self.spi_backend not in SPI_BACKENDS:
+            print("Invalid SPI_BACKEND", self.spi_backend, "using", SPI_BACKEND_BITBANG)
+            self.spi_backend = SPI_BACKEND_BITBANG
+        self.spi_bus = 0
+        self.spi_device = 0
+        self.spi_speed_hz = 1_000_000
+        self.block_size = 250
         if seismometer_id == SEISMOMETER_ID_LEHMAN:
             self.bias_point_channel = None
             self.coil_input_channel = 7
@@ -3,9 +3,16 @@ import math
 from typing import Union
 
 import Adafruit_MCP3008
+from numpy.typing import NDArray
 
-from src.client.adc_config import AdcConfig
+from src.client.adc_config import AdcConfig, SPI_BACKEND_SPIDEV, SPI_BACKEND_SIMULATED
 from src.client.mcp3208 import MCP3208
+from src.client.replay_adc import ReplayAdc
+from src.client.spi_adc import SpiAdc
+from src.client.spi_bus import SpidevBus, SimulatedMcp3x08Bus
+from src.shared.metrics import METRICS
+
+INVALID_READS = METRICS.counter('logger_adc_invalid_reads_total', 'ADC reads at either end of the range')
 
 
 class MockAdc(object):
@@ -19,7 +26,7 @@ class MockAdc(object):
 
 class AdcWrapper(object):
     config: AdcConfig
-    adc: Union[Adafruit_MCP3008.MCP3008, MockAdc]
+    adc: Union[Adafruit_MCP3008.MCP3008, MockAdc, SpiAdc, ReplayAdc]
 
     def __init__(self, config: AdcConfig):
         self.config = config
@@ -28,7 +35,18 @@ class AdcWrapper(object):
             self.adc = MockAdc()
             return
 
-        if config.adc_bit_resolution == 12:
+        if config.replay_speed is not None:
+            self.adc = ReplayAdc(config.replay_directory, config.sampling_rate, config.adc_bit_resolution,
+                                 config.replay_scale_factor)
+            return
+
+        if config.spi_backend == SPI_BACKEND_SPIDEV:
+            bus = SpidevBus(config.spi_bus, config.spi_device, config.spi_speed_hz)
+            self.adc = SpiAdc(bus, config.adc_bit_resolution)
+        elif config.spi_backend == SPI_BACKEND_SIMULATED:
+            bus = SimulatedMcp3x08Bus(config.adc_bit_resolution, config.sampling_rate)
+            self.adc = SpiAdc(bus, config.adc_bit_resolution)
+        elif config.adc_bit_resolution == 12:
             self.adc = MCP3208(
                 clk=config.CLK,
                 cs=config.CS,
@@ -52,6 +70,7 @@ class AdcWrapper(object):
         value = self.adc.read_adc(channel)
         if value == 0 or value == 2 ** self.config.adc_bit_resolution - 1:
             print("Read invalid value:", value)
+            INVALID_READS.inc()
             return -1
         else:
             return value
@@ -59,5 +78,17 @@ class AdcWrapper(object):
     def read_coil(self) -> int:
         return self._read_adc(self.config.coil_input_channel)
 
+    def supports_block_read(self) -> bool:
+        return isinstance(self.adc, (SpiAdc, ReplayAdc))
+
+    def read_coil_block(self, count: int, interval_us: int) -> NDArray[int]:
+        values = self.adc.read_adc_block(self.config.coil_input_channel, count, interval_us)
+        invalid = (values == 0) | (values == 2 ** self.config.adc_bit_resolution - 1)
+        if invalid.any():
+            print("Read invalid values:", int(invalid.sum()))
+            INVALID_READS.inc(int(invalid.sum()))
+            values[invalid] = -1
+        return values
+
     def read_bias_point(self) -> int:
         return self._read_adc(self.config.bias_point_channel)
@@ -1,4 +1,5 @@
 import os
+import signal
 from typing import Optional, Callable, Any
 
 import websocket
@@ -7,15 +8,26 @@ from websocket import WebSocketApp, WebSocket
 from src.client.seism_logger import SeismometerConfig, SeismLogger
 
 
-def create_web_api_socket(seismometer_id: str, on_open: Optional[Callable[[WebSocket], None]]) -> WebSocketApp:
+RECONNECT_DELAY = 5
+PING_INTERVAL = 30
+PING_TIMEOUT = 10
+
+
+def create_web_api_socket(seismometer_id: str,
+                          on_open: Optional[Callable[[WebSocket], None]],
+                          on_disconnect: Optional[Callable[[WebSocket], None]] = None) -> WebSocketApp:
     def on_message(ws: WebSocket, message: Any):
         print(message)
 
     def on_error(ws: WebSocket, error: Any):
         print(error)
+        if on_disconnect is not None:
+            on_disconnect(ws)
 
     def on_close(ws: WebSocket, close_status_code: Any, close_msg: Any):
         print("### closed ###")
+        if on_disconnect is not None:
+            on_disconnect(ws)
 
     web_socket_url = "ws://" + os.environ.get('API_ENDPOINT') + "/ws/data-logger?seismometer_id=" + seismometer_id
     auth_token = os.environ.get('AUTH_TOKEN')
@@ -24,18 +36,25 @@ def create_web_api_socket(seismometer_id: str, on_open: Optional[Callable[[WebSo
                                 on_message=on_message,
                                 on_error=on_error,
                                 on_close=on_close,
-                                on_open=on_open)
+                                on_open=on_open,
+                                on_reconnect=on_open)
     return ws
 
 
-def start_websocket_and_logger(seismometer_id: str, mock_adc: bool) -> None:
-    config = SeismometerConfig(seismometer_id, mock_adc)
+def start_websocket_and_logger(seismometer_id: str, mock_adc: bool, replay_speed: Optional[float] = None) -> None:
+    config = SeismometerConfig(seismometer_id, mock_adc, replay_speed)
     print("starting", '\'' + seismometer_id + '\'')
 
     def on_websocket_open(ws):
         print("websocket open")
-        seism_logger = SeismLogger(config, ws)
-        seism_logger.start()
+        seism_logger.data_uploader.on_connection_opened()
+
+    def on_websocket_disconnect(ws):
+        seism_logger.data_uploader.on_connection_closed()
 
-    ws = create_web_api_socket(seismometer_id, on_websocket_open)
-    ws.run_forever()
+    ws = create_web_api_socket(seismometer_id, on_websocket_open, on_websocket_disconnect)
+    # Sampling starts right away and keeps going through outages, data is spooled until the socket is back
+    seism_logger = SeismLogger(config, ws)
+    seism_logger.start()
+    signal.signal(signal.SIGUSR1, lambda signum, frame: seism_logger.start_profile())
+    ws.run_forever(ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT, reconnect=RECONNECT_DELAY)
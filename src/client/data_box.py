@@ -1,5 +1,7 @@
 from typing import List
 
+from numpy.typing import NDArray
+
 
 class DataBox(object):
     max_size: int
@@ -14,6 +16,9 @@ class DataBox(object):
     def add(self, data_point: int) -> None:
         self.received_data.append(data_point)
 
+    def add_block(self, data_points: NDArray[int]) -> None:
+        self.received_data.extend(data_points.tolist())
+
     def is_full(self) -> bool:
         return len(self.received_data) >= self.max_size
 
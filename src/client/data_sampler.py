@@ -1,62 +1,185 @@
 import queue
 import time
+from typing import Any, Dict, Optional
+
+import numpy
+from numpy.typing import NDArray
 
 from src.client.adc_wrapper import AdcWrapper
 from src.client.data_box import DataBox
 from src.client.data_uploader_data import DataUploaderData
+from src.shared.metrics import METRICS
+
+# How far behind the schedule the sampler may fall and still catch up by reading back to back
+MAX_CATCH_UP_SLOTS = 8
+TIMING_HISTOGRAM_BINS_US = [0, 50, 100, 250, 500, 1000, 2500, 10000]
+ADC_READ_SECONDS = METRICS.histogram('logger_adc_read_seconds', 'Time taken by one ADC read or block read')
+MISSED_SLOTS = METRICS.counter('logger_missed_slots_total', 'Sampling slots missed and held at the previous value')
 
 
 class DataSampler(object):
     data_queue: queue.Queue[DataUploaderData]
     target_sampling_rate: int
-    actual_sampling_rate: int
-    sleep_time: float
+    actual_sampling_rate: float
+    period_ns: int
+    next_deadline_ns: int
+    missed_slots: int
     adc: AdcWrapper
     data_box: DataBox
     scale_factor: int
+    block_size: int
+    # Replays run the sampling clock this many times faster than real time
+    replay_speed: Optional[float]
+    _clock_start_ns: int
+    _read_times_ns: NDArray
+    _deadlines_ns: NDArray
+    _wall_clock_offset_ns: int
 
     def __init__(self,
                  adc: AdcWrapper,
                  data_queue: queue.Queue[DataUploaderData],
                  data_box: DataBox,
                  scale_factor: int,
-                 sampling_rate: int):
+                 sampling_rate: int,
+                 block_size: int = 1,
+                 replay_speed: Optional[float] = None):
         self.data_queue = data_queue
         self.target_sampling_rate = sampling_rate
-        self.sleep_time = 1 / (sampling_rate / 0.5)
+        self.actual_sampling_rate = sampling_rate
+        self.period_ns = 1_000_000_000 // sampling_rate
+        self.replay_speed = replay_speed
+        self._clock_start_ns = time.monotonic_ns()
+        self.next_deadline_ns = self._clock_start_ns
+        self.missed_slots = 0
         self.adc = adc
         self.data_box = data_box
         self.scale_factor = scale_factor
+        self.block_size = block_size
+        self._read_times_ns = numpy.zeros(data_box.max_size, dtype=numpy.int64)
+        self._deadlines_ns = numpy.zeros(data_box.max_size, dtype=numpy.int64)
+        # Deadlines are kept on the monotonic clock, this maps them to wall clock time for the timestamps
+        self._wall_clock_offset_ns = time.time_ns() - time.monotonic_ns()
+        METRICS.gauge('logger_data_queue_depth', 'Batches sampled but not yet processed', data_queue.qsize)
+
+    def _now_ns(self) -> int:
+        if self.replay_speed is None:
+            return time.monotonic_ns()
+        return self._clock_start_ns + int((time.monotonic_ns() - self._clock_start_ns) * self.replay_speed)
+
+    def _wait_for_next_deadline(self) -> int:
+        remaining_ns = self.next_deadline_ns - self._now_ns()
+        if remaining_ns > 0:
+            time.sleep(remaining_ns / 1_000_000_000 / (self.replay_speed or 1))
+            return 0
+
+        slots_behind = -remaining_ns // self.period_ns
+        # A replay that falls behind reads back to back until it has caught up, no recorded sample is skipped
+        if slots_behind > MAX_CATCH_UP_SLOTS and self.replay_speed is None:
+            # Too far behind to catch up by reading back to back
+            return slots_behind
+        return 0
+
+    def _add_value(self, index: int, value: int, read_time_ns: int) -> None:
+        self._deadlines_ns[index] = self.next_deadline_ns
+        self._read_times_ns[index] = read_time_ns
+        self.data_box.add(value)
+        self.next_deadline_ns += self.period_ns
+
+    def _hold_missed_slots(self, index: int, missed_slots: int, value: Optional[int]) -> int:
+        self.missed_slots += missed_slots
+        MISSED_SLOTS.inc(missed_slots)
+        if value is None:
+            self.next_deadline_ns += missed_slots * self.period_ns
+            return index
+
+        # Missed slots hold the previous value so the batch stays on the sampling grid
+        for _ in range(min(missed_slots, self.data_box.max_size - index)):
+            self._add_value(index, value, self.next_deadline_ns)
+            index += 1
+        return index
 
     def _fill_data_box(self) -> None:
+        index = 0
+        value = None
         while not self.data_box.is_full():
-            value = self.adc.read_coil() * self.scale_factor
-            self.data_box.add(value)
-            time.sleep(self.sleep_time)
+            missed_slots = self._wait_for_next_deadline()
+            if missed_slots > 0:
+                index = self._hold_missed_slots(index, missed_slots, value)
+                continue
+
+            read_time_ns = self._now_ns()
+            with ADC_READ_SECONDS.time():
+                value = self.adc.read_coil() * self.scale_factor
+            self._add_value(index, value, read_time_ns)
+            index += 1
+
+    def _fill_data_box_in_blocks(self) -> None:
+        index = 0
+        value = None
+        while not self.data_box.is_full():
+            missed_slots = self._wait_for_next_deadline()
+            if missed_slots > 0:
+                index = self._hold_missed_slots(index, missed_slots, value)
+                continue
+
+            # The ADC spaces the conversions of a block at the sampling interval by itself,
+            # so only the start of each block is scheduled here
+            count = min(self.block_size, self.data_box.max_size - index)
+            slot_offsets_ns = numpy.arange(count, dtype=numpy.int64) * self.period_ns
+            read_time_ns = self._now_ns()
+            with ADC_READ_SECONDS.time():
+                values = self.adc.read_coil_block(count, self.period_ns // 1000) * self.scale_factor
+            self._deadlines_ns[index:index + count] = self.next_deadline_ns + slot_offsets_ns
+            self._read_times_ns[index:index + count] = read_time_ns + slot_offsets_ns
+            self.data_box.add_block(values)
+            self.next_deadline_ns += count * self.period_ns
+            index += count
+            value = int(values[-1])
+
+    def _timing_stats(self) -> Dict[str, Any]:
+        deadline_errors_us = (self._read_times_ns - self._deadlines_ns) / 1000
+        interval_errors_us = numpy.abs(numpy.diff(self._read_times_ns) - self.period_ns) / 1000
+        histogram, _ = numpy.histogram(numpy.clip(interval_errors_us, 0, TIMING_HISTOGRAM_BINS_US[-1]),
+                                       bins=TIMING_HISTOGRAM_BINS_US)
+        return {
+            'missed_slots': int(self.missed_slots),
+            'deadline_error_max_us': float(deadline_errors_us.max()),
+            'deadline_error_p99_us': float(numpy.percentile(deadline_errors_us, 99)),
+            'interval_error_max_us': float(interval_errors_us.max()),
+            'interval_error_p99_us': float(numpy.percentile(interval_errors_us, 99)),
+            'interval_error_histogram_bins_us': TIMING_HISTOGRAM_BINS_US,
+            'interval_error_histogram': histogram.tolist()
+        }
 
     def _publish_data_to_queue(self) -> None:
         bias_point = None
         if self.adc.supports_bias_point_measurement():
             bias_point = self.adc.read_bias_point() * self.scale_factor
 
+        read_span_ns = self._read_times_ns[-1] - self._read_times_ns[0]
+        self.actual_sampling_rate = (len(self._read_times_ns) - 1) * 1_000_000_000 / read_span_ns
+        start_time = (self._deadlines_ns[0] + self._wall_clock_offset_ns) / 1_000_000_000
+
         self.data_box.prepare_for_data_upload()
         self.data_queue.put(
             DataUploaderData(
                 values=self.data_box.data_to_upload,
                 bias_point=bias_point,
-                actual_sampling_rate=self.actual_sampling_rate
+                actual_sampling_rate=self.actual_sampling_rate,
+                start_time=start_time,
+                timing_stats=self._timing_stats()
             )
         )
+        self.missed_slots = 0
 
-    def _adjust_sleep_time(self, time_diff) -> None:
-        self.actual_sampling_rate = self.data_box.max_size / time_diff
-        sampling_rate_error_fraction = self.actual_sampling_rate / self.target_sampling_rate
-        self.sleep_time = (self.sleep_time + (self.sleep_time * sampling_rate_error_fraction)) / 2
+    def sample_batch(self) -> None:
+        if self.block_size > 1 and self.adc.supports_block_read():
+            self._fill_data_box_in_blocks()
+        else:
+            self._fill_data_box()
+        self._publish_data_to_queue()
 
     def run(self) -> None:
+        self.next_deadline_ns = self._now_ns()
         while True:
-            t1 = time.time()
-            self._fill_data_box()
-            t2 = time.time()
-            self._adjust_sleep_time(t2 - t1)
-            self._publish_data_to_queue()
+            self.sample_batch()
@@ -1,44 +1,99 @@
-import json
 import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
 
 import numpy as np
 from numpy.typing import NDArray
-from websocket import WebSocketApp
+from websocket import ABNF, WebSocketApp, WebSocketException
 
 from src.client.data_processor import DataProcessor
 from src.client.data_uploader_data import DataUploaderData
-from src.client.rolling_average import RollingAverage
+from src.client.spool import Spool
+from src.client.streaming_statistics import StreamingStatistics
+from src.shared.metrics import METRICS
+from src.shared.uplink_frame import UplinkFrame, UPLINK_FORMAT_BINARY, UPLINK_FLAG_REPLAY
+
+# Frames waiting in memory to be sent, beyond this they are spooled to disk
+OUTBOX_SIZE = 16
+# Spooled frames merged into one replay frame, 10 minutes of data at the default upload interval
+REPLAY_BATCH_FRAMES = 150
+# Seconds between replay frames, live frames are always sent first
+REPLAY_INTERVAL = 0.5
+# Seconds between frames carrying the metrics summary and the timing histogram, too large to send with every batch
+METRICS_INTERVAL = 60
+
+PROCESS_SECONDS = METRICS.histogram('logger_process_seconds', 'Time to filter and decimate one batch')
+ENCODE_SECONDS = METRICS.histogram('logger_encode_seconds', 'Time to encode one frame')
+SEND_SECONDS = METRICS.histogram('logger_send_seconds', 'Time to send one frame on the websocket')
+BYTES_SENT = METRICS.counter('logger_sent_bytes_total', 'Bytes of frames sent to the server')
+FRAMES_SPOOLED = METRICS.counter('logger_spooled_frames_total', 'Frames spooled to disk instead of sent')
+SEND_FAILURES = METRICS.counter('logger_send_failures_total', 'Frames that failed to send')
 
 
 class DataUploader(object):
     ws: WebSocketApp
     data_queue: queue.Queue[DataUploaderData]
     data_processor: DataProcessor
-    rolling_avg: RollingAverage
+    statistics: StreamingStatistics
     theoretical_max_value: int
     target_sampling_rate: int
     decimated_sampling_rate: int
+    uplink_format: str
+    sequence_number: int
+    spool: Spool
+    outbox: queue.Queue[UplinkFrame]
+    connected: threading.Event
+    replay_interval: float
+    metrics_interval: float
+    last_metrics_time: float
+    # Summed over the batches since the last frame that carried it
+    interval_error_histogram: Optional[NDArray[int]]
+    interval_error_histogram_bins_us: Optional[List[float]]
 
     def __init__(self,
                  ws: WebSocketApp,
                  data_queue: queue.Queue[DataUploaderData],
                  data_processor: DataProcessor,
-                 rolling_avg: RollingAverage,
+                 statistics: StreamingStatistics,
                  theoretical_max_value: int,
                  target_sampling_rate: int,
-                 decimated_sampling_rate: int
+                 decimated_sampling_rate: int,
+                 uplink_format: str,
+                 spool: Spool,
+                 outbox_size: int = OUTBOX_SIZE,
+                 replay_interval: float = REPLAY_INTERVAL,
+                 metrics_interval: float = METRICS_INTERVAL
                  ):
         self.ws = ws
         self.data_queue = data_queue
         self.data_processor = data_processor
-        self.rolling_avg = rolling_avg
+        self.statistics = statistics
         self.theoretical_max_value = theoretical_max_value
         self.target_sampling_rate = target_sampling_rate
         self.decimated_sampling_rate = decimated_sampling_rate
+        self.uplink_format = uplink_format
+        self.sequence_number = 0
+        self.spool = spool
+        self.outbox = queue.Queue(maxsize=outbox_size)
+        self.connected = threading.Event()
+        self.replay_interval = replay_interval
+        self.metrics_interval = metrics_interval
+        self.last_metrics_time = -metrics_interval
+        self.interval_error_histogram = None
+        self.interval_error_histogram_bins_us = None
+        METRICS.gauge('logger_outbox_depth', 'Frames waiting to be sent', self.outbox.qsize)
+
+    def on_connection_opened(self) -> None:
+        self.connected.set()
+
+    def on_connection_closed(self) -> None:
+        self.connected.clear()
 
-    def _upload_data(self, data: DataUploaderData):
-        proccessed_values: NDArray[int] = self.data_processor.process(np.array(data.values))
-        int_values: NDArray[int] = np.rint(proccessed_values)
+    def _create_frame(self, data: DataUploaderData) -> UplinkFrame:
+        with PROCESS_SECONDS.time():
+            proccessed_values: NDArray[int] = self.data_processor.process(np.array(data.values))
+        int_values: NDArray[int] = np.rint(proccessed_values).astype(np.int32)
 
         stats = {
             'bias_point': data.bias_point,
@@ -46,21 +101,121 @@ class DataUploader(object):
             'target_sampling_rate': self.target_sampling_rate,
             'decimated_sampling_rate': self.decimated_sampling_rate,
             'theoretical_max_value': self.theoretical_max_value,
-            'rolling_avg': self.rolling_avg.get_average(),
-            'batch_avg': sum(data.values) / len(data.values),
-            'batch_min': int(min(data.values)),
-            'batch_max': int(max(data.values))
+            # Updated by the data processor from this batch's raw values
+            **self.statistics.get_stats(),
+            **self._timing_stats(data.timing_stats)
         }
-        data_obj = {
-            'type': 'post_data',
-            'values': int_values.tolist(),
-            'stats': stats
-        }
-        data = json.dumps(data_obj)
-        self.ws.send(data)
+        frame = UplinkFrame(
+            sequence_number=self.sequence_number,
+            starttime=data.start_time,
+            sampling_rate=self.decimated_sampling_rate,
+            values=int_values,
+            stats=stats
+        )
+        self.sequence_number = (self.sequence_number + 1) % 2 ** 32
+        return frame
+
+    def _timing_stats(self, timing_stats: Dict[str, Any]) -> Dict[str, Any]:
+        # The scalar stats go with every frame, the histogram and the metrics summary once a metrics interval
+        timing_stats = dict(timing_stats)
+        histogram = timing_stats.pop('interval_error_histogram', None)
+        bins = timing_stats.pop('interval_error_histogram_bins_us', None)
+        if histogram is not None:
+            if self.interval_error_histogram is None or bins != self.interval_error_histogram_bins_us:
+                self.interval_error_histogram_bins_us = bins
+                self.interval_error_histogram = np.zeros(len(histogram), dtype=np.int64)
+            self.interval_error_histogram += histogram
+
+        now = time.monotonic()
+        if now - self.last_metrics_time < self.metrics_interval:
+            return timing_stats
+        self.last_metrics_time = now
+        if self.interval_error_histogram is not None:
+            timing_stats['interval_error_histogram_bins_us'] = self.interval_error_histogram_bins_us
+            timing_stats['interval_error_histogram'] = self.interval_error_histogram.tolist()
+            self.interval_error_histogram = None
+        timing_stats['metrics'] = METRICS.summary()
+        return timing_stats
+
+    def _queue_frame(self, frame: UplinkFrame) -> None:
+        if not self.connected.is_set():
+            self._spool(frame)
+            return
+        try:
+            self.outbox.put_nowait(frame)
+        except queue.Full:
+            self._spool(frame)
+
+    def _spool(self, frame: UplinkFrame) -> None:
+        self.spool.append(frame.to_bytes())
+        FRAMES_SPOOLED.inc()
+
+    def _send(self, frame: UplinkFrame) -> bool:
+        try:
+            with ENCODE_SECONDS.time():
+                if self.uplink_format == UPLINK_FORMAT_BINARY:
+                    message, opcode = frame.to_bytes(), ABNF.OPCODE_BINARY
+                else:
+                    message, opcode = frame.to_json(), ABNF.OPCODE_TEXT
+            with SEND_SECONDS.time():
+                self.ws.send(message, opcode)
+            BYTES_SENT.inc(len(message))
+            return True
+        except (WebSocketException, OSError) as e:
+            print("Failed to send frame:", e)
+            SEND_FAILURES.inc()
+            self.connected.clear()
+            return False
+
+    @staticmethod
+    def _merge_frames(frames: List[UplinkFrame]) -> List[UplinkFrame]:
+        # Consecutive frames continuing where the previous one ended are sent as one
+        merged: List[List[UplinkFrame]] = []
+        for frame in frames:
+            if merged:
+                previous = merged[-1][-1]
+                expected_starttime = previous.starttime + len(previous.values) / previous.sampling_rate
+                if frame.sampling_rate == previous.sampling_rate and \
+                        abs(frame.starttime - expected_starttime) < 0.5 / frame.sampling_rate:
+                    merged[-1].append(frame)
+                    continue
+            merged.append([frame])
+
+        return [UplinkFrame(
+            sequence_number=group[0].sequence_number,
+            starttime=group[0].starttime,
+            sampling_rate=group[0].sampling_rate,
+            values=np.concatenate([frame.values for frame in group]),
+            # The metrics were current when the frame was spooled, the live frames carry the logger's metrics
+            stats={key: value for key, value in group[-1].stats.items() if key != 'metrics'},
+            flags=UPLINK_FLAG_REPLAY
+        ) for group in merged]
+
+    def _replay_spooled_frames(self) -> None:
+        records = self.spool.read_batch(REPLAY_BATCH_FRAMES)
+        frames = [UplinkFrame.from_bytes(record) for record in records]
+        for frame in DataUploader._merge_frames(frames):
+            if not self._send(frame):
+                # Stays in the spool and is sent again after the next reconnect
+                return
+        self.spool.commit()
 
     def run(self):
         while True:
             data = self.data_queue.get()
-            self._upload_data(data)
+            self._queue_frame(self._create_frame(data))
             self.data_queue.task_done()
+
+    def run_sender(self):
+        while True:
+            try:
+                frame = self.outbox.get(timeout=self.replay_interval)
+                if not self.connected.is_set() or not self._send(frame):
+                    self._spool(frame)
+                continue
+            except queue.Empty:
+                pass
+
+            # Only reached when no live frame arrived for a whole replay interval
+            if self.connected.is_set() and not self.spool.is_empty():
+                self._replay_spooled_frames()
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, List
 
 
 @dataclass
@@ -7,3 +7,5 @@ class DataUploaderData(object):
     values: List[int]
     bias_point: int
     actual_sampling_rate: int
+    start_time: float
+    timing_stats: Dict[str, Any]
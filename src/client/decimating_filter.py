@@ -0,0 +1,85 @@
+from typing import List, Optional, Tuple
+
+import numpy
+from numpy.lib.stride_tricks import as_strided
+from numpy.typing import NDArray
+from scipy import signal
+
+from src.client.data_filter_config import DataFilterConfig
+
+# How far the roots of a single (b, a) denominator may move from the poles they represent
+MAX_POLE_ERROR = 1e-9
+
+
+class DecimatingFilter(object):
+    decimation_factor: int
+    fir: NDArray[float]
+    sections: List[Tuple[NDArray[float], NDArray[float]]]
+    zi: Optional[List[NDArray[float]]]
+    _history: Optional[NDArray[float]]
+    _phase: int
+
+    def __init__(self, filter_config: DataFilterConfig, decimation_factor: int):
+        self.decimation_factor = decimation_factor
+        zeros, poles, gain = signal.butter(filter_config.filter_order,
+                                           filter_config.filter_cutoff_freq,
+                                           fs=filter_config.data_sampling_freq,
+                                           btype='low',
+                                           analog=False,
+                                           output='zpk')
+
+        # Each pole p of the Butterworth filter is moved to p^M by multiplying the numerator and the
+        # denominator with 1 + p z^-1 + ... + (p z^-1)^(M-1). The denominator is then a polynomial in z^-M,
+        # so by the noble identity the recursive part can run after decimation, and the numerator
+        # becomes an FIR filter that only has to be evaluated at the samples that are kept.
+        fir = gain * numpy.poly(zeros)
+        for pole in poles:
+            fir = numpy.convolve(fir, pole ** numpy.arange(decimation_factor))
+        self.fir = numpy.ascontiguousarray(fir.real[::-1])
+        self.sections = DecimatingFilter._recursive_sections(poles ** decimation_factor)
+        self.zi = None
+        self._history = None
+        self._phase = 0
+
+    @staticmethod
+    def _recursive_sections(poles: NDArray[complex]) -> List[Tuple[NDArray[float], NDArray[float]]]:
+        # Moving the poles to p^M pulls them away from the unit circle and from each other, which usually
+        # leaves a single (b, a) filter well conditioned. Otherwise fall back to second-order sections.
+        b, a = signal.zpk2tf([], poles, 1)
+        pole_error = numpy.abs(numpy.sort_complex(numpy.roots(a)) - numpy.sort_complex(poles)).max()
+        if pole_error < MAX_POLE_ERROR:
+            return [(b, a)]
+        return [(section[:3], section[3:]) for section in signal.zpk2sos([], poles, 1)]
+
+    def _initial_state(self, value: float) -> List[NDArray[float]]:
+        # The steady state of a constant input, like lfilter_zi gives for the whole filter
+        zi = []
+        level = self.fir.sum() * value
+        for b, a in self.sections:
+            zi.append(signal.lfilter_zi(b, a) * level)
+            level *= b.sum() / a.sum()
+        return zi
+
+    def process(self, data: NDArray[int]) -> NDArray[float]:
+        data = numpy.asarray(data, dtype=numpy.float64)
+        if self._history is None:
+            self._history = numpy.full(len(self.fir) - 1, data[0])
+            self.zi = self._initial_state(data[0])
+
+        extended = numpy.concatenate((self._history, data))
+        count = (len(data) - self._phase + self.decimation_factor - 1) // self.decimation_factor
+        stride = extended.strides[0]
+        windows = as_strided(extended[self._phase:],
+                             shape=(count, len(self.fir)),
+                             strides=(self.decimation_factor * stride, stride),
+                             writeable=False)
+        decimated = numpy.ascontiguousarray(windows) @ self.fir
+
+        # lfilter returns a wrong state for an empty input, as from a chunk shorter than the decimation factor
+        if count > 0:
+            for index, (b, a) in enumerate(self.sections):
+                decimated, self.zi[index] = signal.lfilter(b, a, decimated, zi=self.zi[index])
+
+        self._phase = (self._phase - len(data)) % self.decimation_factor
+        self._history = extended[len(extended) - len(self._history):]
+        return decimated
@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import List
+
+import numpy
+from numpy.typing import NDArray
+from obspy import read
+
+# Raw recordings are little endian unsigned 16 bit ADC codes at the sampling rate of the logger
+RAW_SUFFIX = '.raw'
+# Index and temporary files written beside the MiniSEED archive
+IGNORED_SUFFIXES = ['.idx', '.tmp']
+
+
+class ReplayAdc(object):
+    # Streams recorded data as ADC codes, resampled to the sampling rate of the logger, from the first file again
+    # once the last one is done
+    paths: List[Path]
+    sampling_rate: int
+    max_value: int
+    scale_factor: int
+    file_index: int
+    source: NDArray
+    step: float
+    position: int
+
+    def __init__(self, directory: Path, sampling_rate: int, bit_resolution: int, scale_factor: int):
+        self.paths = sorted(path for path in directory.rglob('*')
+                            if path.is_file() and path.suffix not in IGNORED_SUFFIXES)
+        if not self.paths:
+            raise FileNotFoundError('No recordings to replay in %s' % directory)
+        self.sampling_rate = sampling_rate
+        self.max_value = 2 ** bit_resolution - 1
+        self.scale_factor = scale_factor
+        self.file_index = -1
+        self.source = numpy.empty(0)
+        self.step = 1
+        self.position = 0
+
+    def _load_next_file(self) -> None:
+        self.file_index = (self.file_index + 1) % len(self.paths)
+        path = self.paths[self.file_index]
+        print("Replaying", path)
+        self.position = 0
+        if path.suffix == RAW_SUFFIX:
+            self.source = numpy.fromfile(path, dtype='<u2').astype('float64')
+            self.step = 1
+            return
+
+        # The archive holds the filtered and decimated values, which are in ADC codes times the scale factor
+        stream = read(str(path))
+        stream.merge(method=1, fill_value='interpolate')
+        self.source = numpy.concatenate([trace.data.astype('float64') for trace in stream]) / self.scale_factor
+        self.step = stream[0].stats.sampling_rate / self.sampling_rate if len(stream) > 0 else 1
+
+    def _remaining(self) -> int:
+        if len(self.source) == 0:
+            return 0
+        return int((len(self.source) - 1) / self.step) + 1 - self.position
+
+    def read_adc_block(self, channel: int, count: int, interval_us: int = 0) -> NDArray:
+        blocks = []
+        empty_files = 0
+        while count > 0:
+            remaining = self._remaining()
+            if remaining <= 0:
+                if empty_files > len(self.paths):
+                    raise ValueError('No samples to replay in %s' % self.paths)
+                empty_files += 1
+                self._load_next_file()
+                continue
+            block_count = min(count, remaining)
+            # Linear interpolation between the recorded samples
+            source_positions = (self.position + numpy.arange(block_count)) * self.step
+            lower = source_positions.astype(numpy.int64)
+            upper = numpy.minimum(lower + 1, len(self.source) - 1)
+            fraction = source_positions - lower
+            blocks.append(self.source[lower] * (1 - fraction) + self.source[upper] * fraction)
+            self.position += block_count
+            count -= block_count
+        return numpy.clip(numpy.rint(numpy.concatenate(blocks)), 0, self.max_value).astype(numpy.int64)
+
+    def read_adc(self, channel: int) -> int:
+        return int(self.read_adc_block(channel, 1)[0])
@@ -1,34 +1,44 @@
 import queue
 import threading
+import time
+from pathlib import Path
 
 from websocket import WebSocketApp
 
 from src.client.adc_wrapper import AdcWrapper
 from src.client.data_box import DataBox
-from src.client.data_filter import DataFilter
 from src.client.data_processor import DataProcessor
+from src.client.decimating_filter import DecimatingFilter
 from src.client.data_sampler import DataSampler
 from src.client.data_uploader import DataUploader
-from src.client.rolling_average import RollingAverage
 from src.client.seismometer_config import SeismometerConfig
+from src.client.spool import Spool
+from src.client.streaming_statistics import StreamingStatistics
+from src.shared.profiler import SamplingProfiler
 
 
 class SeismLogger(object):
+    profiler: SamplingProfiler
+    profile_directory: Path
+    profile_seconds: float
+
     def __init__(self, config: SeismometerConfig, ws: WebSocketApp):
         data_queue = queue.Queue()
         data_box = DataBox(config.chunk_size)
-        rolling_avg = RollingAverage(config.rolling_average_size)
         theoretical_max_value: int = 2 ** config.adc_config.adc_bit_resolution * config.scale_factor
+        # Reads at either end of the ADC's range are stored as -1 before they are scaled
+        statistics = StreamingStatistics(config.rolling_average_size, invalid_value=-config.scale_factor)
         adc = AdcWrapper(config.adc_config)
 
         if config.filter_config.filter_enabled:
-            data_filter = DataFilter(config.filter_config)
+            data_filter = DecimatingFilter(config.filter_config,
+                                           config.sampling_rate // config.decimated_sampling_rate)
         else:
             data_filter = None
 
         data_processor = DataProcessor(config.sampling_rate,
                                        config.decimated_sampling_rate,
-                                       rolling_avg,
+                                       statistics,
                                        config.use_rolling_avg,
                                        data_filter)
 
@@ -36,18 +46,44 @@ class SeismLogger(object):
                                         data_queue,
                                         data_box,
                                         config.scale_factor,
-                                        config.sampling_rate)
+                                        config.sampling_rate,
+                                        config.adc_config.block_size,
+                                        config.adc_config.replay_speed)
 
         self.data_uploader = DataUploader(ws,
                                           data_queue,
                                           data_processor,
-                                          rolling_avg,
+                                          statistics,
                                           theoretical_max_value,
                                           config.sampling_rate,
-                                          config.decimated_sampling_rate)
+                                          config.decimated_sampling_rate,
+                                          config.uplink_format,
+                                          Spool(config.spool_directory))
+
+        self.profiler = SamplingProfiler()
+        self.profile_directory = config.profile_directory
+        self.profile_seconds = config.profile_seconds
 
     def start(self) -> None:
         sampler_thread = threading.Thread(target=self.data_sampler.run, daemon=True)
         uploader_thread = threading.Thread(target=self.data_uploader.run, daemon=True)
+        sender_thread = threading.Thread(target=self.data_uploader.run_sender, daemon=True)
+        sender_thread.start()
         uploader_thread.start()
         sampler_thread.start()
+
+    def start_profile(self) -> None:
+        if self.profiler.is_running():
+            print("A profile is already running")
+            return
+        print("Profiling for", self.profile_seconds, "s")
+        self.profiler.start()
+        threading.Thread(target=self._save_profile, daemon=True).start()
+
+    def _save_profile(self) -> None:
+        time.sleep(self.profile_seconds)
+        artifact = self.profiler.stop()
+        self.profile_directory.mkdir(parents=True, exist_ok=True)
+        path = self.profile_directory / time.strftime('profile-%Y%m%d-%H%M%S.zip')
+        path.write_bytes(artifact)
+        print("Profile written to", path)
@@ -1,5 +1,10 @@
+import os
+from pathlib import Path
+from typing import Optional
+
 from src.client.adc_config import AdcConfig
 from src.client.data_filter_config import DataFilterConfig
+from src.shared.uplink_frame import UPLINK_FORMAT_BINARY
 
 
 class SeismometerConfig(object):
@@ -12,8 +17,12 @@ class SeismometerConfig(object):
     use_rolling_avg: bool
     chunk_size: int
     adc_config: AdcConfig
+    uplink_format: str
+    spool_directory: Path
+    profile_directory: Path
+    profile_seconds: float
 
-    def __init__(self, seismometer_id: str, mock_adc: bool):
+    def __init__(self, seismometer_id: str, mock_adc: bool, replay_speed: Optional[float] = None):
         self.sampling_rate = 750
         self.decimated_sampling_rate = 30
         self.scale_factor = 8
@@ -27,4 +36,10 @@ class SeismometerConfig(object):
             filter_order=8
         )
         self.chunk_size = self.sampling_rate * self.upload_interval
-        self.adc_config = AdcConfig(seismometer_id, mock_adc)
+        self.adc_config = AdcConfig(seismometer_id, mock_adc, replay_speed, self.scale_factor, self.sampling_rate)
+        self.uplink_format = UPLINK_FORMAT_BINARY
+        # Frames that could not be sent are kept here until the server is reachable again
+        self.spool_directory = Path(os.environ.get('SPOOL_DIRECTORY', 'spool')) / seismometer_id
+        # Profiles taken on SIGUSR1 are written here
+        self.profile_directory = Path(os.environ.get('PROFILE_DIRECTORY', 'profiles')) / seismometer_id
+        self.profile_seconds = float(os.environ.get('PROFILE_SECONDS', 30))
@@ -0,0 +1,41 @@
+from typing import Union
+
+import numpy
+from numpy.typing import NDArray
+
+from src.client.spi_bus import SpidevBus, SimulatedMcp3x08Bus, FRAME_SIZE
+
+SpiBus = Union[SpidevBus, SimulatedMcp3x08Bus]
+
+
+class SpiAdc(object):
+    bus: SpiBus
+    bit_resolution: int
+
+    def __init__(self, bus: SpiBus, bit_resolution: int):
+        self.bus = bus
+        self.bit_resolution = bit_resolution
+
+    @staticmethod
+    def _commands(channel: int, count: int) -> NDArray:
+        assert 0 <= channel <= 7, 'ADC number must be a value of 0-7!'
+        # Start bit, single ended and the channel number, the same command the MCP3208 and MCP3008 use
+        tx_frames = numpy.zeros((count, FRAME_SIZE), dtype=numpy.uint8)
+        tx_frames[:, 0] = (0b11 << 6) | ((channel & 0x07) << 3)
+        return tx_frames
+
+    def _decode(self, rx_frames: NDArray) -> NDArray:
+        rx_frames = rx_frames.astype(numpy.int32)
+        if self.bit_resolution == 12:
+            values = ((rx_frames[:, 0] & 0x01) << 11) | (rx_frames[:, 1] << 3) | (rx_frames[:, 2] >> 5)
+            return values & 0x0FFF
+        else:
+            values = ((rx_frames[:, 0] & 0x01) << 9) | (rx_frames[:, 1] << 1) | ((rx_frames[:, 2] & 0x80) >> 7)
+            return values & 0x03FF
+
+    def read_adc_block(self, channel: int, count: int, interval_us: int = 0) -> NDArray:
+        rx_frames = self.bus.transfer_frames(SpiAdc._commands(channel, count), interval_us)
+        return self._decode(rx_frames)
+
+    def read_adc(self, channel: int) -> int:
+        return int(self.read_adc_block(channel, 1)[0])
@@ -0,0 +1,113 @@
+import fcntl
+import math
+import os
+import struct
+from typing import Callable, Optional
+
+import numpy
+from numpy.typing import NDArray
+
+# struct spi_ioc_transfer from linux/spi/spidev.h
+SPI_IOC_TRANSFER_DTYPE = numpy.dtype([
+    ('tx_buf', '<u8'),
+    ('rx_buf', '<u8'),
+    ('len', '<u4'),
+    ('speed_hz', '<u4'),
+    ('delay_usecs', '<u2'),
+    ('bits_per_word', 'u1'),
+    ('cs_change', 'u1'),
+    ('tx_nbits', 'u1'),
+    ('rx_nbits', 'u1'),
+    ('word_delay_usecs', 'u1'),
+    ('pad', 'u1'),
+])
+# The ioctl size field has 14 bits, which limits how many transfers fit in one SPI_IOC_MESSAGE
+MAX_TRANSFERS_PER_MESSAGE = ((1 << 14) - 1) // SPI_IOC_TRANSFER_DTYPE.itemsize
+FRAME_SIZE = 3
+
+_IOC_WRITE = 1
+_SPI_IOC_MAGIC = ord('k')
+
+
+def _spi_ioc_write(number: int, size: int) -> int:
+    return (_IOC_WRITE << 30) | (size << 16) | (_SPI_IOC_MAGIC << 8) | number
+
+
+SPI_IOC_WR_MODE = _spi_ioc_write(1, 1)
+
+
+class SpidevBus(object):
+    fd: int
+    speed_hz: int
+
+    def __init__(self, bus: int, device: int, speed_hz: int):
+        self.fd = os.open('/dev/spidev%d.%d' % (bus, device), os.O_RDWR)
+        self.speed_hz = speed_hz
+        fcntl.ioctl(self.fd, SPI_IOC_WR_MODE, struct.pack('B', 0))
+
+    def transfer_frames(self, tx_frames: NDArray, frame_interval_us: int = 0) -> NDArray:
+        tx_frames = numpy.ascontiguousarray(tx_frames, dtype=numpy.uint8)
+        rx_frames = numpy.zeros_like(tx_frames)
+        frame_duration_us = math.ceil(FRAME_SIZE * 8 * 1_000_000 / self.speed_hz)
+        delay_usecs = max(0, frame_interval_us - frame_duration_us)
+
+        for start in range(0, len(tx_frames), MAX_TRANSFERS_PER_MESSAGE):
+            count = min(MAX_TRANSFERS_PER_MESSAGE, len(tx_frames) - start)
+            # One transfer per conversion, all submitted with a single ioctl. cs_change releases
+            # chip select between the conversions and delay_usecs spaces them at the sampling interval.
+            transfers = numpy.zeros(count, dtype=SPI_IOC_TRANSFER_DTYPE)
+            offsets = numpy.arange(start, start + count, dtype=numpy.uint64) * FRAME_SIZE
+            transfers['tx_buf'] = tx_frames.ctypes.data + offsets
+            transfers['rx_buf'] = rx_frames.ctypes.data + offsets
+            transfers['len'] = FRAME_SIZE
+            transfers['speed_hz'] = self.speed_hz
+            transfers['delay_usecs'] = delay_usecs
+            transfers['bits_per_word'] = 8
+            transfers['cs_change'] = 1
+            fcntl.ioctl(self.fd, _spi_ioc_write(0, transfers.nbytes), transfers, True)
+
+        return rx_frames
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+# In-process stand-in for an MCP3208/MCP3008 on the SPI bus, answering conversion commands bit for bit
+class SimulatedMcp3x08Bus(object):
+    bit_resolution: int
+    sampling_rate: int
+    signal: Callable[[NDArray], NDArray]
+    sample_index: int
+
+    def __init__(self, bit_resolution: int, sampling_rate: int,
+                 signal: Optional[Callable[[NDArray], NDArray]] = None):
+        self.bit_resolution = bit_resolution
+        self.sampling_rate = sampling_rate
+        self.signal = signal if signal is not None else SimulatedMcp3x08Bus.default_signal
+        self.sample_index = 0
+
+    @staticmethod
+    def default_signal(t: NDArray) -> NDArray:
+        return numpy.sin(2 * t) * 100
+
+    def _convert(self, count: int) -> NDArray:
+        t = numpy.arange(self.sample_index, self.sample_index + count) / self.sampling_rate
+        self.sample_index += count
+        mid_scale = 2 ** (self.bit_resolution - 1)
+        values = numpy.clip(numpy.rint(self.signal(t) + mid_scale), 0, 2 ** self.bit_resolution - 1)
+        return values.astype(numpy.uint16)
+
+    def transfer_frames(self, tx_frames: NDArray, frame_interval_us: int = 0) -> NDArray:
+        tx_frames = numpy.asarray(tx_frames, dtype=numpy.uint8).reshape(-1, FRAME_SIZE)
+        values = self._convert(len(tx_frames))
+        rx_frames = numpy.zeros_like(tx_frames)
+        # The null bit and result follow the start bit, channel bits and sampling clock of the command
+        if self.bit_resolution == 12:
+            rx_frames[:, 0] = (values >> 11) & 0x01
+            rx_frames[:, 1] = (values >> 3) & 0xFF
+            rx_frames[:, 2] = (values & 0x07) << 5
+        else:
+            rx_frames[:, 0] = (values >> 9) & 0x01
+            rx_frames[:, 1] = (values >> 1) & 0xFF
+            rx_frames[:, 2] = (values & 0x01) << 7
+        return rx_frames
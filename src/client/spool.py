@@ -0,0 +1,178 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+SPOOL_SEGMENT_SIZE = 16 * 1024 * 1024
+SEGMENT_SUFFIX = '.spool'
+CURSOR_FILE = 'cursor'
+
+# payload length, crc32 of the payload
+_RECORD_HEADER = struct.Struct('<II')
+# segment number, offset of the first record not yet forwarded
+_CURSOR = struct.Struct('<QQ')
+
+
+class SpoolSegment(object):
+    number: int
+    path: Path
+    size: int
+    write_offset: int
+    _file: Optional[object]
+    _mmap: Optional[mmap.mmap]
+
+    def __init__(self, directory: Path, number: int, size: int):
+        self.number = number
+        self.path = directory / ('%010d%s' % (number, SEGMENT_SUFFIX))
+        if not self.path.exists():
+            # Preallocated so appends never grow the file, unused space reads as zeros
+            with open(self.path, 'wb') as file:
+                file.truncate(size)
+        self.size = self.path.stat().st_size
+        self._file = open(self.path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), self.size)
+        self.write_offset = self._find_end()
+
+    def _find_end(self) -> int:
+        offset = 0
+        while self.read(offset) is not None:
+            offset += _RECORD_HEADER.size + _RECORD_HEADER.unpack_from(self._mmap, offset)[0]
+        return offset
+
+    def append(self, payload: bytes) -> bool:
+        end = self.write_offset + _RECORD_HEADER.size + len(payload)
+        if end > self.size:
+            return False
+        self._mmap[self.write_offset + _RECORD_HEADER.size:end] = payload
+        _RECORD_HEADER.pack_into(self._mmap, self.write_offset, len(payload), zlib.crc32(payload))
+        self._mmap.flush()
+        self.write_offset = end
+        return True
+
+    def read(self, offset: int) -> Optional[bytes]:
+        # A zero length marks the end of the written records, a bad checksum a record torn by a power cut
+        if offset + _RECORD_HEADER.size > self.size:
+            return None
+        length, crc = _RECORD_HEADER.unpack_from(self._mmap, offset)
+        start = offset + _RECORD_HEADER.size
+        if length == 0 or start + length > self.size:
+            return None
+        payload = self._mmap[start:start + length]
+        if zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+
+class Spool(object):
+    directory: Path
+    segment_size: int
+    _write_segment: SpoolSegment
+    _read_segment: SpoolSegment
+    _read_offset: int
+    _pending_offset: Optional[int]
+    _lock: threading.Lock
+
+    def __init__(self, directory: Path, segment_size: int = SPOOL_SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._pending_offset = None
+        self._lock = threading.Lock()
+        if not directory.exists():
+            directory.mkdir(parents=True)
+
+        segment_numbers = sorted(int(path.stem) for path in directory.glob('*' + SEGMENT_SUFFIX))
+        read_number, self._read_offset = self._load_cursor()
+        if not segment_numbers:
+            segment_numbers = [read_number]
+        if read_number not in segment_numbers:
+            read_number, self._read_offset = segment_numbers[0], 0
+
+        # Only the segments being written and read are mapped, so memory use does not grow with the backlog
+        self._write_segment = SpoolSegment(directory, segment_numbers[-1], segment_size)
+        if read_number == self._write_segment.number:
+            self._read_segment = self._write_segment
+        else:
+            self._read_segment = SpoolSegment(directory, read_number, segment_size)
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(self.directory / CURSOR_FILE, 'rb') as file:
+                return _CURSOR.unpack(file.read(_CURSOR.size))
+        except (OSError, struct.error):
+            return 0, 0
+
+    def _save_cursor(self) -> None:
+        temp_path = self.directory / (CURSOR_FILE + '.tmp')
+        with open(temp_path, 'wb') as file:
+            file.write(_CURSOR.pack(self._read_segment.number, self._read_offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.directory / CURSOR_FILE)
+
+    def append(self, payload: bytes) -> None:
+        with self._lock:
+            if self._write_segment.append(payload):
+                return
+            if _RECORD_HEADER.size + len(payload) > self.segment_size:
+                raise ValueError('Record of %d bytes does not fit in a spool segment' % len(payload))
+
+            if self._write_segment is not self._read_segment:
+                self._write_segment.close()
+            self._write_segment = SpoolSegment(self.directory, self._write_segment.number + 1, self.segment_size)
+            self._write_segment.append(payload)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._read_segment is self._write_segment and \
+                self._read_offset == self._write_segment.write_offset
+
+    def _next_segment(self) -> None:
+        finished = self._read_segment
+        if self._read_segment.number + 1 == self._write_segment.number:
+            self._read_segment = self._write_segment
+        else:
+            self._read_segment = SpoolSegment(self.directory, finished.number + 1, self.segment_size)
+        self._read_offset = 0
+        finished.close()
+        finished.path.unlink()
+
+    def read_batch(self, max_records: int) -> List[bytes]:
+        # The records stay in the spool until commit() is called, so a failed send is retried
+        with self._lock:
+            while self._read_segment is not self._write_segment and self._read_segment.read(self._read_offset) is None:
+                self._next_segment()
+
+            records = []
+            offset = self._read_offset
+            while len(records) < max_records:
+                payload = self._read_segment.read(offset)
+                if payload is None:
+                    break
+                records.append(payload)
+                offset += _RECORD_HEADER.size + len(payload)
+            self._pending_offset = offset
+            return records
+
+    def commit(self) -> None:
+        with self._lock:
+            if self._pending_offset is None:
+                return
+            self._read_offset = self._pending_offset
+            self._pending_offset = None
+            # Segments are written in order, so one read to the end of a segment means the writer moved on
+            if self._read_segment is not self._write_segment and self._read_segment.read(self._read_offset) is None:
+                self._next_segment()
+            self._save_cursor()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._read_segment is not self._write_segment:
+                self._read_segment.close()
+            self._write_segment.close()
@@ -0,0 +1,83 @@
+from typing import Any, Dict
+
+import numpy
+from numpy.typing import NDArray
+
+
+class StreamingStatistics(object):
+    max_size: int
+    invalid_value: int
+    size: int
+    batch_average: float
+    batch_rms: float
+    batch_min: int
+    batch_max: int
+    clipped_samples: int
+    rolling_average: float
+    rolling_min: int
+    rolling_max: int
+    _weights: NDArray
+    _batch_averages: NDArray
+    _batch_mins: NDArray
+    _batch_maxs: NDArray
+    _write_index: int
+
+    def __init__(self, max_size: int, invalid_value: int):
+        self.max_size = max_size
+        self.invalid_value = invalid_value
+        self.size = 0
+        self.batch_average = 0
+        self.batch_rms = 0
+        self.batch_min = 0
+        self.batch_max = 0
+        self.clipped_samples = 0
+        self.rolling_average = 0
+        self.rolling_min = 0
+        self.rolling_max = 0
+        # The newest batch weighs 1/2, the one before 1/3 and so on
+        self._weights = 1 / numpy.arange(2, max_size + 2)
+        self._batch_averages = numpy.zeros(max_size)
+        self._batch_mins = numpy.zeros(max_size, dtype=numpy.int64)
+        self._batch_maxs = numpy.zeros(max_size, dtype=numpy.int64)
+        self._write_index = 0
+
+    def add_batch(self, values: NDArray[int]) -> None:
+        values = numpy.asarray(values)
+        float_values = values.astype(numpy.float64)
+        self.batch_average = float(float_values.mean())
+        self.batch_rms = float(numpy.sqrt(numpy.mean(numpy.square(float_values - self.batch_average))))
+        self.batch_min = int(values.min())
+        self.batch_max = int(values.max())
+        # Reads at either end of the ADC's range are where the input clips, they are stored as invalid_value
+        self.clipped_samples = int(numpy.count_nonzero(values == self.invalid_value))
+
+        self._batch_averages[self._write_index] = self.batch_average
+        self._batch_mins[self._write_index] = self.batch_min
+        self._batch_maxs[self._write_index] = self.batch_max
+        self._write_index = (self._write_index + 1) % self.max_size
+        self.size = min(self.size + 1, self.max_size)
+
+        # Batch averages ordered newest first, the same order the weights are in
+        newest_first = (self._write_index - 1 - numpy.arange(self.size)) % self.max_size
+        weights = self._weights[:self.size]
+        self.rolling_average = float(numpy.dot(self._batch_averages[newest_first], weights) / weights.sum())
+        self.rolling_min = int(self._batch_mins[newest_first].min())
+        self.rolling_max = int(self._batch_maxs[newest_first].max())
+
+    def is_empty(self) -> bool:
+        return self.size == 0
+
+    def get_average(self) -> float:
+        return self.rolling_average
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'rolling_avg': self.rolling_average,
+            'rolling_min': self.rolling_min,
+            'rolling_max': self.rolling_max,
+            'batch_avg': self.batch_average,
+            'batch_rms': self.batch_rms,
+            'batch_min': self.batch_min,
+            'batch_max': self.batch_max,
+            'clipped_samples': self.clipped_samples
+        }
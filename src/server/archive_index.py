@@ -0,0 +1,211 @@
+import io
+import os
+import sys
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy
+from numpy.typing import NDArray
+from obspy import read
+
+MSEED_RECORD_LENGTH = 512
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'SEISIDX1'
+
+# One entry per record of a data file, in file order
+RECORD_INDEX_DTYPE = numpy.dtype([
+    ('offset', '<i8'),
+    ('starttime', '<f8'),
+    ('sampling_rate', '<f8'),
+    ('npts', '<i4'),
+    ('encoding', 'u1'),
+    ('word_order', 'u1'),
+    ('data_offset', '<u2'),
+    ('minimum', '<f8'),
+    ('maximum', '<f8')
+])
+
+# Encodings that are plain arrays of samples, Steim compressed records are decoded by libmseed
+_SAMPLE_DTYPES = {1: 'i2', 3: 'i4', 4: 'f4', 5: 'f8'}
+_STEIM_ENCODINGS = [10, 11]
+try:
+    # Private to obspy but many times faster than reading every record on its own. tests/test_archive_index.py
+    # fails if the version Pipfile.lock pins no longer has them.
+    from obspy.io.mseed.util import _unpack_steim_1, _unpack_steim_2
+    _STEIM_DECODERS = {10: _unpack_steim_1, 11: _unpack_steim_2}
+except ImportError:
+    print("obspy has no Steim decoders, records are read one by one")
+    _STEIM_DECODERS = {}
+_BLOCKETTE_1000 = 1000
+_BLOCKETTE_1001 = 1001
+
+
+def _header_dtype(byteorder: str) -> numpy.dtype:
+    # The fixed section of the data header, see the SEED manual
+    return numpy.dtype({
+        'names': ['year', 'day', 'hour', 'minute', 'second', 'fraction', 'npts', 'rate_factor', 'rate_multiplier',
+                  'activity_flags', 'blockette_count', 'time_correction', 'data_offset', 'first_blockette'],
+        'formats': [byteorder + 'u2', byteorder + 'u2', 'u1', 'u1', 'u1', byteorder + 'u2', byteorder + 'u2',
+                    byteorder + 'i2', byteorder + 'i2', 'u1', 'u1', byteorder + 'i4', byteorder + 'u2',
+                    byteorder + 'u2'],
+        'offsets': [20, 22, 24, 25, 26, 28, 30, 32, 34, 36, 39, 40, 44, 46],
+        'itemsize': MSEED_RECORD_LENGTH
+    })
+
+
+def _gather_u16(records: NDArray, offsets: NDArray, byteorder: str) -> NDArray:
+    rows = numpy.arange(len(records))
+    high = records[rows, offsets].astype('uint16')
+    low = records[rows, offsets + 1].astype('uint16')
+    if byteorder == '<':
+        high, low = low, high
+    return (high << 8) | low
+
+
+def _sampling_rates(factor: NDArray, multiplier: NDArray) -> NDArray:
+    factor = factor.astype('float64')
+    multiplier = multiplier.astype('float64')
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        rates = numpy.where(factor > 0,
+                            numpy.where(multiplier >= 0, factor * multiplier, -factor / multiplier),
+                            numpy.where(multiplier >= 0, -multiplier / factor, 1 / (factor * multiplier)))
+    return numpy.nan_to_num(rates)
+
+
+def as_records(data) -> NDArray:
+    # The complete records of a buffer, as rows of bytes
+    record_count = len(data) // MSEED_RECORD_LENGTH
+    return numpy.frombuffer(data, dtype='uint8',
+                            count=record_count * MSEED_RECORD_LENGTH).reshape(-1, MSEED_RECORD_LENGTH)
+
+
+def parse_headers(records: NDArray, first_offset: int = 0) -> NDArray:
+    # Index entries from the record headers alone, the extremes are left as NaN
+    entries = numpy.zeros(len(records), dtype=RECORD_INDEX_DTYPE)
+    entries['minimum'] = numpy.nan
+    entries['maximum'] = numpy.nan
+    if len(records) == 0:
+        return entries
+
+    year = int(records[0, 20]) << 8 | int(records[0, 21])
+    byteorder = '>' if 1900 <= year <= 2500 else '<'
+    headers = numpy.ascontiguousarray(records).view(_header_dtype(byteorder)).reshape(-1)
+    entries['offset'] = first_offset + numpy.arange(len(records)) * MSEED_RECORD_LENGTH
+    entries['npts'] = headers['npts']
+    entries['data_offset'] = headers['data_offset']
+    entries['sampling_rate'] = _sampling_rates(headers['rate_factor'], headers['rate_multiplier'])
+    entries['word_order'] = 1
+
+    microseconds = numpy.zeros(len(records), dtype='int64')
+    offsets = headers['first_blockette'].astype('int64')
+    rows = numpy.arange(len(records))
+    for _ in range(int(headers['blockette_count'].max(initial=0))):
+        valid = (offsets >= 48) & (offsets + 8 <= MSEED_RECORD_LENGTH)
+        offsets = numpy.where(valid, offsets, 0)
+        blockette_type = numpy.where(valid, _gather_u16(records, offsets, byteorder), 0)
+        is_1000 = blockette_type == _BLOCKETTE_1000
+        entries['encoding'][is_1000] = records[rows, offsets + 4][is_1000]
+        entries['word_order'][is_1000] = records[rows, offsets + 5][is_1000]
+        is_1001 = blockette_type == _BLOCKETTE_1001
+        microseconds[is_1001] = records[rows, offsets + 5][is_1001].view('int8')
+        offsets = numpy.where(valid, _gather_u16(records, offsets + 2, byteorder), 0).astype('int64')
+
+    days = numpy.array(headers['year'].astype('int64') - 1970, dtype='datetime64[Y]').astype(
+        'datetime64[D]').astype('int64') + headers['day'] - 1
+    starttime = days * 86400.0 + headers['hour'] * 3600.0 + headers['minute'] * 60.0 + headers['second'] + \
+        headers['fraction'] * 1e-4 + microseconds * 1e-6
+    # Bit 1 of the activity flags means the time correction has already been applied
+    entries['starttime'] = starttime + numpy.where(headers['activity_flags'] & 0x02, 0,
+                                                   headers['time_correction'] * 1e-4)
+    return entries
+
+
+def _decode_steim_record(record: NDArray, encoding: int, word_order: int, data_offset: int, npts: int) -> NDArray:
+    if encoding in _STEIM_DECODERS:
+        swap = int((word_order == 1) != (sys.byteorder == 'big'))
+        return _STEIM_DECODERS[encoding](record[data_offset:], npts, swap)
+    return read(io.BytesIO(record.tobytes()), format='MSEED')[0].data.astype('int32')
+
+
+def decode_records(records: NDArray, entries: NDArray,
+                   selected: NDArray) -> Iterator[Tuple[NDArray, NDArray, NDArray]]:
+    # The selected records grouped by layout, with the samples of each group's records back to back
+    if len(selected) == 0:
+        return
+    layouts = numpy.stack((entries['encoding'][selected], entries['word_order'][selected],
+                           entries['data_offset'][selected]), axis=1)
+    for encoding, word_order, data_offset in numpy.unique(layouts, axis=0).tolist():
+        group = selected[numpy.all(layouts == (encoding, word_order, data_offset), axis=1)]
+        npts = entries['npts'][group].astype('int64')
+        if encoding in _SAMPLE_DTYPES:
+            dtype = numpy.dtype(_SAMPLE_DTYPES[encoding]).newbyteorder('>' if word_order else '<')
+            width = (MSEED_RECORD_LENGTH - data_offset) // dtype.itemsize
+            data = numpy.ascontiguousarray(records[group, data_offset:data_offset + width * dtype.itemsize])
+            counts = numpy.minimum(npts, width)
+            yield group, data.view(dtype)[numpy.arange(width) < counts[:, None]], counts
+        elif encoding in _STEIM_ENCODINGS:
+            values = [_decode_steim_record(records[index], encoding, word_order, data_offset,
+                                           int(entries['npts'][index])) for index in group.tolist()]
+            yield group, numpy.concatenate(values), npts
+        else:
+            print("Skipping", len(group), "records with unsupported encoding", encoding)
+
+
+def fill_extremes(records: NDArray, entries: NDArray, selected: NDArray) -> None:
+    selected = selected[entries['npts'][selected] > 0]
+    for group, values, counts in decode_records(records, entries, selected):
+        starts = numpy.cumsum(counts) - counts
+        entries['minimum'][group] = numpy.minimum.reduceat(values, starts)
+        entries['maximum'][group] = numpy.maximum.reduceat(values, starts)
+
+
+def index_records(data, first_offset: int = 0) -> NDArray:
+    records = as_records(data)
+    entries = parse_headers(records, first_offset)
+    fill_extremes(records, entries, numpy.arange(len(entries)))
+    return entries
+
+
+def index_path(data_path: Path) -> Path:
+    return data_path.with_name(data_path.name + INDEX_SUFFIX)
+
+
+def read_index(data_path: Path) -> NDArray:
+    # A missing, foreign or torn index reads as the entries that are intact
+    try:
+        with open(index_path(data_path), 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        return numpy.empty(0, dtype=RECORD_INDEX_DTYPE)
+    if content[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        return numpy.empty(0, dtype=RECORD_INDEX_DTYPE)
+    entry_count = (len(content) - len(INDEX_MAGIC)) // RECORD_INDEX_DTYPE.itemsize
+    return numpy.frombuffer(content, dtype=RECORD_INDEX_DTYPE, count=entry_count, offset=len(INDEX_MAGIC)).copy()
+
+
+def write_index(data_path: Path, entries: NDArray) -> None:
+    path = index_path(data_path)
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as file:
+        file.write(INDEX_MAGIC)
+        file.write(entries.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def append_index(data_path: Path, entries: NDArray) -> None:
+    # Entries for records appended to the data file, the index is rebuilt if it doesn't end where they begin
+    if len(entries) == 0:
+        return
+    path = index_path(data_path)
+    expected_size = len(INDEX_MAGIC) + int(entries['offset'][0]) // MSEED_RECORD_LENGTH * RECORD_INDEX_DTYPE.itemsize
+    if not path.exists() or path.stat().st_size != expected_size:
+        with open(data_path, 'rb') as file:
+            write_index(data_path, index_records(file.read()))
+        return
+
+    with open(path, 'ab') as file:
+        file.write(entries.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
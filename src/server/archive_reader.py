@@ -0,0 +1,213 @@
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy
+from numpy.typing import NDArray
+from obspy import UTCDateTime
+
+from src.server.archive_index import MSEED_RECORD_LENGTH, RECORD_INDEX_DTYPE, as_records, decode_records, \
+    fill_extremes, parse_headers, read_index
+from src.server.seismometer import MSEED_FILES_DIRECTORY
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE, archive_file_path
+
+MAX_QUERY_SECONDS = 31 * 24 * 60 * 60
+MAX_QUERY_POINTS = 20000
+DEFAULT_QUERY_CACHE_SIZE = 64
+MAX_OPEN_FILES = 32
+
+
+class MseedFileIndex(object):
+    # The records of an archive file and their extremes, kept up to date as the file grows
+    path: Path
+    inode: Optional[int] = None
+    entries: NDArray
+    _file: Optional[object] = None
+    _mmap: Optional[mmap.mmap] = None
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._clear()
+
+    def _clear(self) -> None:
+        self.close()
+        self.inode = None
+        self.entries = numpy.empty(0, dtype=RECORD_INDEX_DTYPE)
+
+    @property
+    def records(self) -> NDArray:
+        return as_records(self._mmap)
+
+    def refresh(self) -> Tuple[Optional[int], int]:
+        # Files are appended to while the day goes on, and replaced when compacted
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._clear()
+            return None, 0
+        record_count = stat.st_size // MSEED_RECORD_LENGTH
+        if stat.st_ino != self.inode or record_count < len(self.entries):
+            self._clear()
+            self.inode = stat.st_ino
+        if record_count > len(self.entries):
+            self._index_records(record_count)
+        return self.inode, len(self.entries)
+
+    def _index_records(self, record_count: int) -> None:
+        # Only complete records are mapped, a torn record being truncated by the writer is never touched
+        self.close()
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), record_count * MSEED_RECORD_LENGTH, access=mmap.ACCESS_READ)
+        first_record = len(self.entries)
+        records = self.records
+        entries = parse_headers(records[first_record:], first_record * MSEED_RECORD_LENGTH)
+
+        # The extremes are taken from the index written beside the file where it matches the records,
+        # only records it doesn't cover yet are decoded
+        stored = read_index(self.path)[first_record:record_count]
+        matches = (stored['offset'] == entries['offset'][:len(stored)]) & \
+            (stored['starttime'] == entries['starttime'][:len(stored)]) & \
+            (stored['npts'] == entries['npts'][:len(stored)])
+        entries['minimum'][:len(stored)][matches] = stored['minimum'][matches]
+        entries['maximum'][:len(stored)][matches] = stored['maximum'][matches]
+        fill_extremes(records[first_record:], entries, numpy.flatnonzero(numpy.isnan(entries['minimum'])))
+        self.entries = numpy.concatenate((self.entries, entries))
+
+    def add_min_max(self, starttime: float, endtime: float, bucket_size: int,
+                    minimum: NDArray, maximum: NDArray) -> None:
+        # Buckets of bucket_size samples counted from starttime, on the nominal sampling grid. Records of archives
+        # from before the nominal rate are placed on it by their own rate.
+        entries = self.entries
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            record_endtime = entries['starttime'] + entries['npts'] / entries['sampling_rate']
+        selected = numpy.flatnonzero((entries['sampling_rate'] > 0) & (entries['npts'] > 0) &
+                                     (record_endtime > starttime) & (entries['starttime'] < endtime))
+        if len(selected) == 0:
+            return
+
+        sample_count = bucket_size * len(minimum)
+        # Nominal samples a record's sample is apart from the next
+        steps = NOMINAL_SAMPLING_RATE / entries['sampling_rate'][selected].astype('float64')
+        first_positions = numpy.round((entries['starttime'][selected] - starttime) *
+                                      NOMINAL_SAMPLING_RATE).astype('int64')
+        last_positions = first_positions + numpy.round((entries['npts'][selected] - 1) * steps).astype('int64')
+        # A record within one bucket is covered by the extremes kept in the index, only the others are decoded
+        whole = (first_positions >= 0) & (last_positions < sample_count) & \
+            (first_positions // bucket_size == last_positions // bucket_size) & \
+            ~numpy.isnan(entries['minimum'][selected])
+        buckets = first_positions[whole] // bucket_size
+        numpy.minimum.at(minimum, buckets, entries['minimum'][selected[whole]])
+        numpy.maximum.at(maximum, buckets, entries['maximum'][selected[whole]])
+
+        # A record across a bucket edge only needs decoding if its extremes reach past those of its buckets
+        first_buckets = numpy.clip(first_positions // bucket_size, 0, len(minimum) - 1)
+        last_buckets = numpy.clip(last_positions // bucket_size, 0, len(minimum) - 1)
+        covered = (last_buckets - first_buckets <= 1) & \
+            (numpy.maximum(minimum[first_buckets], minimum[last_buckets]) <= entries['minimum'][selected]) & \
+            (numpy.minimum(maximum[first_buckets], maximum[last_buckets]) >= entries['maximum'][selected])
+        for group, values, counts in decode_records(self.records, entries, selected[~whole & ~covered]):
+            record_starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            group_positions = numpy.searchsorted(selected, group)
+            positions = numpy.repeat(first_positions[group_positions], counts) + \
+                numpy.round((numpy.arange(len(values)) - record_starts) *
+                            numpy.repeat(steps[group_positions], counts)).astype('int64')
+            inside = (positions >= 0) & (positions < sample_count)
+            values = values[inside].astype('float64')
+            numpy.minimum.at(minimum, positions[inside] // bucket_size, values)
+            numpy.maximum.at(maximum, positions[inside] // bucket_size, values)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+
+
+def _bucket_values(values: NDArray) -> List[Optional[float]]:
+    # Empty buckets are null, integer samples stay integers
+    return [None if numpy.isinf(value) else int(value) if value.is_integer() else value for value in values.tolist()]
+
+
+class ArchiveReader(object):
+    directory: Path
+    cache_size: int
+    _files: 'OrderedDict[Path, MseedFileIndex]'
+    _messages: 'OrderedDict[tuple, str]'
+    _lock: threading.Lock
+
+    def __init__(self, directory: Path, cache_size: int = DEFAULT_QUERY_CACHE_SIZE):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._files = OrderedDict()
+        self._messages = OrderedDict()
+        # Queries run on executor threads, the open files and cached answers are shared between them
+        self._lock = threading.Lock()
+
+    def _file_index(self, path: Path) -> MseedFileIndex:
+        file_index = self._files.get(path)
+        if file_index is None:
+            file_index = MseedFileIndex(path)
+            self._files[path] = file_index
+            if len(self._files) > MAX_OPEN_FILES:
+                self._files.popitem(last=False)[1].close()
+        else:
+            self._files.move_to_end(path)
+        return file_index
+
+    def _day_files(self, seismometer_id: str, starttime: UTCDateTime, endtime: UTCDateTime) -> List[MseedFileIndex]:
+        # The archive holds one file per day at a path given by the date, no directory has to be listed
+        directory = self.directory / seismometer_id / MSEED_FILES_DIRECTORY
+        day = UTCDateTime(starttime.date)
+        files = []
+        while day < endtime:
+            files.append(self._file_index(archive_file_path(directory, day.date)))
+            day += 24 * 60 * 60
+        return files
+
+    def query(self, seismometer_id: str, starttime: UTCDateTime, endtime: UTCDateTime, points: int) -> str:
+        with self._lock:
+            return self._query(seismometer_id, starttime, endtime, points)
+
+    def _query(self, seismometer_id: str, starttime: UTCDateTime, endtime: UTCDateTime, points: int) -> str:
+        files = self._day_files(seismometer_id, starttime, endtime)
+        # Appending to or replacing a file changes its version, so cached answers never go stale
+        key = (seismometer_id, starttime.timestamp, endtime.timestamp, points,
+               tuple(file_index.refresh() for file_index in files))
+        message = self._messages.get(key)
+        if message is not None:
+            self._messages.move_to_end(key)
+            return message
+
+        # Every bucket keeps its smallest and largest sample, so peaks survive any amount of downsampling
+        sample_count = max(1, round((endtime - starttime) * NOMINAL_SAMPLING_RATE))
+        bucket_size = max(1, -(-sample_count // max(1, points // 2)))
+        minimum = numpy.full(-(-sample_count // bucket_size), numpy.inf)
+        maximum = numpy.full(len(minimum), -numpy.inf)
+        for file_index in files:
+            file_index.add_min_max(starttime.timestamp, endtime.timestamp, bucket_size, minimum, maximum)
+
+        message = json.dumps({
+            'type': 'query',
+            'seismometer_id': seismometer_id,
+            'starttime': str(starttime),
+            'endtime': str(endtime),
+            'bucket_seconds': bucket_size / NOMINAL_SAMPLING_RATE,
+            'min': _bucket_values(minimum),
+            'max': _bucket_values(maximum)
+        })
+
+        self._messages[key] = message
+        if len(self._messages) > self.cache_size:
+            self._messages.popitem(last=False)
+        return message
+
+    def close(self) -> None:
+        with self._lock:
+            for file_index in self._files.values():
+                file_index.close()
+            self._files.clear()
@@ -0,0 +1,124 @@
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from websockets import ConnectionClosed
+from websockets.server import WebSocketServerProtocol
+
+from src.shared.downlink_frame import DOWNLINK_FORMAT_JSON, Message
+from src.shared.metrics import METRICS
+
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DISCONNECT = 'disconnect'
+DEFAULT_QUEUE_SIZE = 16
+
+DROPPED_MESSAGES = METRICS.counter('server_dropped_messages_total', 'Messages not sent to a web client that was behind')
+DROPPED_CLIENTS = METRICS.counter('server_dropped_clients_total', 'Web clients disconnected for falling behind')
+
+# The rate and downlink format a subscriber receives
+Feed = Tuple[Optional[int], str]
+
+
+class Subscriber(object):
+    websocket: WebSocketServerProtocol
+    queue: asyncio.Queue
+    sender_task: Optional[asyncio.Task]
+    dropped_messages: int
+    # Envelopes a second the subscriber asked for, None for every sample
+    rate: Optional[int]
+    downlink_format: str
+
+    def __init__(self, websocket: WebSocketServerProtocol, queue_size: int, rate: Optional[int] = None,
+                 downlink_format: str = DOWNLINK_FORMAT_JSON):
+        self.websocket = websocket
+        self.rate = rate
+        self.downlink_format = downlink_format
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sender_task = None
+        self.dropped_messages = 0
+
+
+class Broadcaster(object):
+    queue_size: int
+    overflow_policy: str
+    subscribers: Dict[str, Dict[WebSocketServerProtocol, Subscriber]]
+    # The number of subscribers of every feed, so the feeds in use are known without going through the subscribers
+    feed_counts: Dict[str, Dict[Feed, int]]
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, overflow_policy: str = OVERFLOW_DROP_OLDEST):
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.subscribers = {}
+        self.feed_counts = {}
+        METRICS.gauge('server_web_clients', 'Connected web clients',
+                      lambda: sum(len(subscribers) for subscribers in self.subscribers.values()))
+
+    def subscribe(self, seismometer_id: str, websocket: WebSocketServerProtocol,
+                  initial_message: Optional[Message] = None, rate: Optional[int] = None,
+                  downlink_format: str = DOWNLINK_FORMAT_JSON) -> Subscriber:
+        subscriber = Subscriber(websocket, self.queue_size, rate, downlink_format)
+        if initial_message is not None:
+            subscriber.queue.put_nowait(initial_message)
+
+        self.subscribers.setdefault(seismometer_id, {})[websocket] = subscriber
+        feed_counts = self.feed_counts.setdefault(seismometer_id, {})
+        feed_counts[(rate, downlink_format)] = feed_counts.get((rate, downlink_format), 0) + 1
+        subscriber.sender_task = asyncio.ensure_future(self._send_loop(seismometer_id, subscriber))
+        return subscriber
+
+    def unsubscribe(self, seismometer_id: str, websocket: WebSocketServerProtocol) -> None:
+        subscribers = self.subscribers.get(seismometer_id, {})
+        if websocket not in subscribers:
+            return
+
+        subscriber = subscribers.pop(websocket)
+        feed = (subscriber.rate, subscriber.downlink_format)
+        feed_counts = self.feed_counts[seismometer_id]
+        feed_counts[feed] -= 1
+        if feed_counts[feed] == 0:
+            del feed_counts[feed]
+        if subscriber.sender_task is not None and subscriber.sender_task is not asyncio.current_task():
+            subscriber.sender_task.cancel()
+
+    def subscriber_count(self, seismometer_id: str) -> int:
+        return len(self.subscribers.get(seismometer_id, {}))
+
+    def subscribed_feeds(self, seismometer_id: str) -> Set[Feed]:
+        return set(self.feed_counts.get(seismometer_id, {}))
+
+    def publish(self, seismometer_id: str, message: Message) -> None:
+        # Never awaits, so ingest doesn't depend on the number or speed of the subscribers
+        for subscriber in list(self.subscribers.get(seismometer_id, {}).values()):
+            self._enqueue(seismometer_id, subscriber, message)
+
+    def publish_feeds(self, seismometer_id: str, messages: Dict[Feed, Message]) -> None:
+        # Each subscriber gets the message of its feed, if there is one for this batch
+        for subscriber in list(self.subscribers.get(seismometer_id, {}).values()):
+            message = messages.get((subscriber.rate, subscriber.downlink_format))
+            if message is not None:
+                self._enqueue(seismometer_id, subscriber, message)
+
+    def _enqueue(self, seismometer_id: str, subscriber: Subscriber, message: Message) -> None:
+        if subscriber.queue.full():
+            subscriber.dropped_messages += 1
+            DROPPED_MESSAGES.inc()
+            if self.overflow_policy == OVERFLOW_DISCONNECT:
+                DROPPED_CLIENTS.inc()
+                self.unsubscribe(seismometer_id, subscriber.websocket)
+                asyncio.ensure_future(subscriber.websocket.close())
+                return
+            subscriber.queue.get_nowait()
+
+        subscriber.queue.put_nowait(message)
+
+    async def _send_loop(self, seismometer_id: str, subscriber: Subscriber) -> None:
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                await subscriber.websocket.send(message)
+        except ConnectionClosed:
+            self.unsubscribe(seismometer_id, subscriber.websocket)
+        except Exception as e:
+            # The subscriber would otherwise stay subscribed with no task left to empty its queue
+            print("Failed to send to web client:", repr(e))
+            self.unsubscribe(seismometer_id, subscriber.websocket)
+            await subscriber.websocket.close()
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from obspy import Catalog, UTCDateTime, read_events
+from obspy.clients.fdsn import Client
+from obspy.clients.fdsn.header import FDSNNoDataException
+from obspy.core.event import Event
+from obspy.geodetics import locations2degrees
+
+from src.shared.metrics import METRICS
+
+CATALOG_DIRECTORY = 'files/catalog'
+CATALOG_FILE_SUFFIX = '.xml'
+STATE_FILE = 'state.json'
+DEFAULT_FDSN_SERVICE = 'IRIS'
+DEFAULT_CATALOG_TTL = 10 * 60
+# Events reach the catalogs late and their origins are revised, every query reaches back this far
+REFRESH_OVERLAP = 60 * 60
+# How far back a catalog without any earlier queries starts
+BACKFILL_SECONDS = 24 * 60 * 60
+RETENTION_DAYS = 7
+REFRESH_FAILURES = METRICS.counter('server_catalog_refresh_failures_total', 'Earthquake catalog refreshes that failed')
+
+# The events marked on the day plots
+CATALOG_QUERIES: Dict[str, Dict[str, Any]] = {
+    'sweden': {'latitude': 59.334591, 'longitude': 18.063240, 'maxradius': 15, 'maxmagnitude': 6},
+    'global': {'minmagnitude': 6}
+}
+
+
+def _origin_time(event: Event) -> Optional[UTCDateTime]:
+    origin = event.preferred_origin() or (event.origins[0] if event.origins else None)
+    return origin.time if origin is not None else None
+
+
+class FdsnCatalogSource(object):
+    service: str
+    _client: Optional[Client] = None
+
+    def __init__(self, service: str = DEFAULT_FDSN_SERVICE):
+        self.service = service
+
+    def get_events(self, **query: Any) -> Catalog:
+        # Creating the client already asks the service what it supports
+        if self._client is None:
+            self._client = Client(self.service)
+        try:
+            return self._client.get_events(**query)
+        except FDSNNoDataException:
+            return Catalog()
+
+
+class FileCatalogSource(object):
+    # Answers the same queries from a QuakeML file, for running without network access
+    path: Path
+    delay: float
+    _catalog: Optional[Catalog] = None
+
+    def __init__(self, path: Path, delay: float = 0):
+        self.path = path
+        # Simulates the response time of a real service
+        self.delay = delay
+
+    def get_events(self, starttime: UTCDateTime, endtime: UTCDateTime, latitude: Optional[float] = None,
+                   longitude: Optional[float] = None, maxradius: Optional[float] = None,
+                   minmagnitude: Optional[float] = None, maxmagnitude: Optional[float] = None) -> Catalog:
+        time.sleep(self.delay)
+        if self._catalog is None:
+            self._catalog = read_events(str(self.path))
+
+        events = []
+        for event in self._catalog:
+            origin = event.preferred_origin() or (event.origins[0] if event.origins else None)
+            magnitude = event.preferred_magnitude() or (event.magnitudes[0] if event.magnitudes else None)
+            if origin is None or not starttime <= origin.time <= endtime:
+                continue
+            if minmagnitude is not None and (magnitude is None or magnitude.mag < minmagnitude):
+                continue
+            if maxmagnitude is not None and (magnitude is None or magnitude.mag > maxmagnitude):
+                continue
+            if maxradius is not None and \
+                    locations2degrees(latitude, longitude, origin.latitude, origin.longitude) > maxradius:
+                continue
+            events.append(event)
+        return Catalog(events)
+
+
+CatalogSource = Union[FdsnCatalogSource, FileCatalogSource]
+
+
+def create_catalog_source() -> CatalogSource:
+    if 'CATALOG_FILE' in os.environ:
+        return FileCatalogSource(Path(os.environ['CATALOG_FILE']))
+    return FdsnCatalogSource(os.environ.get('FDSN_SERVICE', DEFAULT_FDSN_SERVICE))
+
+
+class EventCatalog(object):
+    # Earthquakes kept on disk in one QuakeML file per day. Without a source it only reads what another process
+    # has fetched.
+    directory: Path
+    source: Optional[CatalogSource]
+    ttl: float
+
+    def __init__(self, directory: Path, source: Optional[CatalogSource] = None, ttl: float = DEFAULT_CATALOG_TTL):
+        self.directory = directory
+        self.source = source
+        self.ttl = ttl
+
+    def _day_path(self, day: date) -> Path:
+        return self.directory / (day.isoformat() + CATALOG_FILE_SUFFIX)
+
+    def _read_day(self, day: date) -> List[Event]:
+        path = self._day_path(day)
+        if not path.exists():
+            return []
+        return list(read_events(str(path)))
+
+    @staticmethod
+    def _write_atomically(path: Path, write) -> None:
+        temp_path = path.with_name('.' + path.name + '.tmp')
+        write(temp_path)
+        os.replace(temp_path, path)
+
+    def _read_state(self) -> Dict[str, float]:
+        try:
+            with open(self.directory / STATE_FILE) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _store(self, events: Catalog) -> None:
+        days: Dict[date, List[Event]] = {}
+        for event in events:
+            origin_time = _origin_time(event)
+            if origin_time is not None:
+                days.setdefault(origin_time.date, []).append(event)
+
+        for day, day_events in days.items():
+            # Newer versions of an event replace the stored one
+            merged = {str(event.resource_id): event for event in self._read_day(day)}
+            merged.update((str(event.resource_id), event) for event in day_events)
+            catalog = Catalog(sorted(merged.values(), key=_origin_time))
+            EventCatalog._write_atomically(self._day_path(day),
+                                           lambda path: catalog.write(str(path), format='QUAKEML'))
+
+    def _remove_expired(self, now: UTCDateTime) -> None:
+        oldest_kept = self._day_path(now.date - timedelta(days=RETENTION_DAYS)).name
+        for path in self.directory.glob('*' + CATALOG_FILE_SUFFIX):
+            if path.name < oldest_kept:
+                path.unlink()
+
+    def refresh(self, now: UTCDateTime) -> bool:
+        # Only the time since the last refresh is queried, and not at all before the TTL has passed
+        state = self._read_state()
+        if 'fetched_until' in state and now - state['fetched_until'] < self.ttl:
+            return False
+        if 'fetched_until' in state:
+            starttime = UTCDateTime(state['fetched_until']) - REFRESH_OVERLAP
+        else:
+            starttime = now - BACKFILL_SECONDS
+
+        events = Catalog()
+        for name, query in CATALOG_QUERIES.items():
+            try:
+                events += self.source.get_events(starttime=starttime, endtime=now, **query)
+            except Exception as e:
+                print("Failed to fetch", name, "earthquakes:", e)
+                return False
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._store(events)
+        EventCatalog._write_atomically(self.directory / STATE_FILE, lambda path: path.write_text(
+            json.dumps({'fetched_until': now.timestamp})))
+        self._remove_expired(now)
+        return True
+
+    async def refresh_forever(self) -> None:
+        # The source is queried off the event loop, a slow or unreachable service only delays the next refresh
+        while True:
+            try:
+                await asyncio.get_event_loop().run_in_executor(None, self.refresh, UTCDateTime())
+            except Exception as e:
+                # A failure storing the events is retried with the next refresh rather than ending them
+                print("Failed to refresh the earthquake catalog:", e)
+                REFRESH_FAILURES.inc()
+            await asyncio.sleep(self.ttl)
+
+    def get_events(self, starttime: UTCDateTime, endtime: UTCDateTime) -> Catalog:
+        events = []
+        day = starttime.date
+        while day <= endtime.date:
+            events.extend(event for event in self._read_day(day) if starttime <= _origin_time(event) <= endtime)
+            day += timedelta(days=1)
+        return Catalog(events)
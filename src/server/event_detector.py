@@ -0,0 +1,144 @@
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+import numpy
+from numpy.typing import NDArray
+from obspy import UTCDateTime
+from scipy import signal
+
+DETECTOR_RECURSIVE = 'recursive'
+DETECTOR_CLASSIC = 'classic'
+EVENT_TRIGGER_ON = 'trigger_on'
+EVENT_TRIGGER_OFF = 'trigger_off'
+
+STA_SECONDS = 1
+LTA_SECONDS = 30
+TRIGGER_ON_RATIO = 3.5
+TRIGGER_OFF_RATIO = 1.5
+# Time constant of the high-pass removing the DC offset before the energy is computed
+DC_REMOVAL_SECONDS = 60
+
+
+@dataclass
+class DetectorEvent(object):
+    type: str
+    time: str
+    ratio: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class EventDetector(object):
+    sampling_rate: float
+    method: str
+    sta_samples: int
+    lta_samples: int
+    trigger_on_ratio: float
+    trigger_off_ratio: float
+    triggered: bool
+    peak_ratio: float
+    samples_seen: int
+    _dc_b: NDArray
+    _dc_a: NDArray
+    _dc_zi: Optional[NDArray]
+    _sta_zi: NDArray
+    _lta_zi: NDArray
+    _energy_tail: NDArray
+
+    def __init__(self,
+                 sampling_rate: float,
+                 method: str = DETECTOR_RECURSIVE,
+                 sta_seconds: float = STA_SECONDS,
+                 lta_seconds: float = LTA_SECONDS,
+                 trigger_on_ratio: float = TRIGGER_ON_RATIO,
+                 trigger_off_ratio: float = TRIGGER_OFF_RATIO):
+        self.sampling_rate = sampling_rate
+        self.method = method
+        self.sta_samples = max(1, int(sta_seconds * sampling_rate))
+        self.lta_samples = max(self.sta_samples + 1, int(lta_seconds * sampling_rate))
+        self.trigger_on_ratio = trigger_on_ratio
+        self.trigger_off_ratio = trigger_off_ratio
+        self.triggered = False
+        self.peak_ratio = 0
+        self.samples_seen = 0
+
+        dc_pole = 1 - 1 / (DC_REMOVAL_SECONDS * sampling_rate)
+        self._dc_b = numpy.array([1, -1])
+        self._dc_a = numpy.array([1, -dc_pole])
+        self._dc_zi = None
+        self._sta_zi = numpy.zeros(1)
+        self._lta_zi = numpy.zeros(1)
+        self._energy_tail = numpy.zeros(0)
+
+    def _energy(self, values: NDArray) -> NDArray:
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if self._dc_zi is None:
+            # Start the high-pass settled on the first sample instead of ringing from zero
+            self._dc_zi = signal.lfilter_zi(self._dc_b, self._dc_a) * values[0]
+        high_passed, self._dc_zi = signal.lfilter(self._dc_b, self._dc_a, values, zi=self._dc_zi)
+        return numpy.square(high_passed)
+
+    def _recursive_ratio(self, energy: NDArray) -> NDArray:
+        # The same recursion as obspy's recursive_sta_lta, with the filter state carried between batches
+        c_sta = 1 / self.sta_samples
+        c_lta = 1 / self.lta_samples
+        sta, self._sta_zi = signal.lfilter([c_sta], [1, c_sta - 1], energy, zi=self._sta_zi)
+        lta, self._lta_zi = signal.lfilter([c_lta], [1, c_lta - 1], energy, zi=self._lta_zi)
+        return sta / numpy.maximum(lta, numpy.finfo(numpy.float64).tiny)
+
+    def _classic_ratio(self, energy: NDArray) -> NDArray:
+        # Moving averages from a cumulative sum over the batch and the last lta_samples of energy
+        extended = numpy.concatenate((self._energy_tail, energy))
+        cumulative = numpy.concatenate(([0], numpy.cumsum(extended)))
+        end = numpy.arange(len(self._energy_tail) + 1, len(extended) + 1)
+        sta_start = numpy.maximum(end - self.sta_samples, 0)
+        lta_start = numpy.maximum(end - self.lta_samples, 0)
+        sta = (cumulative[end] - cumulative[sta_start]) / (end - sta_start)
+        lta = (cumulative[end] - cumulative[lta_start]) / (end - lta_start)
+        self._energy_tail = extended[-self.lta_samples:]
+        return sta / numpy.maximum(lta, numpy.finfo(numpy.float64).tiny)
+
+    def process(self, values: NDArray, starttime: float) -> List[DetectorEvent]:
+        if len(values) == 0:
+            return []
+
+        energy = self._energy(values)
+        if self.method == DETECTOR_CLASSIC:
+            ratio = self._classic_ratio(energy)
+        else:
+            ratio = self._recursive_ratio(energy)
+
+        # No triggering until the long term average has seen a full window
+        warm_up = max(0, min(len(ratio), self.lta_samples - self.samples_seen))
+        self.samples_seen += len(ratio)
+        ratio[:warm_up] = 0
+
+        events = []
+        index = 0
+        while index < len(ratio):
+            if self.triggered:
+                crossings = numpy.flatnonzero(ratio[index:] < self.trigger_off_ratio)
+                end = index + crossings[0] if len(crossings) > 0 else len(ratio)
+                self.peak_ratio = max(self.peak_ratio, float(ratio[index:end].max(initial=0)))
+                if len(crossings) == 0:
+                    break
+                self.triggered = False
+                events.append(self._event(EVENT_TRIGGER_OFF, starttime, end, self.peak_ratio))
+            else:
+                crossings = numpy.flatnonzero(ratio[index:] > self.trigger_on_ratio)
+                if len(crossings) == 0:
+                    break
+                end = index + crossings[0]
+                self.triggered = True
+                self.peak_ratio = float(ratio[end])
+                events.append(self._event(EVENT_TRIGGER_ON, starttime, end, self.peak_ratio))
+            index = end
+        return events
+
+    def _event(self, event_type: str, starttime: float, index: int, ratio: float) -> DetectorEvent:
+        return DetectorEvent(
+            type=event_type,
+            time=str(UTCDateTime(starttime + index / self.sampling_rate)),
+            ratio=ratio
+        )
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy
+from numpy.typing import NDArray
+
+from src.server.resolution_tiers import min_max_envelope
+from src.shared.downlink_frame import DownlinkFrame, DOWNLINK_FORMAT_JSON, Message
+
+HISTORY_CACHE_SECONDS = 30 * 60
+MAX_CACHED_MESSAGES = 8
+# The total number of samples ever appended, followed by the ring of samples
+_HEADER_SIZE = 8
+_INT16_INFO = numpy.iinfo('int16')
+
+
+class HistoryCache(object):
+    sampling_rate: float
+    stats: Optional[Dict[str, Any]]
+    _total: NDArray
+    _ring: NDArray
+    _messages: 'OrderedDict[Tuple[int, Optional[int], int, str], Message]'
+
+    def __init__(self, sampling_rate: float, seconds: int = HISTORY_CACHE_SECONDS,
+                 buffer: Optional[Union[bytearray, memoryview]] = None):
+        # The cache can live in a shared memory buffer, so other processes can read what one process appends
+        if buffer is None:
+            buffer = bytearray(HistoryCache.buffer_size(sampling_rate, seconds))
+        self.sampling_rate = sampling_rate
+        self.stats = None
+        self._total = numpy.ndarray(1, dtype='int64', buffer=buffer)
+        self._ring = numpy.ndarray(int(seconds * sampling_rate), dtype='int16', buffer=buffer, offset=_HEADER_SIZE)
+        self._messages = OrderedDict()
+
+    @staticmethod
+    def buffer_size(sampling_rate: float, seconds: int = HISTORY_CACHE_SECONDS) -> int:
+        return _HEADER_SIZE + int(seconds * sampling_rate) * numpy.dtype('int16').itemsize
+
+    @property
+    def capacity(self) -> int:
+        return len(self._ring)
+
+    @property
+    def total(self) -> int:
+        return int(self._total[0])
+
+    @property
+    def size(self) -> int:
+        return min(self.total, self.capacity)
+
+    def append(self, values: NDArray, stats: Optional[Dict[str, Any]] = None) -> None:
+        total = self.total
+        # Samples beyond the int16 range are clipped rather than wrapped around to the opposite sign
+        stored = numpy.clip(values[-self.capacity:], _INT16_INFO.min, _INT16_INFO.max).astype('int16')
+        # Of a batch longer than the ring only the newest samples are kept, placed where they fall in the ring
+        write_index = (total + len(values) - len(stored)) % self.capacity
+        first_part = min(len(stored), self.capacity - write_index)
+        self._ring[write_index:write_index + first_part] = stored[:first_part]
+        self._ring[:len(stored) - first_part] = stored[first_part:]
+
+        # Published after the samples, a reader never sees a total covering samples not yet written
+        self._total[0] = total + len(values)
+        self.invalidate(stats)
+
+    def invalidate(self, stats: Optional[Dict[str, Any]] = None) -> None:
+        if stats is not None:
+            self.stats = stats
+
+        # Every cached message now lacks the newest samples
+        self._messages.clear()
+
+    def samples_between(self, start: int, end: int) -> NDArray:
+        # start and end count samples since the first append, only the last capacity of them are kept
+        total = self.total
+        end = min(end, total)
+        start = max(start, total - self.capacity, 0)
+        if start >= end:
+            return numpy.empty(0, dtype='int16')
+
+        start_index = start % self.capacity
+        end_index = end % self.capacity
+        if start_index < end_index:
+            return self._ring[start_index:end_index].copy()
+        return numpy.concatenate((self._ring[start_index:], self._ring[:end_index]))
+
+    def last_samples(self, count: int) -> NDArray:
+        total = self.total
+        return self.samples_between(total - count, total)
+
+    def last_seconds(self, seconds: float) -> NDArray:
+        return self.last_samples(int(seconds * self.sampling_rate))
+
+    def _envelope(self, history_length: int, rate: int, pending: int) -> NDArray:
+        # Ends pending samples before the newest, where the live envelopes of the rate will continue from
+        bucket_size = int(self.sampling_rate) // rate
+        end = self.total - pending
+        samples = self.samples_between(end - int(history_length * self.sampling_rate), end)
+        return min_max_envelope(samples[len(samples) % bucket_size:], bucket_size)
+
+    def get_message(self, history_length: int, rate: Optional[int] = None, pending: int = 0,
+                    downlink_format: str = DOWNLINK_FORMAT_JSON) -> Message:
+        # Without a rate the samples are sent as they are, otherwise as min/max envelopes of rate buckets a second
+        key = (history_length, rate, pending, downlink_format)
+        message = self._messages.get(key)
+        if message is None:
+            if rate is None:
+                values = self.last_seconds(history_length)
+            else:
+                values = self._envelope(history_length, rate, pending)
+            message = DownlinkFrame(values, self.stats, rate).encode(downlink_format)
+            self._messages[key] = message
+            if len(self._messages) > MAX_CACHED_MESSAGES:
+                self._messages.popitem(last=False)
+        else:
+            self._messages.move_to_end(key)
+        return message
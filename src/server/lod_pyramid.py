@@ -0,0 +1,75 @@
+from typing import List, Optional
+
+import numpy
+from numpy.typing import NDArray
+
+from src.server.trace_buffer import GrowableArray
+
+LOD_BUCKET_SIZES = [8, 64, 512, 4096]
+
+
+class LodLevel(object):
+    bucket_size: int
+    minimum: GrowableArray
+    maximum: GrowableArray
+    total: GrowableArray
+    total_squared: GrowableArray
+
+    def __init__(self, bucket_size: int, capacity: int, dtype: numpy.dtype):
+        self.bucket_size = bucket_size
+        bucket_capacity = capacity // bucket_size + 1
+        self.minimum = GrowableArray(bucket_capacity, dtype)
+        self.maximum = GrowableArray(bucket_capacity, dtype)
+        self.total = GrowableArray(bucket_capacity, 'float64')
+        self.total_squared = GrowableArray(bucket_capacity, 'float64')
+
+    @property
+    def size(self) -> int:
+        return self.minimum.size
+
+    def update(self, samples: NDArray, start_index: int, end_index: int) -> None:
+        # Only the buckets holding samples from start_index to end_index are recomputed, and the ones that were not
+        # full before, so appending a batch or filling a gap with a late one is O(batch)
+        first_bucket = min(start_index // self.bucket_size, self.size)
+        last_bucket = min(-(-end_index // self.bucket_size), len(samples) // self.bucket_size)
+        if last_bucket <= first_bucket:
+            return
+
+        buckets = samples[first_bucket * self.bucket_size:last_bucket * self.bucket_size].reshape(-1, self.bucket_size)
+        float_buckets = buckets.astype('float64')
+        self.minimum.write(first_bucket, buckets.min(axis=1))
+        self.maximum.write(first_bucket, buckets.max(axis=1))
+        self.total.write(first_bucket, float_buckets.sum(axis=1))
+        self.total_squared.write(first_bucket, numpy.square(float_buckets).sum(axis=1))
+
+    def envelope(self, start_bucket: int, end_bucket: int) -> NDArray:
+        # Interleaved min and max, which plots as the same envelope as the raw samples
+        envelope = numpy.empty(2 * (end_bucket - start_bucket), dtype=self.minimum.dtype)
+        envelope[0::2] = self.minimum.view()[start_bucket:end_bucket]
+        envelope[1::2] = self.maximum.view()[start_bucket:end_bucket]
+        return envelope
+
+    def mean(self) -> NDArray:
+        return self.total.view() / self.bucket_size
+
+    def rms(self) -> NDArray:
+        return numpy.sqrt(self.total_squared.view() / self.bucket_size)
+
+
+class LodPyramid(object):
+    levels: List[LodLevel]
+
+    def __init__(self, capacity: int, dtype: numpy.dtype = numpy.dtype('int16')):
+        self.levels = [LodLevel(bucket_size, capacity, dtype) for bucket_size in LOD_BUCKET_SIZES]
+
+    def update(self, samples: NDArray, start_index: int, end_index: int) -> None:
+        # samples is the whole trace, of which the samples from start_index to end_index have changed
+        for level in self.levels:
+            level.update(samples, start_index, end_index)
+
+    def level_for(self, samples: int, pixels: int) -> Optional[LodLevel]:
+        # The coarsest level that still has at least one bucket per pixel, None if raw samples are needed
+        for level in reversed(self.levels):
+            if samples // level.bucket_size >= pixels:
+                return level
+        return None
@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Optional
+
+from src.shared.metrics import METRICS
+
+DEFAULT_PIPE_QUEUE_SIZE = 1024
+
+DROPPED_PIPE_MESSAGES = METRICS.counter('server_dropped_pipe_messages_total',
+                                        'Messages between the front end and a worker dropped for a full pipe')
+PIPE_FULL_WAITS = METRICS.counter('server_pipe_full_waits_total',
+                                  'Logger messages held back until a worker caught up with its full pipe')
+PIPE_FULL_SECONDS = METRICS.histogram('server_pipe_full_seconds', 'Time a logger message waited for a full pipe')
+
+
+class PipeWriter(object):
+    # Sends on a pipe without blocking the event loop. When the other process falls behind the pipe's buffer fills
+    # and then a bounded queue. Then send() waits for space, holding back only its caller, and send_bytes() drops
+    # the message instead.
+    connection: Connection
+    name: str
+    queue: asyncio.Queue
+    executor: ThreadPoolExecutor
+    writer_task: Optional[asyncio.Task]
+    dropped_messages: int
+
+    def __init__(self, connection: Connection, name: str, queue_size: int = DEFAULT_PIPE_QUEUE_SIZE):
+        self.connection = connection
+        self.name = name
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # The blocking writes are made by a thread of their own, one at a time so the messages stay in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipe-writer')
+        self.writer_task = None
+        self.dropped_messages = 0
+
+    def _start(self) -> None:
+        if self.writer_task is None:
+            self.writer_task = asyncio.ensure_future(self._write_loop())
+        elif self.writer_task.done():
+            raise ConnectionError('Pipe to %s is closed' % self.name)
+
+    async def send(self, message: bytes) -> None:
+        # For data that must not be lost, the caller stops reading from its source until the other process catches up
+        self._start()
+        if self.queue.full():
+            print("Pipe to", self.name, "is full, waiting for it to drain")
+            PIPE_FULL_WAITS.inc()
+            with PIPE_FULL_SECONDS.time():
+                await self.queue.put(message)
+            return
+        self.queue.put_nowait(message)
+
+    def send_bytes(self, message: bytes) -> None:
+        self._start()
+        # Once full, messages are dropped until the queue is half empty, rather than every other one
+        if self.queue.full() or (self.dropped_messages > 0 and self.queue.qsize() > self.queue.maxsize // 2):
+            if self.dropped_messages == 0:
+                print("Pipe to", self.name, "is full, dropping messages")
+            self.dropped_messages += 1
+            DROPPED_PIPE_MESSAGES.inc()
+            return
+
+        self.queue.put_nowait(message)
+
+        if self.dropped_messages > 0:
+            print("Pipe to", self.name, "is draining again,", self.dropped_messages, "messages were dropped")
+            self.dropped_messages = 0
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            message = await self.queue.get()
+            try:
+                await loop.run_in_executor(self.executor, self.connection.send_bytes, message)
+            except (OSError, ValueError) as e:
+                print("Failed to write to", self.name, e)
+                return
+
+    def close(self) -> None:
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+        self.executor.shutdown(wait=False)
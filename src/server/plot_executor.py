@@ -0,0 +1,58 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+from src.shared.metrics import METRICS
+
+RENDER_SECONDS = METRICS.histogram('server_plot_render_seconds', 'Time from starting a plot to it being written')
+SKIPPED_PLOTS = METRICS.counter('server_skipped_plots_total', 'Plot requests replaced by a newer one while waiting')
+
+
+class PlotExecutor(object):
+    executor: ProcessPoolExecutor
+    _running: Dict[str, asyncio.Future]
+    _pending: Dict[str, Tuple[Callable[..., None], Tuple[Any, ...]]]
+
+    def __init__(self, max_workers: int):
+        # Spawn instead of fork so the workers don't inherit the event loop and open sockets
+        self.executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        self._running = {}
+        self._pending = {}
+        METRICS.gauge('server_pending_plots', 'Plots rendering or waiting to',
+                      lambda: len(self._running) + len(self._pending))
+
+    def submit(self, key: str, render: Callable[..., None], *args: Any) -> None:
+        if key in self._running:
+            # Only the newest request per image is kept, any older one waiting is stale
+            if key in self._pending:
+                SKIPPED_PLOTS.inc()
+            self._pending[key] = (render, args)
+            return
+
+        self._start(key, render, args)
+
+    def _start(self, key: str, render: Callable[..., None], args: Tuple[Any, ...]) -> None:
+        future = asyncio.get_event_loop().run_in_executor(self.executor, render, *args)
+        self._running[key] = future
+        started_at = time.perf_counter()
+        future.add_done_callback(lambda done_future: self._on_done(key, done_future, started_at))
+
+    def _on_done(self, key: str, future: asyncio.Future, started_at: float) -> None:
+        del self._running[key]
+        RENDER_SECONDS.observe(time.perf_counter() - started_at)
+
+        if not future.cancelled() and future.exception() is not None:
+            print("Failed to render", key, future.exception())
+
+        if key in self._pending:
+            render, args = self._pending.pop(key)
+            self._start(key, render, args)
+
+    def is_idle(self) -> bool:
+        return not self._running and not self._pending
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,55 @@
+from typing import Dict, Iterable
+
+import numpy
+from numpy.typing import NDArray
+
+
+def min_max_envelope(samples: NDArray, bucket_size: int) -> NDArray:
+    # Interleaved min and max of every full bucket, which plots as the same envelope as the raw samples
+    buckets = samples[:len(samples) // bucket_size * bucket_size].reshape(-1, bucket_size)
+    envelope = numpy.empty(2 * len(buckets), dtype=samples.dtype)
+    envelope[0::2] = buckets.min(axis=1)
+    envelope[1::2] = buckets.max(axis=1)
+    return envelope
+
+
+def is_valid_rate(sampling_rate: int, rate: int) -> bool:
+    # Only whole buckets of samples, so the envelopes line up with the samples' timing
+    return 0 < rate < sampling_rate and sampling_rate % rate == 0
+
+
+class ResolutionTier(object):
+    bucket_size: int
+    # Samples short of a full bucket, they are completed by the next batch
+    pending: NDArray
+
+    def __init__(self, bucket_size: int):
+        self.bucket_size = bucket_size
+        self.pending = numpy.empty(0, dtype='int16')
+
+    def envelope(self, values: NDArray) -> NDArray:
+        samples = numpy.concatenate((self.pending, values)) if len(self.pending) else numpy.asarray(values)
+        full_buckets = len(samples) // self.bucket_size
+        self.pending = samples[full_buckets * self.bucket_size:].copy()
+        return min_max_envelope(samples, self.bucket_size)
+
+
+class ResolutionTiers(object):
+    # The envelopes of one seismometer at the rates its web clients subscribed to. Every tier is computed once per
+    # batch however many clients share it.
+    sampling_rate: int
+    tiers: Dict[int, ResolutionTier]
+
+    def __init__(self, sampling_rate: int):
+        self.sampling_rate = sampling_rate
+        self.tiers = {}
+
+    def pending(self, rate: int) -> int:
+        # The samples a new subscriber's history has to stop short of to line up with the next envelope
+        tier = self.tiers.get(rate)
+        return len(tier.pending) if tier is not None else 0
+
+    def envelopes(self, values: NDArray, rates: Iterable[int]) -> Dict[int, NDArray]:
+        # Tiers without subscribers are dropped, they start over from the next batch when subscribed to again
+        self.tiers = {rate: self.tiers.get(rate) or ResolutionTier(self.sampling_rate // rate) for rate in rates}
+        return {rate: tier.envelope(values) for rate, tier in self.tiers.items()}
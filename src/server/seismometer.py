@@ -1,14 +1,26 @@
-from datetime import datetime
+import json
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from obspy import Stream
+from numpy.typing import NDArray
+from obspy import UTCDateTime
 
-from src.server.stream_manager import StreamManager
+from src.server.event_detector import EventDetector, DetectorEvent
+from src.server.history_cache import HistoryCache
+from src.server.plot_executor import PlotExecutor
+from src.server.stream_manager import StreamManager, NOMINAL_SAMPLING_RATE
 from src.server.stream_plotter import StreamPlotter
+from src.shared.downlink_frame import DOWNLINK_FORMAT_JSON, Message
+from src.shared.metrics import METRICS
 
 MSEED_FILES_DIRECTORY = 'mseed/'
 IMAGE_FILES_DIRECTORY = 'images/'
+EVENT_LOG_FILE = 'events.jsonl'
+
+DETECTOR_SECONDS = METRICS.histogram('server_event_detector_seconds', 'Time to run the event detector on one batch')
+APPEND_SECONDS = METRICS.histogram('server_append_seconds', 'Time to place one batch in the history and day stream')
+SAVE_SECONDS = METRICS.histogram('server_save_to_file_seconds', 'Time to append the day stream to its MiniSEED file')
 
 
 class Seismometer(object):
@@ -18,18 +30,26 @@ class Seismometer(object):
     last_saved_minute: int
     stream_manager: StreamManager
     stream_plotter: StreamPlotter
+    history_cache: Optional[HistoryCache] = None
+    history_buffer: Optional[memoryview] = None
+    event_detector: EventDetector
 
     stats: Dict[str, Any] = None
 
-    def __init__(self, seismometer_id: str, directory: Path):
+    def __init__(self, seismometer_id: str, directory: Path, plot_executor: PlotExecutor,
+                 history_buffer: Optional[memoryview] = None):
         self.seismometer_id = seismometer_id
         self.directory = directory
+        self.history_buffer = history_buffer
 
-        self.last_saved_hour = datetime.today().hour
-        self.last_saved_minute = datetime.today().minute
+        # The same UTC day boundary as the stream manager's day files
+        now = UTCDateTime()
+        self.last_saved_hour = now.hour
+        self.last_saved_minute = now.minute
 
         self.stream_manager = StreamManager(self.directory / MSEED_FILES_DIRECTORY)
-        self.stream_plotter = StreamPlotter(self.directory / IMAGE_FILES_DIRECTORY)
+        self.stream_plotter = StreamPlotter(self.directory / IMAGE_FILES_DIRECTORY, plot_executor)
+        self.event_detector = EventDetector(NOMINAL_SAMPLING_RATE)
 
     def create_folders(self) -> None:
         mseed_path = self.directory / MSEED_FILES_DIRECTORY
@@ -41,34 +61,71 @@ class Seismometer(object):
         if not image_path.exists():
             image_path.mkdir(parents=True)
 
-    async def handle_data(self, values: List[int], stats: Dict[str, Any]) -> None:
+    async def get_history_cache(self) -> HistoryCache:
+        if self.history_cache is None:
+            # Seed the recent history from today's stream, which may have been loaded from file
+            stream = await self.stream_manager.get_wrapped_stream()
+            self.history_cache = HistoryCache(NOMINAL_SAMPLING_RATE, buffer=self.history_buffer)
+            self.history_cache.append(stream[0].data, self.stats)
+        return self.history_cache
+
+    def _log_events(self, events: List[DetectorEvent]) -> None:
+        with open(self.directory / EVENT_LOG_FILE, 'a') as file:
+            for event in events:
+                file.write(json.dumps(event.to_dict()) + '\n')
+
+    async def handle_data(self, values: NDArray, stats: Dict[str, Any], starttime: float = 0,
+                          sampling_rate: Optional[float] = None) -> List[DetectorEvent]:
         self.stats = stats
-        await self.stream_manager.append_values(values)
+        # Loggers that don't timestamp their batches, assume the last sample was just taken
+        detector_starttime = starttime or time.time() - len(values) / NOMINAL_SAMPLING_RATE
+        with DETECTOR_SECONDS.time():
+            events = self.event_detector.process(values, detector_starttime)
+        if events:
+            self._log_events(events)
+
+        with APPEND_SECONDS.time():
+            history_cache = await self.get_history_cache()
+            history_cache.append(values, stats)
+            await self.stream_manager.append_values(values, starttime, sampling_rate)
+        await self.save_plots_and_mseed()
+        return events
+
+    async def handle_replayed_data(self, values: NDArray, stats: Dict[str, Any], starttime: float,
+                                   sampling_rate: float) -> None:
+        # Backlog spooled by the logger during an outage, it is stored but too old for the live views
+        await self.stream_manager.append_values(values, starttime, sampling_rate)
         await self.save_plots_and_mseed()
 
     async def get_last_seconds_of_data(self, seconds) -> List[int]:
-        stream = await self.stream_manager.get_wrapped_stream()
-        endtime = stream[0].stats.endtime
-        starttime = endtime - seconds
-        slice: Stream = stream.slice(starttime, endtime)
-        return slice[0].data.tolist() if slice.count() > 0 else []
+        history_cache = await self.get_history_cache()
+        return history_cache.last_seconds(seconds).tolist()
+
+    async def get_history_message(self, history_length: int, rate: Optional[int] = None, pending: int = 0,
+                                  downlink_format: str = DOWNLINK_FORMAT_JSON) -> Message:
+        history_cache = await self.get_history_cache()
+        return history_cache.get_message(history_length, rate, pending, downlink_format)
 
     async def save_plots_and_mseed(self) -> None:
-        current_minute = datetime.today().minute
-        current_hour = datetime.today().hour
+        now = UTCDateTime()
+        current_minute = now.minute
+        current_hour = now.hour
+        stream = await self.stream_manager.get_wrapped_stream()
+        lod_pyramid = self.stream_manager.lod_pyramid
         if self.last_saved_minute != current_minute:
-            await self.stream_plotter.save_last_10_minutes_plot(await self.stream_manager.get_wrapped_stream())
-            await self.stream_plotter.save_last_60_minutes_plot(await self.stream_manager.get_wrapped_stream())
-            await self.stream_manager.save_to_file()
+            await self.stream_plotter.save_last_10_minutes_plot(stream, lod_pyramid)
+            await self.stream_plotter.save_last_60_minutes_plot(stream, lod_pyramid)
+            with SAVE_SECONDS.time():
+                await self.stream_manager.save_to_file()
             self.last_saved_minute = current_minute
 
         if self.last_saved_hour != current_hour:
-            await self.stream_plotter.save_hour_plot(await self.stream_manager.get_wrapped_stream(),
-                                                     self.last_saved_hour)
+            await self.stream_plotter.save_hour_plot(stream, lod_pyramid, self.last_saved_hour)
             self.last_saved_hour = current_hour
 
         if not self.stream_manager.is_valid_for_current_date():
-            await self.stream_plotter.save_day_plot(await self.stream_manager.get_wrapped_stream())
+            await self.stream_plotter.save_day_plot(stream, lod_pyramid)
 
+            # Rewrite the finished day as one contiguous trace instead of many appended ones
+            await self.stream_manager.compact_file()
             self.stream_manager.begin_new_stream()
-            await self.stream_manager.save_to_file()
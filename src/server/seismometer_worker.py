@@ -0,0 +1,115 @@
+import asyncio
+import json
+import struct
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Optional
+
+from src.server.pipe_writer import PipeWriter
+from src.server.plot_executor import PlotExecutor
+from src.server.seismometer import Seismometer
+from src.server.server_request_handler import DECODE_SECONDS, INVALID_MESSAGES
+from src.shared.metrics import METRICS
+from src.shared.uplink_frame import UplinkFrame, InvalidUplinkFrame, UPLINK_FLAG_REPLAY, UPLINK_FRAME_MAGIC
+
+# Messages from a worker to the front end, a type byte followed by the payload
+WORKER_MESSAGE_DATA = b'D'
+WORKER_MESSAGE_EVENT = b'E'
+# The logger's metrics summary sent with a batch and the worker's own, as JSON
+WORKER_MESSAGE_METRICS = b'M'
+# History cache total after the batch and the number of samples in it, followed by the stats as JSON
+DATA_MESSAGE_HEADER = struct.Struct('<QI')
+
+
+def run_seismometer_worker(seismometer_id: str, directory: str, connection: Connection,
+                           shared_memory_name: str, plot_workers: int) -> None:
+    asyncio.run(SeismometerWorker(seismometer_id, Path(directory), connection,
+                                  shared_memory_name, plot_workers).run())
+
+
+class SeismometerWorker(object):
+    connection: Connection
+    writer: PipeWriter
+    shared_memory: SharedMemory
+    plot_executor: PlotExecutor
+    seismometer: Seismometer
+
+    def __init__(self, seismometer_id: str, directory: Path, connection: Connection,
+                 shared_memory_name: str, plot_workers: int):
+        self.connection = connection
+        # The front end may be busy too, the worker goes on storing data while it catches up
+        self.writer = PipeWriter(connection, 'front end')
+        self.shared_memory = SharedMemory(shared_memory_name)
+        self.plot_executor = PlotExecutor(plot_workers)
+        # The history cache is kept in shared memory, where the front end reads it without copying through pipes
+        self.seismometer = Seismometer(seismometer_id, directory, self.plot_executor, self.shared_memory.buf)
+        self.seismometer.create_folders()
+
+    @staticmethod
+    def _decode(message: bytes) -> UplinkFrame:
+        # The front end forwards logger messages as received, JSON ones encoded as UTF-8
+        if message[:len(UPLINK_FRAME_MAGIC)] == UPLINK_FRAME_MAGIC:
+            return UplinkFrame.from_bytes(message)
+        return UplinkFrame.from_json(message.decode())
+
+    async def handle_message(self, message: bytes) -> None:
+        try:
+            with DECODE_SECONDS.time():
+                frame = SeismometerWorker._decode(message)
+        except (InvalidUplinkFrame, ValueError, KeyError) as e:
+            print("Invalid data from logger", e)
+            INVALID_MESSAGES.inc()
+            return
+
+        # A replayed frame's metrics are from before the outage
+        logger_metrics = frame.stats.pop('metrics', None)
+        if logger_metrics is not None and not frame.flags & UPLINK_FLAG_REPLAY:
+            self.writer.send_bytes(WORKER_MESSAGE_METRICS + json.dumps({
+                'logger': logger_metrics,
+                'worker': METRICS.summary()
+            }).encode())
+
+        if frame.flags & UPLINK_FLAG_REPLAY:
+            await self.seismometer.handle_replayed_data(frame.values, frame.stats, frame.starttime,
+                                                        frame.sampling_rate)
+            return
+
+        events = await self.seismometer.handle_data(frame.values, frame.stats, frame.starttime, frame.sampling_rate)
+        history_cache = await self.seismometer.get_history_cache()
+        self.writer.send_bytes(WORKER_MESSAGE_DATA +
+                                   DATA_MESSAGE_HEADER.pack(history_cache.total, len(frame.values)) +
+                                   json.dumps(frame.stats).encode())
+        for event in events:
+            self.writer.send_bytes(WORKER_MESSAGE_EVENT + json.dumps({
+                'type': 'event',
+                **event.to_dict()
+            }).encode())
+
+    async def run(self) -> None:
+        # Seed the shared history from today's stream before the front end serves it
+        await self.seismometer.get_history_cache()
+
+        messages: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
+
+        def on_readable() -> None:
+            try:
+                messages.put_nowait(self.connection.recv_bytes())
+            except (EOFError, ConnectionResetError):
+                # A reset when the front end closes the pipe with notifications to it still unread
+                asyncio.get_event_loop().remove_reader(self.connection.fileno())
+                messages.put_nowait(None)
+
+        asyncio.get_event_loop().add_reader(self.connection.fileno(), on_readable)
+        while True:
+            message = await messages.get()
+            if message is None:
+                break
+            await self.handle_message(message)
+
+        self.writer.close()
+        self.plot_executor.shutdown()
+        # The history cache's arrays must be gone before the shared memory can be closed
+        self.seismometer.history_cache = None
+        self.seismometer.history_buffer = None
+        self.shared_memory.close()
@@ -1,106 +1,334 @@
 import asyncio
 import json
 import os
+import time
+from dataclasses import dataclass
 from http import HTTPStatus
 from pathlib import Path
-from typing import List, Dict, Any, Set
+from typing import Dict, Any, List, Optional, Tuple, Union
 from urllib.parse import urlparse, parse_qs
 
 import websockets
-from websockets import ConnectionClosed
+from numpy.typing import NDArray
+from obspy import UTCDateTime
 from websockets.server import WebSocketServerProtocol
 
+from src.server.archive_reader import ArchiveReader, DEFAULT_QUERY_CACHE_SIZE, MAX_QUERY_POINTS, MAX_QUERY_SECONDS
+from src.server.broadcaster import Broadcaster, DEFAULT_QUEUE_SIZE, OVERFLOW_DROP_OLDEST
+from src.server.event_catalog import EventCatalog, CATALOG_DIRECTORY, DEFAULT_CATALOG_TTL, create_catalog_source
+from src.server.event_detector import DetectorEvent
+from src.server.history_cache import HISTORY_CACHE_SECONDS
+from src.server.plot_executor import PlotExecutor
+from src.server.resolution_tiers import ResolutionTiers, is_valid_rate
 from src.server.seismometer import Seismometer
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
 from src.shared.Constants import SEISMOMETER_IDS
+from src.shared.downlink_frame import DownlinkFrame, DOWNLINK_FORMAT_JSON, DOWNLINK_FORMATS, Message
+from src.shared.metrics import METRICS, render_summary
+from src.shared.profiler import SamplingProfiler, MAX_PROFILE_SECONDS
+from src.shared.uplink_frame import UplinkFrame, InvalidUplinkFrame, UPLINK_FLAG_REPLAY
 
 WS_CLIENT_PATH = '/ws/web-client'
 WS_DATA_LOGGER_PATH = '/ws/data-logger'
 WS_SEISMOMETER_QUERY_PARAM = 'seismometer_id'
 WS_HISTORY_LENGTH_QUERY_PARAM = 'history_length'
+WS_RATE_QUERY_PARAM = 'rate'
+WS_FORMAT_QUERY_PARAM = 'format'
+WS_COMPRESSION_QUERY_PARAM = 'compression'
+COMPRESSION_DEFLATE = 'deflate'
+COMPRESSION_NONE = 'none'
+DEFAULT_HISTORY_LENGTH = 30
+QUERY_PATH = '/api/query'
+METRICS_PATH = '/metrics'
+PROFILE_PATH = '/admin/profile'
+PROFILE_RESULT_PATH = '/admin/profile/result'
+PROFILE_SECONDS_PARAM = 'seconds'
+DEFAULT_PROFILE_SECONDS = 30
+QUERY_STARTTIME_PARAM = 'starttime'
+QUERY_ENDTIME_PARAM = 'endtime'
+QUERY_POINTS_PARAM = 'points'
+DEFAULT_QUERY_POINTS = 2000
+DEFAULT_PLOT_WORKERS = 1
+SEISMOMETER_FILES_DIRECTORY = 'files/'
+
+LOGGER_MESSAGES = METRICS.counter('server_logger_messages_total', 'Messages received from loggers')
+LOGGER_BYTES = METRICS.counter('server_logger_bytes_total', 'Bytes received from loggers')
+INVALID_MESSAGES = METRICS.counter('server_invalid_logger_messages_total', 'Logger messages that failed to decode')
+DECODE_SECONDS = METRICS.histogram('server_decode_seconds', 'Time to decode one logger message')
+PUBLISH_SECONDS = METRICS.histogram('server_publish_seconds', 'Time to encode one batch for the web clients')
+
+
+@dataclass
+class WebClientParams(object):
+    # The seconds of history to start with, at most what is cached
+    history_length: int = DEFAULT_HISTORY_LENGTH
+    # Envelopes a second, None for every sample the logger sends
+    rate: Optional[int] = None
+    downlink_format: str = DOWNLINK_FORMAT_JSON
+    # Whether permessage-deflate may be negotiated, not worth its cost per client for the binary formats
+    compression: bool = True
+
+    @staticmethod
+    def from_query(query_params: Dict[str, List[str]]) -> 'WebClientParams':
+        history_length = int(query_params.get(WS_HISTORY_LENGTH_QUERY_PARAM, [DEFAULT_HISTORY_LENGTH])[0])
+        if history_length <= 0:
+            raise ValueError('Invalid history length %d' % history_length)
+
+        rate: Optional[int] = int(query_params.get(WS_RATE_QUERY_PARAM, [NOMINAL_SAMPLING_RATE])[0])
+        if rate == NOMINAL_SAMPLING_RATE:
+            rate = None
+        elif not is_valid_rate(NOMINAL_SAMPLING_RATE, rate):
+            raise ValueError('Rate must divide %d, got %d' % (NOMINAL_SAMPLING_RATE, rate))
+
+        downlink_format = query_params.get(WS_FORMAT_QUERY_PARAM, [DOWNLINK_FORMAT_JSON])[0]
+        if downlink_format not in DOWNLINK_FORMATS:
+            raise ValueError('Unknown format %s' % downlink_format)
+
+        compression = query_params.get(WS_COMPRESSION_QUERY_PARAM, [COMPRESSION_DEFLATE])[0]
+        if compression not in [COMPRESSION_DEFLATE, COMPRESSION_NONE]:
+            raise ValueError('Unknown compression %s' % compression)
+        return WebClientParams(min(history_length, HISTORY_CACHE_SECONDS), rate, downlink_format,
+                               compression == COMPRESSION_DEFLATE)
 
 
 class AuthenticatingWebSocket(WebSocketServerProtocol):
+    compression: bool = True
+
     def process_request(self, path, request_headers):
         parsed_url = urlparse(path)
         query_params = parse_qs(parsed_url.query)
 
-        if parsed_url.path not in [WS_CLIENT_PATH, WS_DATA_LOGGER_PATH]:
+        if parsed_url.path == METRICS_PATH:
+            return super().process_request(path, request_headers)
+
+        if parsed_url.path in [PROFILE_PATH, PROFILE_RESULT_PATH]:
+            if os.environ.get('AUTH_TOKEN') is None or \
+                    request_headers.get('Authorization') != os.environ.get('AUTH_TOKEN'):
+                return HTTPStatus.UNAUTHORIZED, []
+            return super().process_request(path, request_headers)
+
+        if parsed_url.path not in [WS_CLIENT_PATH, WS_DATA_LOGGER_PATH, QUERY_PATH]:
             return HTTPStatus.NOT_FOUND, []
 
         if WS_SEISMOMETER_QUERY_PARAM not in query_params or \
                 query_params[WS_SEISMOMETER_QUERY_PARAM][0] not in SEISMOMETER_IDS:
             return HTTPStatus.NOT_FOUND, []
 
+        if parsed_url.path == WS_CLIENT_PATH:
+            try:
+                self.compression = WebClientParams.from_query(query_params).compression
+            except ValueError as e:
+                print("Invalid web client parameters", e)
+                return HTTPStatus.BAD_REQUEST, []
+
         if parsed_url.path == WS_DATA_LOGGER_PATH and \
                 not request_headers['Authorization'] == os.environ.get('AUTH_TOKEN'):
             return HTTPStatus.UNAUTHORIZED, []
 
+        if parsed_url.path == QUERY_PATH:
+            # Answered over plain HTTP by the process_request given to websockets.serve, as is the metrics page
+            return super().process_request(path, request_headers)
+
         return None
 
+    def process_extensions(self, headers, available_extensions):
+        # Called after process_request during the handshake, so a client can turn down compression for itself
+        if not self.compression:
+            available_extensions = None
+        return super().process_extensions(headers, available_extensions)
+
 
 class ServerRequestHandler:
     seismometers: Dict[str, Seismometer] = {}
-    web_clients: Dict[str, Set[WebSocketServerProtocol]] = {}
+    broadcaster: Broadcaster = None
+    plot_executor: PlotExecutor = None
+    archive_reader: ArchiveReader = None
+    event_catalog: EventCatalog = None
+    resolution_tiers: Dict[str, ResolutionTiers] = {}
+    # The metrics summary each logger sent with its latest batch
+    logger_metrics: Dict[str, Dict[str, Any]] = {}
+    profiler: SamplingProfiler = None
+    profiling: bool = False
+    profile_result: Optional[Tuple[str, bytes]] = None
+
+    def _create_broadcaster(self) -> None:
+        self.broadcaster = Broadcaster(int(os.environ.get('WEB_CLIENT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)),
+                                       os.environ.get('WEB_CLIENT_OVERFLOW_POLICY', OVERFLOW_DROP_OLDEST))
+
+    def _serve_forever(self) -> None:
+        self.archive_reader = ArchiveReader(Path(SEISMOMETER_FILES_DIRECTORY),
+                                            int(os.environ.get('QUERY_CACHE_SIZE', DEFAULT_QUERY_CACHE_SIZE)))
+        self.profiler = SamplingProfiler()
+        # Earthquakes for the day plots are fetched here during the day, the plots read them from disk
+        self.event_catalog = EventCatalog(Path(CATALOG_DIRECTORY), create_catalog_source(),
+                                          float(os.environ.get('CATALOG_TTL', DEFAULT_CATALOG_TTL)))
+        asyncio.ensure_future(self.event_catalog.refresh_forever())
+        start_server = websockets.serve(self.socket_handler, '0.0.0.0', 3000, create_protocol=AuthenticatingWebSocket,
+                                        process_request=self.process_http_request)
+        asyncio.get_event_loop().run_until_complete(start_server)
+        asyncio.get_event_loop().run_forever()
 
     def start_server(self) -> None:
+        self._create_broadcaster()
+        plot_workers = int(os.environ.get('PLOT_WORKERS', DEFAULT_PLOT_WORKERS))
+        self.plot_executor = PlotExecutor(plot_workers)
+
         for seismometer_id in SEISMOMETER_IDS:
-            seismometer = Seismometer(seismometer_id, Path('files/' + seismometer_id))
+            seismometer = Seismometer(seismometer_id, Path(SEISMOMETER_FILES_DIRECTORY + seismometer_id),
+                                      self.plot_executor)
             seismometer.create_folders()
             self.seismometers[seismometer_id] = seismometer
 
-        start_server = websockets.serve(self.socket_handler, '0.0.0.0', 3000, create_protocol=AuthenticatingWebSocket)
-        asyncio.get_event_loop().run_until_complete(start_server)
-        asyncio.get_event_loop().run_forever()
+        self._serve_forever()
 
-    async def handle_data(self, seismometer_id: str, data: Dict[str, Any]) -> None:
-        values: List[int] = data['values']
-        stats: Dict[str, Any] = data['stats']
+    def _pop_logger_metrics(self, seismometer_id: str, frame: UplinkFrame) -> None:
+        # Kept for the metrics page rather than sent on to every web client with the stats. A replayed frame's
+        # metrics are from before the outage and would hide the current ones.
+        metrics: Optional[Dict[str, Any]] = frame.stats.pop('metrics', None)
+        if metrics is not None and not frame.flags & UPLINK_FLAG_REPLAY:
+            self.logger_metrics[seismometer_id] = metrics
+
+    async def handle_data(self, seismometer_id: str, frame: UplinkFrame) -> None:
         seismometer = self.seismometers[seismometer_id]
-        await self.publish_data_to_webclients(seismometer_id, values, stats)
-        await seismometer.handle_data(values, stats)
+        self._pop_logger_metrics(seismometer_id, frame)
+        if frame.flags & UPLINK_FLAG_REPLAY:
+            await seismometer.handle_replayed_data(frame.values, frame.stats, frame.starttime, frame.sampling_rate)
+            return
 
-    def register_web_client(self, seismometer_id: str, websocket: WebSocketServerProtocol) -> None:
-        print("Registering client")
+        await self.publish_data_to_webclients(seismometer_id, frame.values, frame.stats)
+        events = await seismometer.handle_data(frame.values, frame.stats, frame.starttime, frame.sampling_rate)
+        for event in events:
+            await self.publish_event_to_webclients(seismometer_id, event)
 
-        if not seismometer_id in self.web_clients.keys():
-            self.web_clients[seismometer_id] = set()
+    async def handle_logger_message(self, seismometer_id: str, message: Union[str, bytes]) -> None:
+        try:
+            with DECODE_SECONDS.time():
+                if isinstance(message, bytes):
+                    frame = UplinkFrame.from_bytes(message)
+                else:
+                    frame = UplinkFrame.from_json(message)
+        except (InvalidUplinkFrame, ValueError, KeyError) as e:
+            print("Invalid data from logger", e)
+            INVALID_MESSAGES.inc()
+            return
+        await self.handle_data(seismometer_id, frame)
 
-        self.web_clients[seismometer_id].add(websocket)
+    def register_web_client(self, seismometer_id: str, websocket: WebSocketServerProtocol,
+                            history_message: Message, params: WebClientParams) -> None:
+        print("Registering client")
+        self.broadcaster.subscribe(seismometer_id, websocket, history_message, params.rate, params.downlink_format)
 
     def unregister_web_client(self, seismometer_id: str, websocket: WebSocketServerProtocol) -> None:
         print("Unregistering client")
-        if seismometer_id in self.web_clients.keys():
-            self.web_clients[seismometer_id].remove(websocket)
+        self.broadcaster.unsubscribe(seismometer_id, websocket)
+
+    def get_resolution_tiers(self, seismometer_id: str) -> ResolutionTiers:
+        if seismometer_id not in self.resolution_tiers:
+            self.resolution_tiers[seismometer_id] = ResolutionTiers(NOMINAL_SAMPLING_RATE)
+        return self.resolution_tiers[seismometer_id]
 
-    async def publish_data_to_webclients(self, seismometer_id: str, values: List, stats: Dict[str, Any]) -> None:
-        if seismometer_id not in self.web_clients.keys():
+    async def publish_data_to_webclients(self, seismometer_id: str, values: NDArray, stats: Dict[str, Any]) -> None:
+        feeds = self.broadcaster.subscribed_feeds(seismometer_id)
+        if not feeds:
             return
 
-        old_connections = set()
-        for client in self.web_clients[seismometer_id]:
-            try:
-                message = json.dumps({
-                    'type': 'data',
-                    'values': values,
-                    'stats': stats
-                })
-                await client.send(message)
-            except ConnectionClosed:
-                old_connections.add(client)
-
-        for client in old_connections:
-            self.unregister_web_client(seismometer_id, client)
-
-    async def send_history(self, seismometer_id: str, websocket: WebSocketServerProtocol,
-                           history_length: int = 30) -> None:
-        seismometer = self.seismometers[seismometer_id]
-        data_list = await seismometer.get_last_seconds_of_data(history_length)
+        # Reduced once per rate and encoded once per feed, shared by every subscriber of it
+        with PUBLISH_SECONDS.time():
+            rates = {rate for rate, _ in feeds}
+            reduced: Dict[Optional[int], NDArray] = {}
+            if None in rates:
+                reduced[None] = values
+            envelopes = self.get_resolution_tiers(seismometer_id).envelopes(
+                values, [rate for rate in rates if rate is not None])
+            for rate, envelope in envelopes.items():
+                # A batch shorter than a bucket only adds to the next envelope
+                if len(envelope) > 0:
+                    reduced[rate] = envelope
+            messages = {(rate, downlink_format): DownlinkFrame(reduced[rate], stats, rate).encode(downlink_format)
+                        for rate, downlink_format in feeds if rate in reduced}
+        self.broadcaster.publish_feeds(seismometer_id, messages)
+
+    async def publish_event_to_webclients(self, seismometer_id: str, event: DetectorEvent) -> None:
         message = json.dumps({
-            'type': 'data',
-            'values': data_list,
-            'stats': seismometer.stats
+            'type': 'event',
+            **event.to_dict()
         })
-        await websocket.send(message)
+        self.broadcaster.publish(seismometer_id, message)
+
+    async def get_history_message(self, seismometer_id: str, history_length: int = DEFAULT_HISTORY_LENGTH,
+                                  rate: Optional[int] = None, downlink_format: str = DOWNLINK_FORMAT_JSON) -> Message:
+        seismometer = self.seismometers[seismometer_id]
+        pending = self.get_resolution_tiers(seismometer_id).pending(rate) if rate is not None else 0
+        return await seismometer.get_history_message(history_length, rate, pending, downlink_format)
+
+    def get_metrics_page(self) -> str:
+        page = METRICS.render_text()
+        for seismometer_id, metrics in self.logger_metrics.items():
+            page += render_summary(metrics, {WS_SEISMOMETER_QUERY_PARAM: seismometer_id})
+        return page
+
+    async def process_http_request(self, path: str,
+                                   request_headers) -> Tuple[HTTPStatus, List[Tuple[str, str]], bytes]:
+        parsed_path = urlparse(path).path
+        if parsed_path == METRICS_PATH:
+            return HTTPStatus.OK, [('Content-Type', 'text/plain; version=0.0.4')], self.get_metrics_page().encode()
+        if parsed_path == PROFILE_PATH:
+            return self.start_profile(path)
+        if parsed_path == PROFILE_RESULT_PATH:
+            return self.get_profile_result()
+        return await self.process_query(path, request_headers)
+
+    def start_profile(self, path: str) -> Tuple[HTTPStatus, List[Tuple[str, str]], bytes]:
+        # Requests have to be answered within the handshake timeout, so the result is fetched separately
+        query_params = parse_qs(urlparse(path).query)
+        try:
+            seconds = float(query_params.get(PROFILE_SECONDS_PARAM, [DEFAULT_PROFILE_SECONDS])[0])
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, [], ('Invalid profile length: %s\n' % e).encode()
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            return HTTPStatus.BAD_REQUEST, [], b'Invalid profile length\n'
+        if self.profiling:
+            return HTTPStatus.CONFLICT, [], b'A profile is already running\n'
+
+        name = 'profile-%s.zip' % time.strftime('%Y%m%d-%H%M%S')
+        self.profiling = True
+        self.profiler.start()
+        asyncio.get_event_loop().call_later(seconds, lambda: asyncio.ensure_future(self.stop_profile(name)))
+        return HTTPStatus.ACCEPTED, [], ('Profiling for %g s, the result will be at %s\n' %
+                                         (seconds, PROFILE_RESULT_PATH)).encode()
+
+    async def stop_profile(self, name: str) -> None:
+        # Taking the allocation snapshot can take a while, it is done off the event loop
+        artifact = await asyncio.get_event_loop().run_in_executor(None, self.profiler.stop)
+        self.profile_result = (name, artifact)
+        self.profiling = False
+
+    def get_profile_result(self) -> Tuple[HTTPStatus, List[Tuple[str, str]], bytes]:
+        if self.profiling:
+            return HTTPStatus.CONFLICT, [], b'The profile is still running\n'
+        if self.profile_result is None:
+            return HTTPStatus.NOT_FOUND, [], b'No profile has been taken\n'
+        name, artifact = self.profile_result
+        return HTTPStatus.OK, [('Content-Type', 'application/zip'),
+                               ('Content-Disposition', 'attachment; filename="%s"' % name)], artifact
+
+    async def process_query(self, path: str, request_headers) -> Tuple[HTTPStatus, List[Tuple[str, str]], bytes]:
+        query_params = parse_qs(urlparse(path).query)
+        try:
+            seismometer_id = query_params[WS_SEISMOMETER_QUERY_PARAM][0]
+            starttime = UTCDateTime(query_params[QUERY_STARTTIME_PARAM][0])
+            endtime = UTCDateTime(query_params[QUERY_ENDTIME_PARAM][0])
+            points = int(query_params.get(QUERY_POINTS_PARAM, [DEFAULT_QUERY_POINTS])[0])
+        except (KeyError, ValueError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, [], ('Invalid query: %s\n' % e).encode()
+
+        if not starttime < endtime or endtime - starttime > MAX_QUERY_SECONDS or not 2 <= points <= MAX_QUERY_POINTS:
+            return HTTPStatus.BAD_REQUEST, [], b'Invalid time range or point count\n'
+
+        # Decoding a month of records takes a while, the websockets must be served in the meantime
+        message = await asyncio.get_event_loop().run_in_executor(None, self.archive_reader.query, seismometer_id,
+                                                                  starttime, endtime, points)
+        return HTTPStatus.OK, [('Content-Type', 'application/json')], message.encode()
 
     async def socket_handler(self, websocket: WebSocketServerProtocol, path: str) -> None:
         parsed_url = urlparse(path)
@@ -108,15 +336,20 @@ class ServerRequestHandler:
         seismometer_id = query_params[WS_SEISMOMETER_QUERY_PARAM][0]
 
         if parsed_url.path == WS_CLIENT_PATH:
-            history_length = int(query_params[WS_HISTORY_LENGTH_QUERY_PARAM][0])
-            self.register_web_client(seismometer_id, websocket)
-            await self.send_history(seismometer_id, websocket, history_length)
-            # Keep to websocket open
-            while True:
-                message = await websocket.recv()
+            params = WebClientParams.from_query(query_params)
+            history_message = await self.get_history_message(seismometer_id, params.history_length, params.rate,
+                                                             params.downlink_format)
+            self.register_web_client(seismometer_id, websocket, history_message, params)
+            try:
+                # Keep to websocket open
+                while True:
+                    message = await websocket.recv()
+            finally:
+                self.unregister_web_client(seismometer_id, websocket)
         elif parsed_url.path == WS_DATA_LOGGER_PATH:
             async for message in websocket:
-                json_data: Dict[str, Any] = json.loads(message)
-                await self.handle_data(seismometer_id, json_data)
+                LOGGER_MESSAGES.inc()
+                LOGGER_BYTES.inc(len(message))
+                await self.handle_logger_message(seismometer_id, message)
         else:
             print("Invalid path", path)
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Optional, Union
+
+from src.server.history_cache import HistoryCache
+from src.server.pipe_writer import PipeWriter
+from src.server.seismometer_worker import run_seismometer_worker, WORKER_MESSAGE_DATA, WORKER_MESSAGE_EVENT, \
+    WORKER_MESSAGE_METRICS, DATA_MESSAGE_HEADER
+from src.server.server_request_handler import ServerRequestHandler, DEFAULT_PLOT_WORKERS, \
+    SEISMOMETER_FILES_DIRECTORY, WS_SEISMOMETER_QUERY_PARAM, DEFAULT_HISTORY_LENGTH
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+from src.shared.Constants import SEISMOMETER_IDS
+from src.shared.downlink_frame import DOWNLINK_FORMAT_JSON, Message
+from src.shared.metrics import render_summary
+
+
+class SeismometerWorkerHandle(object):
+    process: BaseProcess
+    connection: Connection
+    writer: PipeWriter
+    shared_memory: SharedMemory
+    history_cache: Optional[HistoryCache]
+
+    def __init__(self, process: BaseProcess, connection: Connection, shared_memory: SharedMemory, name: str):
+        self.process = process
+        self.connection = connection
+        # A busy worker must not hold up the front end, and with it every other seismometer and web client
+        self.writer = PipeWriter(connection, name)
+        self.shared_memory = shared_memory
+        # A read-only view of the history the worker appends to
+        self.history_cache = HistoryCache(NOMINAL_SAMPLING_RATE, buffer=shared_memory.buf)
+
+    def close(self) -> None:
+        self.writer.close()
+        self.connection.close()
+        self.process.join()
+        self.history_cache = None
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+# Runs every seismometer in its own process, this process only terminates the websockets and fans out the data
+class ShardedServerRequestHandler(ServerRequestHandler):
+    workers: Dict[str, SeismometerWorkerHandle] = {}
+    # Decoding, storing and plotting are measured in the workers, which send their summaries along
+    worker_metrics: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def start_worker(seismometer_id: str, directory: str, plot_workers: int) -> SeismometerWorkerHandle:
+        context = multiprocessing.get_context('spawn')
+        shared_memory = SharedMemory(create=True, size=HistoryCache.buffer_size(NOMINAL_SAMPLING_RATE))
+        connection, worker_connection = context.Pipe()
+        process = context.Process(target=run_seismometer_worker,
+                                  args=(seismometer_id, directory, worker_connection, shared_memory.name,
+                                        plot_workers),
+                                  daemon=True)
+        process.start()
+        worker_connection.close()
+        return SeismometerWorkerHandle(process, connection, shared_memory, 'worker ' + seismometer_id)
+
+    def start_server(self) -> None:
+        self._create_broadcaster()
+        plot_workers = int(os.environ.get('PLOT_WORKERS', DEFAULT_PLOT_WORKERS))
+
+        for seismometer_id in SEISMOMETER_IDS:
+            worker = ShardedServerRequestHandler.start_worker(seismometer_id,
+                                                              SEISMOMETER_FILES_DIRECTORY + seismometer_id,
+                                                              plot_workers)
+            asyncio.get_event_loop().add_reader(worker.connection.fileno(), self.on_worker_message, seismometer_id)
+            self.workers[seismometer_id] = worker
+
+        try:
+            self._serve_forever()
+        finally:
+            for worker in self.workers.values():
+                worker.close()
+
+    async def handle_logger_message(self, seismometer_id: str, message: Union[str, bytes]) -> None:
+        # Forwarded undecoded, the worker validates and decodes it
+        if isinstance(message, str):
+            message = message.encode()
+        # Never dropped: while the worker is behind the logger's socket isn't read and its frames wait in the
+        # logger's outbox and spool. A worker that is gone closes the logger's connection, so it spools everything.
+        await self.workers[seismometer_id].writer.send(message)
+
+    def on_worker_message(self, seismometer_id: str) -> None:
+        worker = self.workers[seismometer_id]
+        try:
+            message = worker.connection.recv_bytes()
+        except EOFError:
+            print("Worker for", seismometer_id, "exited")
+            asyncio.get_event_loop().remove_reader(worker.connection.fileno())
+            return
+
+        message_type, payload = message[:1], message[1:]
+        if message_type == WORKER_MESSAGE_DATA:
+            total, count = DATA_MESSAGE_HEADER.unpack_from(payload)
+            stats = json.loads(payload[DATA_MESSAGE_HEADER.size:])
+            worker.history_cache.invalidate(stats)
+            # The samples are read straight from the worker's shared history
+            values = worker.history_cache.samples_between(total - count, total)
+            asyncio.ensure_future(self.publish_data_to_webclients(seismometer_id, values, stats))
+        elif message_type == WORKER_MESSAGE_EVENT:
+            self.broadcaster.publish(seismometer_id, payload.decode())
+        elif message_type == WORKER_MESSAGE_METRICS:
+            metrics = json.loads(payload)
+            self.logger_metrics[seismometer_id] = metrics['logger']
+            self.worker_metrics[seismometer_id] = metrics['worker']
+
+    def get_metrics_page(self) -> str:
+        page = super().get_metrics_page()
+        for seismometer_id, metrics in self.worker_metrics.items():
+            page += render_summary(metrics, {WS_SEISMOMETER_QUERY_PARAM: seismometer_id, 'process': 'worker'})
+        return page
+
+    async def get_history_message(self, seismometer_id: str, history_length: int = DEFAULT_HISTORY_LENGTH,
+                                  rate: Optional[int] = None, downlink_format: str = DOWNLINK_FORMAT_JSON) -> Message:
+        pending = self.get_resolution_tiers(seismometer_id).pending(rate) if rate is not None else 0
+        return self.workers[seismometer_id].history_cache.get_message(history_length, rate, pending,
+                                                                      downlink_format)
@@ -1,78 +1,298 @@
-import datetime
+import asyncio
+import io
+import os
 from pathlib import Path
-from typing import Optional, List
+from typing import List, Optional, Tuple
 
 import numpy
 from numpy.typing import NDArray
-from obspy import UTCDateTime, read, Trace, Stream
+from obspy import UTCDateTime, read, Stream, Trace
+
+from src.server.archive_index import MSEED_RECORD_LENGTH, append_index, index_path, index_records, read_index, \
+    write_index
+from src.server.lod_pyramid import LodPyramid
+from src.server.trace_buffer import TraceBuffer, GrowableArray
+
+NOMINAL_SAMPLING_RATE = 30
+SAMPLES_PER_DAY = NOMINAL_SAMPLING_RATE * 24 * 60 * 60
+MSEED_ENCODING = 'STEIM2'
+NETWORK = 'BW'
+STATION = 'MIK'
+LOCATION = ''
+CHANNEL = 'Z'
+_INT16_INFO = numpy.iinfo('int16')
+
+# State of every sample slot of the day, gaps hold the previous value and are never written to file
+SAMPLE_MISSING = 0
+SAMPLE_UNFLUSHED = 1
+SAMPLE_FLUSHED = 2
+
+
+def archive_file_path(directory: Path, date) -> Path:
+    # SDS layout, YEAR/NET/STA/CHAN.TYPE/NET.STA.LOC.CHAN.TYPE.YEAR.DAY
+    file_name = '%s.%s.%s.%s.D.%04d.%03d' % (NETWORK, STATION, LOCATION, CHANNEL, date.year, date.timetuple().tm_yday)
+    return directory / ('%04d' % date.year) / NETWORK / STATION / (CHANNEL + '.D') / file_name
+
+
+def write_archive_file(file_name: Path, traces: List[Trace], append: bool) -> None:
+    # STEIM2 only takes 32 bit integers, and compresses the slowly changing samples to a fraction of their size
+    buffer = io.BytesIO()
+    Stream([Trace(data=trace.data.astype('int32'), header=trace.stats) for trace in traces]).write(
+        buffer, format='MSEED', reclen=MSEED_RECORD_LENGTH, encoding=MSEED_ENCODING)
+    data = buffer.getvalue()
+
+    if not file_name.parent.exists():
+        file_name.parent.mkdir(parents=True)
+    if append and file_name.exists():
+        StreamManager._truncate_partial_record(file_name)
+        offset = file_name.stat().st_size
+    else:
+        offset = 0
+    with open(file_name, 'ab' if offset > 0 else 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    # The index is written after the records it describes, readers check it against the records anyway
+    if offset > 0:
+        append_index(file_name, index_records(data, offset))
+    else:
+        write_index(file_name, index_records(data))
+
+
+def _sample_runs(present: NDArray) -> List[Tuple[int, int]]:
+    edges = numpy.flatnonzero(numpy.diff(present.astype(numpy.int8), prepend=0, append=0))
+    return list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+
+
+def _trace_header(starttime: UTCDateTime) -> dict:
+    return {'network': NETWORK, 'station': STATION, 'location': LOCATION,
+            'channel': CHANNEL, 'sampling_rate': NOMINAL_SAMPLING_RATE,
+            'mseed': {'dataquality': 'D'}, 'starttime': starttime}
+
+
+def _archived_samples(file_name: Path, starttime: UTCDateTime, count: int) -> NDArray:
+    # Which of count samples from starttime the file's records already hold, as far as its index tells
+    archived = numpy.zeros(count, dtype=bool)
+    for entry in read_index(file_name):
+        if entry['sampling_rate'] <= 0:
+            continue
+        first = round((entry['starttime'] - starttime.timestamp) * NOMINAL_SAMPLING_RATE)
+        last = first + round(entry['npts'] * NOMINAL_SAMPLING_RATE / entry['sampling_rate'])
+        archived[max(first, 0):max(min(last, count), 0)] = True
+    return archived
 
 
 class StreamManager:
     wrapped_stream: Optional[Stream] = None
+    trace_buffer: Optional[TraceBuffer] = None
+    sample_states: Optional[GrowableArray] = None
+    lod_pyramid: Optional[LodPyramid] = None
+    # Index of the first sample that may not have been written to file yet
+    unflushed_start: int = 0
+    file_started: bool = False
+    # Samples received for the day after the current stream's, placed once the new stream begins
+    next_day_batches: List[Tuple[NDArray, UTCDateTime]]
 
     def __init__(self, directory: Path):
         self.directory = directory
+        self.next_day_batches = []
 
     @staticmethod
     def _is_stream_valid_for_current_date(stream) -> bool:
-        current_date = datetime.datetime.today().date()
-        stream_start_date = stream[0].stats.starttime.datetime.date()
-        return stream_start_date == current_date
+        return stream[0].stats.starttime.date == UTCDateTime().date
 
     @staticmethod
-    def _create_new_stream() -> Stream:
-        data = numpy.array([], dtype='int16')
-        stats = {'network': 'BW', 'station': 'MIK', 'location': '',
-                 'channel': 'Z', 'npts': len(data), 'sampling_rate': 10,
-                 'mseed': {'dataquality': 'D'}}
-        start_time = datetime.datetime.now()
+    def _create_new_trace_buffer(starttime: UTCDateTime) -> TraceBuffer:
+        # Sample i of the day is always at midnight + i / sampling_rate
+        return TraceBuffer(_trace_header(UTCDateTime(starttime.date)), SAMPLES_PER_DAY)
 
-        stats['starttime'] = UTCDateTime(start_time)
-        stream = Stream([Trace(data=data, header=stats)])
-        return stream
+    def _set_trace_buffer(self, trace_buffer: TraceBuffer) -> None:
+        self.trace_buffer = trace_buffer
+        self.wrapped_stream = Stream([trace_buffer.trace])
+        self.sample_states = GrowableArray(trace_buffer.samples.capacity, 'uint8')
+        self.lod_pyramid = LodPyramid(trace_buffer.samples.capacity, trace_buffer.samples.dtype)
+        self.unflushed_start = 0
+        self.file_started = False
 
     def _stream_file_path(self, date) -> Path:
-        file_name = 'day_' + str(date.day) + '.mseed'
-        return self.directory / file_name
+        return archive_file_path(self.directory, date)
 
     async def get_wrapped_stream(self) -> Stream:
         if self.wrapped_stream is None:
             await self._init_wrapped_stream()
         return self.wrapped_stream
 
-    async def append_values(self, values: List[int]) -> None:
-        stream = await self.get_wrapped_stream()
-        data: NDArray = numpy.array(values, dtype='int16')
-        stream[0].data = numpy.append(stream[0].data, data)
+    def _archive_earlier_values(self, values: NDArray, starttime: UTCDateTime) -> None:
+        # Samples from the days before the stream's, such as a logger's backlog from an outage over midnight, are
+        # appended to their day's file. Samples the file already holds are left out.
+        while len(values) > 0:
+            day_start = UTCDateTime(starttime.date)
+            day_values = values[:SAMPLES_PER_DAY - round((starttime - day_start) * NOMINAL_SAMPLING_RATE)]
+            file_name = self._stream_file_path(starttime.date)
+            missing = ~_archived_samples(file_name, starttime, len(day_values))
+            traces = [Trace(data=day_values[run_start:run_end],
+                            header=_trace_header(starttime + run_start / NOMINAL_SAMPLING_RATE))
+                      for run_start, run_end in _sample_runs(missing)]
+            if traces:
+                print("Archiving", int(missing.sum()), "samples from", starttime.date, "in", file_name)
+                write_archive_file(file_name, traces, True)
 
-        # Update sample rate
-        time_delta = (datetime.datetime.now() - stream[0].stats.starttime.datetime).total_seconds()
-        sampling_rate = stream[0].stats.npts / time_delta
-        stream[0].stats.sampling_rate = sampling_rate
+            values = values[len(day_values):]
+            starttime = starttime + len(day_values) / NOMINAL_SAMPLING_RATE
+
+    def _place_values(self, values: NDArray, index: int) -> None:
+        if index < 0:
+            self._archive_earlier_values(values[:-index], self.trace_buffer.trace.stats.starttime +
+                                         index / NOMINAL_SAMPLING_RATE)
+            values = values[-index:]
+            index = 0
+        end = index + len(values)
+        if end > SAMPLES_PER_DAY:
+            starttime = self.trace_buffer.trace.stats.starttime + SAMPLES_PER_DAY / NOMINAL_SAMPLING_RATE
+            self.next_day_batches.append((values[SAMPLES_PER_DAY - index:], starttime))
+            values = values[:SAMPLES_PER_DAY - index]
+            end = SAMPLES_PER_DAY
+        if len(values) == 0:
+            return
+
+        npts = self.trace_buffer.samples.size
+        if index > npts:
+            # A gap, held at the last value so plots and the LOD pyramid stay sensible
+            fill_value = self.trace_buffer.samples.view()[npts - 1] if npts > 0 else values[0]
+            self.trace_buffer.write(npts, numpy.full(index - npts, fill_value, dtype=values.dtype))
+            self.sample_states.write(npts, numpy.full(index - npts, SAMPLE_MISSING, dtype='uint8'))
+            npts = index
+
+        # Where the batch overlaps samples already received only the gaps are filled, duplicates are dropped
+        overlap_end = min(end, npts)
+        if overlap_end > index:
+            samples = self.trace_buffer.samples.view()[index:overlap_end]
+            states = self.sample_states.view()[index:overlap_end]
+            missing = states == SAMPLE_MISSING
+            samples[missing] = values[:overlap_end - index][missing]
+            states[missing] = SAMPLE_UNFLUSHED
+        if end > npts:
+            self.trace_buffer.write(npts, values[npts - index:])
+            self.sample_states.write(npts, numpy.full(end - npts, SAMPLE_UNFLUSHED, dtype='uint8'))
+
+        self.unflushed_start = min(self.unflushed_start, index)
+        self.lod_pyramid.update(self.trace_buffer.samples.view(), index, end)
+
+    async def append_values(self, values: NDArray,
+                            starttime: Optional[float] = None,
+                            sampling_rate: Optional[float] = None) -> None:
+        await self.get_wrapped_stream()
+        data: NDArray = numpy.clip(values, _INT16_INFO.min, _INT16_INFO.max).astype('int16')
+        stats = self.trace_buffer.trace.stats
+        if sampling_rate and sampling_rate != stats.sampling_rate:
+            print("Dropping batch sampled at", sampling_rate, "Hz, the stream is sampled at", stats.sampling_rate, "Hz")
+            return
+        if starttime:
+            index = round((UTCDateTime(starttime) - stats.starttime) * stats.sampling_rate)
+        elif self.trace_buffer.samples.size > 0:
+            # Batches without a timestamp are assumed to follow the previous one
+            index = self.trace_buffer.samples.size
+        else:
+            index = round((UTCDateTime() - stats.starttime) * stats.sampling_rate) - len(data)
+        self._place_values(data, index)
 
     async def _init_wrapped_stream(self) -> None:
-        current_date = datetime.datetime.today().date()
+        current_date = UTCDateTime().date
         file_path = self._stream_file_path(current_date)
 
         if self.wrapped_stream is None:
             if file_path.exists():
                 stream = read(str(file_path), dtype='int16')
 
-                # Stream date must match current date. It could be last month's stream
+                # Stream date must match current date
                 if StreamManager._is_stream_valid_for_current_date(stream):
-                    self.wrapped_stream = stream
+                    self._set_trace_buffer(StreamManager._create_new_trace_buffer(stream[0].stats.starttime))
+                    # Appended records are read back as several traces, each is placed by its start time
+                    for trace in stream:
+                        self._place_values(trace.data, round((trace.stats.starttime -
+                                                              self.trace_buffer.trace.stats.starttime) *
+                                                             NOMINAL_SAMPLING_RATE))
+                    states = self.sample_states.view()
+                    states[states == SAMPLE_UNFLUSHED] = SAMPLE_FLUSHED
+                    self.unflushed_start = len(states)
+                    self.file_started = True
 
         # If current_stream still is None, create a new one
         if self.wrapped_stream is None:
-            self.wrapped_stream = StreamManager._create_new_stream()
+            self._set_trace_buffer(StreamManager._create_new_trace_buffer(UTCDateTime()))
 
     def is_valid_for_current_date(self) -> bool:
         return StreamManager._is_stream_valid_for_current_date(self.wrapped_stream)
 
+    @staticmethod
+    def _truncate_partial_record(file_name: Path) -> None:
+        # A crash in the middle of an append can leave a torn record at the end of the file
+        if file_name.exists():
+            file_size = file_name.stat().st_size
+            if file_size % MSEED_RECORD_LENGTH != 0:
+                os.truncate(file_name, file_size - file_size % MSEED_RECORD_LENGTH)
+
+    def _traces_for_runs(self, start: int, present: NDArray) -> List[Trace]:
+        # One trace per run of received samples, gaps are left out of the file
+        trace = self.trace_buffer.trace
+        traces = []
+        for run_start, run_end in _sample_runs(present):
+            header = trace.stats.copy()
+            header.starttime = trace.stats.starttime + (start + run_start) / trace.stats.sampling_rate
+            header.npts = run_end - run_start
+            traces.append(Trace(data=trace.data[start + run_start:start + run_end], header=header))
+        return traces
+
     async def save_to_file(self) -> None:
-        stream_start_date = self.wrapped_stream[0].stats.starttime.datetime.date()
-        file_name = self._stream_file_path(stream_start_date)
-        self.wrapped_stream.write(file_name)
+        states = self.sample_states.view()[self.unflushed_start:]
+        unflushed = states == SAMPLE_UNFLUSHED
+        if not unflushed.any():
+            self.unflushed_start = self.sample_states.size
+            return
+
+        trace = self.wrapped_stream[0]
+        file_name = self._stream_file_path(trace.stats.starttime.date)
+        # The first flush of a stream replaces whatever file could not be loaded
+        write_archive_file(file_name, self._traces_for_runs(self.unflushed_start, unflushed), self.file_started)
+
+        states[unflushed] = SAMPLE_FLUSHED
+        self.unflushed_start = self.sample_states.size
+        self.file_started = True
+
+    @staticmethod
+    def _replace_archive_file(file_name: Path, traces: List[Trace]) -> None:
+        temp_file_name = file_name.with_name(file_name.name + '.tmp')
+        write_archive_file(temp_file_name, traces, False)
+        os.replace(temp_file_name, file_name)
+        os.replace(index_path(temp_file_name), index_path(file_name))
+
+    async def compact_file(self) -> None:
+        trace = self.wrapped_stream[0]
+        file_name = self._stream_file_path(trace.stats.starttime.date)
+        states = self.sample_states.view()
+        written = states.copy()
+        traces = self._traces_for_runs(0, written != SAMPLE_MISSING)
+        if not traces:
+            return
+
+        # Encoding a whole day takes seconds. It runs off the event loop so the web clients and the other
+        # seismometers are served meanwhile, while handle_data awaits it and this seismometer's next batches wait
+        # for it to return. The traces are views of samples that are never written again, so a batch placed
+        # meanwhile could only fill the gaps between them.
+        await asyncio.get_event_loop().run_in_executor(None, StreamManager._replace_archive_file, file_name, traces)
+
+        states[written == SAMPLE_UNFLUSHED] = SAMPLE_FLUSHED
+        self.file_started = True
+        # Anything placed after the snapshot is appended to the compacted file
+        self.unflushed_start = 0
+        await self.save_to_file()
 
     def begin_new_stream(self) -> None:
-        self.wrapped_stream = StreamManager._create_new_stream()
+        next_day_batches = self.next_day_batches
+        self.next_day_batches = []
+        starttime = next_day_batches[0][1] if next_day_batches else UTCDateTime()
+        self._set_trace_buffer(StreamManager._create_new_trace_buffer(starttime))
+        for values, batch_starttime in next_day_batches:
+            self._place_values(values, round((batch_starttime - self.trace_buffer.trace.stats.starttime) *
+                                             NOMINAL_SAMPLING_RATE))
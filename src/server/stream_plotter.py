@@ -1,62 +1,81 @@
+import os
 from pathlib import Path
+from typing import Callable, Dict
 
 from obspy import Catalog, Stream, UTCDateTime
-from obspy.clients.fdsn import Client
+
+from src.server.event_catalog import EventCatalog, CATALOG_DIRECTORY
+from src.server.lod_pyramid import LodPyramid
+from src.server.plot_executor import PlotExecutor
+from src.server.trace_snapshot import TraceSnapshot
+from src.server.waveform_figure import WaveformFigure
 
 IMAGE_DIRECTORY = 'files/images'
 IMAGE_FILE_FORMAT = '.png'
+IMAGE_FORMAT = 'png'
 IMAGE_SIZE_HOURLY = (1280, 250)
 IMAGE_SIZE_DAY_PLOT = (2560, 1920)
 OUTFILE_DPI = 150
+# obspy's dayplot draws one line per 15 minute interval
+DAY_PLOT_LINES = 24 * 60 // 15
 
+# Kept alive in each plot worker process, one per image type and seismometer
+_waveform_figures: Dict[str, WaveformFigure] = {}
 
-class StreamPlotter:
-    directory: Path
 
-    def __init__(self, directory: Path):
-        self.directory = directory
+def _save_atomically(image_file_path: Path, plot: Callable[[Path], None]) -> None:
+    # Render next to the target and rename, so a half written image is never served
+    temp_file_path = image_file_path.with_name('.' + image_file_path.name + '.tmp')
+    plot(temp_file_path)
+    os.replace(temp_file_path, image_file_path)
 
-    @staticmethod
-    def get_japan_earthquakes(client: Client, starttime: UTCDateTime, endtime: UTCDateTime) -> Catalog:
-        try:
-            return client.get_events(
-                starttime=starttime,
-                endtime=endtime,
-                latitude=35.6895,
-                longitude=139.6917,
-                maxradius=15,
-                maxmagnitude=6
-            )
-        except Exception as e:
-            print(e)
-            return Catalog()
 
-    @staticmethod
-    def get_sweden_earthquakes(client: Client, starttime: UTCDateTime, endtime: UTCDateTime) -> Catalog:
-        try:
-            return client.get_events(
-                starttime=starttime,
-                endtime=endtime,
-                latitude=59.334591,
-                longitude=18.063240,
-                maxradius=15,
-                maxmagnitude=6
-            )
-        except Exception as e:
-            print(e)
-            return Catalog()
+def plot_day(stream: Stream, cat: Catalog, outfile: Path) -> None:
+    starttime = stream[0].stats.starttime
+    stream.plot(
+        title=starttime.datetime,
+        size=IMAGE_SIZE_DAY_PLOT,
+        dpi=OUTFILE_DPI,
+        type="dayplot",
+        outfile=outfile,
+        format=IMAGE_FORMAT,
+        events=cat,
+        vertical_scaling_range=500,
+    )
+
+
+def render_day_plot(snapshot: TraceSnapshot, image_file_path: Path, catalog_directory: Path) -> None:
+    stream = snapshot.to_stream()
+    starttime = stream[0].stats.starttime
+    endtime = stream[0].stats.endtime
+    print("Plotting day plot for stream with starttime:", starttime)
+
+    # Fetched during the day by the server's catalog refresh, nothing is downloaded here
+    cat = EventCatalog(catalog_directory).get_events(starttime, endtime)
+
+    _save_atomically(image_file_path, lambda outfile: plot_day(stream, cat, outfile))
+
+
+def render_waveform_plot(snapshot: TraceSnapshot, image_file_path: Path, figure_key: str, color: str,
+                         starttime: UTCDateTime, endtime: UTCDateTime) -> None:
+    figure = _waveform_figures.get(figure_key)
+    if figure is None:
+        figure = WaveformFigure(IMAGE_SIZE_HOURLY, OUTFILE_DPI)
+        _waveform_figures[figure_key] = figure
+    stream = snapshot.to_stream()
+    _save_atomically(image_file_path,
+                     lambda outfile: figure.render(stream, color, starttime, endtime, outfile, IMAGE_FORMAT))
 
-    @staticmethod
-    def get_global_earthquakes(client: Client, starttime: UTCDateTime, endtime: UTCDateTime) -> Catalog:
-        try:
-            return client.get_events(
-                starttime=starttime,
-                endtime=endtime,
-                minmagnitude=6
-            )
-        except Exception as e:
-            print(e)
-            return Catalog()
+
+class StreamPlotter:
+    directory: Path
+    plot_executor: PlotExecutor
+    catalog_directory: Path
+
+    def __init__(self, directory: Path, plot_executor: PlotExecutor, catalog_directory: Path = Path(CATALOG_DIRECTORY)):
+        self.directory = directory
+        self.plot_executor = plot_executor
+        self.catalog_directory = catalog_directory
 
     @staticmethod
     def get_plot_color(stream: Stream) -> str:
@@ -66,67 +85,45 @@ class StreamPlotter:
         else:
             return "blue"
 
-    async def save_day_plot(self, stream: Stream) -> None:
+    def _submit_waveform_plot(self, stream: Stream, lod_pyramid: LodPyramid, image_file_name: str,
+                              image_type: str, starttime: UTCDateTime, endtime: UTCDateTime) -> None:
+        image_file_path = self.directory / image_file_name
+        self.plot_executor.submit(str(image_file_path),
+                                  render_waveform_plot,
+                                  TraceSnapshot.from_lod_pyramid(stream, lod_pyramid, IMAGE_SIZE_HOURLY[0],
+                                                                 starttime, endtime),
+                                  image_file_path,
+                                  str(self.directory / image_type),
+                                  StreamPlotter.get_plot_color(stream),
+                                  starttime,
+                                  endtime)
+
+    async def save_day_plot(self, stream: Stream, lod_pyramid: LodPyramid) -> None:
         starttime = stream[0].stats.starttime
-        endtime = stream[0].stats.endtime
-        print("Plotting day plot for stream with starttime:", starttime)
         image_file_name = 'day_' + str(starttime.datetime.day) + IMAGE_FILE_FORMAT
         image_file_path = self.directory / image_file_name
-
-        try:
-            client = Client("IRIS")
-            cat = StreamPlotter.get_sweden_earthquakes(client, starttime, endtime)
-            cat += StreamPlotter.get_global_earthquakes(client, starttime, endtime)
-
-            stream.plot(
-                title=starttime.datetime,
-                size=IMAGE_SIZE_DAY_PLOT,
-                dpi=OUTFILE_DPI,
-                type="dayplot",
-                outfile=image_file_path,
-                events=cat,
-                vertical_scaling_range=500,
-            )
-        except Exception as e:
-            print("Failed to plot day plot.", e)
-
-    async def save_hour_plot(self, stream: Stream, hour: int) -> None:
+        self.plot_executor.submit(str(image_file_path),
+                                  render_day_plot,
+                                  TraceSnapshot.from_lod_pyramid(stream, lod_pyramid,
+                                                                 IMAGE_SIZE_DAY_PLOT[0] * DAY_PLOT_LINES),
+                                  image_file_path,
+                                  self.catalog_directory)
+
+    async def save_hour_plot(self, stream: Stream, lod_pyramid: LodPyramid, hour: int) -> None:
         image_file_name = 'hour_' + str(hour) + IMAGE_FILE_FORMAT
-        image_file_path = self.directory / image_file_name
         endtime = stream[0].stats.endtime
+        self._submit_waveform_plot(stream, lod_pyramid, image_file_name, 'hour', endtime - 60 * 60, endtime)
 
-        stream.plot(
-            color=StreamPlotter.get_plot_color(stream),
-            size=IMAGE_SIZE_HOURLY,
-            dpi=OUTFILE_DPI,
-            outfile=image_file_path,
-            starttime=(endtime - 60 * 60),
-            endtime=endtime)
-
-    async def save_last_10_minutes_plot(self, stream: Stream) -> None:
+    async def save_last_10_minutes_plot(self, stream: Stream, lod_pyramid: LodPyramid) -> None:
         # Always create latest.png from last minute
         image_file_name = 'last_10_minutes' + IMAGE_FILE_FORMAT
-        image_file_path = self.directory / image_file_name
         endtime = stream[0].stats.endtime
-        starttime = (endtime - (10 * 60))
-        stream.plot(
-            color=StreamPlotter.get_plot_color(stream),
-            size=IMAGE_SIZE_HOURLY,
-            dpi=OUTFILE_DPI,
-            outfile=image_file_path,
-            starttime=starttime,
-            endtime=endtime)
-
-    async def save_last_60_minutes_plot(self, stream: Stream) -> None:
+        self._submit_waveform_plot(stream, lod_pyramid, image_file_name, 'last_10_minutes', endtime - (10 * 60),
+                                   endtime)
+
+    async def save_last_60_minutes_plot(self, stream: Stream, lod_pyramid: LodPyramid) -> None:
         # Always create latest.png from last minute
         image_file_name = 'last_60_minutes' + IMAGE_FILE_FORMAT
-        image_file_path = self.directory / image_file_name
         endtime = stream[0].stats.endtime
-        starttime = (endtime - (60 * 60))
-        stream.plot(
-            color=StreamPlotter.get_plot_color(stream),
-            size=IMAGE_SIZE_HOURLY,
-            dpi=OUTFILE_DPI,
-            outfile=image_file_path,
-            starttime=starttime,
-            endtime=endtime)
+        self._submit_waveform_plot(stream, lod_pyramid, image_file_name, 'last_60_minutes', endtime - (60 * 60),
+                                   endtime)
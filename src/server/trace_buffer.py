@@ -0,0 +1,66 @@
+from typing import Any, Dict
+
+import numpy
+from numpy.typing import NDArray
+from obspy import Trace
+
+
+class GrowableArray(object):
+    dtype: numpy.dtype
+    size: int
+    _buffer: NDArray
+
+    def __init__(self, capacity: int, dtype: Any):
+        self.dtype = numpy.dtype(dtype)
+        self.size = 0
+        self._buffer = numpy.empty(max(capacity, 1), dtype=self.dtype)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def _ensure_capacity(self, required: int) -> None:
+        if required <= self.capacity:
+            return
+
+        # Double the capacity to keep the cost of growing amortized O(1) per sample
+        new_capacity = max(required, 2 * self.capacity)
+        new_buffer = numpy.empty(new_capacity, dtype=self.dtype)
+        new_buffer[:self.size] = self._buffer[:self.size]
+        self._buffer = new_buffer
+
+    def write(self, index: int, values: NDArray) -> None:
+        # Overwrites from index and grows the array past its end, index may not be beyond the end
+        end = index + len(values)
+        self._ensure_capacity(end)
+        self._buffer[index:end] = values
+        self.size = max(self.size, end)
+
+    def append(self, values: NDArray) -> None:
+        self.write(self.size, values)
+
+    def view(self) -> NDArray:
+        return self._buffer[:self.size]
+
+
+class TraceBuffer(object):
+    samples: GrowableArray
+    trace: Trace
+
+    def __init__(self, header: Dict[str, Any], capacity: int, dtype: Any = 'int16'):
+        self.samples = GrowableArray(capacity, dtype)
+        self.trace = Trace(data=self.samples.view(), header=header)
+
+    @staticmethod
+    def from_trace(trace: Trace, capacity: int) -> 'TraceBuffer':
+        trace_buffer = TraceBuffer(dict(trace.stats), max(capacity, trace.stats.npts), trace.data.dtype)
+        trace_buffer.append(trace.data)
+        return trace_buffer
+
+    def write(self, index: int, values: NDArray) -> None:
+        self.samples.write(index, values)
+        # The trace only ever sees a view over the filled part of the buffer
+        self.trace.data = self.samples.view()
+
+    def append(self, values: NDArray) -> None:
+        self.write(self.samples.size, values)
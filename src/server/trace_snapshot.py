@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from numpy.typing import NDArray
+from obspy import Stream, Trace, UTCDateTime
+from obspy.core import Stats
+
+from src.server.lod_pyramid import LodPyramid
+
+
+@dataclass
+class TraceSnapshot(object):
+    data: NDArray
+    starttime: UTCDateTime
+    sampling_rate: float
+    network: str
+    station: str
+    location: str
+    channel: str
+
+    @staticmethod
+    def _window_indices(stats: Stats,
+                        starttime: Optional[UTCDateTime],
+                        endtime: Optional[UTCDateTime]) -> Tuple[int, int]:
+        start_index = 0
+        end_index = stats.npts
+        if starttime is not None:
+            start_index = min(max(0, int((starttime - stats.starttime) * stats.sampling_rate)), end_index)
+        if endtime is not None:
+            end_index = min(max(start_index, int((endtime - stats.starttime) * stats.sampling_rate) + 1), end_index)
+        return start_index, end_index
+
+    @staticmethod
+    def _from_data(stats: Stats, data: NDArray, starttime: UTCDateTime, sampling_rate: float) -> 'TraceSnapshot':
+        return TraceSnapshot(
+            data=data,
+            starttime=starttime,
+            sampling_rate=sampling_rate,
+            network=stats.network,
+            station=stats.station,
+            location=stats.location,
+            channel=stats.channel
+        )
+
+    @staticmethod
+    def from_stream(stream: Stream,
+                    starttime: Optional[UTCDateTime] = None,
+                    endtime: Optional[UTCDateTime] = None) -> 'TraceSnapshot':
+        stats = stream[0].stats
+        start_index, end_index = TraceSnapshot._window_indices(stats, starttime, endtime)
+        return TraceSnapshot._from_data(
+            stats,
+            # Copy the window so the snapshot doesn't hold on to the whole day buffer when pickled
+            stream[0].data[start_index:end_index].copy(),
+            stats.starttime + start_index / stats.sampling_rate,
+            stats.sampling_rate
+        )
+
+    @staticmethod
+    def from_lod_pyramid(stream: Stream,
+                         lod_pyramid: LodPyramid,
+                         pixels: int,
+                         starttime: Optional[UTCDateTime] = None,
+                         endtime: Optional[UTCDateTime] = None) -> 'TraceSnapshot':
+        stats = stream[0].stats
+        start_index, end_index = TraceSnapshot._window_indices(stats, starttime, endtime)
+        level = lod_pyramid.level_for(end_index - start_index, pixels)
+        if level is None:
+            return TraceSnapshot.from_stream(stream, starttime, endtime)
+
+        start_bucket = start_index // level.bucket_size
+        end_bucket = min(end_index // level.bucket_size + 1, level.size)
+        return TraceSnapshot._from_data(
+            stats,
+            level.envelope(start_bucket, end_bucket),
+            stats.starttime + start_bucket * level.bucket_size / stats.sampling_rate,
+            2 * stats.sampling_rate / level.bucket_size
+        )
+
+    def to_stream(self) -> Stream:
+        header = {'network': self.network, 'station': self.station, 'location': self.location,
+                  'channel': self.channel, 'sampling_rate': self.sampling_rate, 'starttime': self.starttime}
+        return Stream([Trace(data=self.data, header=header)])
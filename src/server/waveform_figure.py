@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Tuple
+
+import numpy
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import MINUTELY, AutoDateFormatter, AutoDateLocator, date2num
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.text import Text
+from matplotlib.ticker import MaxNLocator, ScalarFormatter
+from obspy import Stream, UTCDateTime
+
+SECONDS_PER_DAY = 86400
+# Fixed margins in pixels around the axes, the same as obspy's
+MARGIN_TOP = 60
+MARGIN_BOTTOM = 40
+MARGIN_SIDE = 80
+TITLE_OFFSET = 15
+
+
+class WaveformFigure(object):
+    # The layout of obspy's Stream.plot for a single trace, built once and then only given new data.
+    # Rebuilding the figure, axes and tick layout costs more than drawing it.
+    size: Tuple[int, int]
+    dpi: int
+    figure: Figure
+    canvas: FigureCanvasAgg
+    title: Text
+    axes: Axes
+    line: Line2D
+    label: Text
+
+    def __init__(self, size: Tuple[int, int], dpi: int):
+        self.size = size
+        self.dpi = dpi
+        width, height = size
+        self.figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.title = self.figure.suptitle('', y=(height - TITLE_OFFSET) / height, fontsize='small',
+                                          horizontalalignment='center')
+        self.axes = self.figure.add_subplot(1, 1, 1, facecolor='w')
+        self.line = self.axes.plot([], [], linewidth=1, linestyle='-')[0]
+        # The date ticks obspy sets, whole minutes apart at most for the shorter windows
+        self.axes.xaxis_date()
+        locator = AutoDateLocator(minticks=3, maxticks=6)
+        locator.intervald[MINUTELY] = [1, 2, 5, 10, 15, 30]
+        formatter = AutoDateFormatter(locator)
+        formatter.scaled.update({1.0: '%b %d %Y', 1 / 24: '%H:%M', 1 / (24 * 60): '%H:%M:%S'})
+        self.axes.xaxis.set_major_locator(locator)
+        self.axes.xaxis.set_major_formatter(formatter)
+        self.axes.tick_params(axis='both', labelsize='small')
+        self.label = self.axes.text(0.02, 0.95, '', transform=self.axes.transAxes,
+                                    fontdict=dict(fontsize='small', ha='left', va='top'),
+                                    bbox=dict(boxstyle='round', fc='w', alpha=0.8))
+        self.axes.yaxis.set_major_locator(MaxNLocator(7, prune='both'))
+        self.axes.yaxis.set_major_formatter(ScalarFormatter())
+        self.figure.subplots_adjust(hspace=0, top=1.0 - MARGIN_TOP / height, bottom=MARGIN_BOTTOM / height,
+                                    left=MARGIN_SIDE / width, right=1.0 - MARGIN_SIDE / width / 2)
+
+    def render(self, stream: Stream, color: str, starttime: UTCDateTime, endtime: UTCDateTime, outfile: Path,
+               image_format: str) -> None:
+        stream = stream.copy()
+        stream.trim(starttime, endtime)
+        trace = stream[0]
+        if len(trace.data) == 0:
+            raise ValueError('Nothing to plot')
+
+        self.title.set_text('%s  -  %s' % (starttime.isoformat(), endtime.isoformat()))
+        self.label.set_text(trace.id)
+        self.line.set_data(trace.times() / SECONDS_PER_DAY + date2num(trace.stats.starttime.datetime),
+                           numpy.require(trace.data, numpy.float64) * trace.stats.calib)
+        self.line.set_color(color)
+        # The y limits are found from the data as for a new plot, the x limits are the requested window
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.axes.set_xlim(date2num(starttime.datetime), date2num(endtime.datetime))
+        self.figure.savefig(outfile, format=image_format, dpi=self.dpi, facecolor='w', edgecolor='w')
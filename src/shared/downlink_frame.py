@@ -0,0 +1,146 @@
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Union
+
+import numpy
+from numpy.typing import NDArray
+
+DOWNLINK_FORMAT_JSON = 'json'
+DOWNLINK_FORMAT_BINARY = 'binary'
+DOWNLINK_FORMAT_DELTA = 'delta'
+DOWNLINK_FORMATS = [DOWNLINK_FORMAT_JSON, DOWNLINK_FORMAT_BINARY, DOWNLINK_FORMAT_DELTA]
+
+DOWNLINK_FRAME_MAGIC = b'SEIW'
+DOWNLINK_FRAME_VERSION = 1
+
+# magic, version, encoding, rate or 0 for every sample, sample count, stats length
+_HEADER = struct.Struct('<4sBBHII')
+_ENCODING_INT16 = 1
+_ENCODING_INT32 = 2
+# Differences to the previous sample, zigzag mapped and written as varints
+_ENCODING_DELTA = 3
+_DTYPES = {_ENCODING_INT16: numpy.dtype('<i2'), _ENCODING_INT32: numpy.dtype('<i4')}
+_INT16_INFO = numpy.iinfo('int16')
+
+Message = Union[str, bytes]
+
+
+class InvalidDownlinkFrame(Exception):
+    pass
+
+
+def encode_varints(values: NDArray) -> bytes:
+    # Seven bits a byte, least significant first, with the top bit set on every byte but the last of a value
+    remaining = numpy.asarray(values, dtype='uint64')
+    lengths = numpy.ones(len(remaining), dtype='int64')
+    groups = [(remaining & 0x7f).astype('uint8')]
+    remaining = remaining >> numpy.uint64(7)
+    while remaining.any():
+        lengths += remaining != 0
+        groups.append((remaining & 0x7f).astype('uint8'))
+        remaining = remaining >> numpy.uint64(7)
+
+    table = numpy.stack(groups, axis=1)
+    positions = numpy.arange(len(groups))
+    table[positions < lengths[:, None] - 1] |= 0x80
+    return table[positions < lengths[:, None]].tobytes()
+
+
+def decode_varints(data: bytes, count: int) -> NDArray:
+    data = numpy.frombuffer(data, dtype='uint8')
+    ends = numpy.flatnonzero(data < 0x80)
+    if len(ends) != count or (count > 0 and ends[-1] != len(data) - 1) or (count == 0 and len(data) > 0):
+        raise InvalidDownlinkFrame('Payload does not hold the sample count')
+    if count == 0:
+        return numpy.empty(0, dtype='uint64')
+
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    positions = numpy.arange(len(data)) - numpy.repeat(starts, ends - starts + 1)
+    shifted = (data & 0x7f).astype('uint64') << (7 * positions).astype('uint64')
+    return numpy.add.reduceat(shifted, starts)
+
+
+def _zigzag_deltas(values: NDArray) -> NDArray:
+    # Every frame starts from zero, so a client can decode it without the ones dropped before it
+    deltas = numpy.diff(numpy.asarray(values, dtype='int64'), prepend=0)
+    return ((deltas << 1) ^ (deltas >> 63)).astype('uint64')
+
+
+def _undo_zigzag_deltas(zigzag: NDArray) -> NDArray:
+    deltas = (zigzag >> numpy.uint64(1)).astype('int64') ^ -(zigzag & numpy.uint64(1)).astype('int64')
+    return numpy.cumsum(deltas)
+
+
+@dataclass
+class DownlinkFrame(object):
+    # The samples sent to a web client, or min/max envelopes of them at rate buckets a second
+    values: NDArray
+    stats: Optional[Dict[str, Any]]
+    rate: Optional[int] = None
+
+    def to_json(self) -> str:
+        message: Dict[str, Any] = {'type': 'data'}
+        if self.rate is not None:
+            message['rate'] = self.rate
+        message['values'] = self.values.tolist()
+        message['stats'] = self.stats
+        return json.dumps(message)
+
+    def to_bytes(self, delta: bool = False) -> bytes:
+        stats = json.dumps(self.stats).encode()
+        if delta:
+            encoding = _ENCODING_DELTA
+        elif len(self.values) == 0 or (_INT16_INFO.min <= self.values.min() and self.values.max() <= _INT16_INFO.max):
+            encoding = _ENCODING_INT16
+        else:
+            encoding = _ENCODING_INT32
+        header = _HEADER.pack(DOWNLINK_FRAME_MAGIC, DOWNLINK_FRAME_VERSION, encoding, self.rate or 0,
+                              len(self.values), len(stats))
+        if delta:
+            return header + stats + encode_varints(_zigzag_deltas(self.values))
+
+        dtype = _DTYPES[encoding]
+        # Padded like the uplink frames, so a browser can view the samples without copying
+        padding = b'\0' * (-(len(header) + len(stats)) % dtype.itemsize)
+        return header + stats + padding + self.values.astype(dtype, copy=False).tobytes()
+
+    def encode(self, downlink_format: str) -> Message:
+        if downlink_format == DOWNLINK_FORMAT_JSON:
+            return self.to_json()
+        return self.to_bytes(downlink_format == DOWNLINK_FORMAT_DELTA)
+
+    @staticmethod
+    def from_json(message: str) -> 'DownlinkFrame':
+        data: Dict[str, Any] = json.loads(message)
+        return DownlinkFrame(values=numpy.array(data['values'], dtype='int32'), stats=data['stats'],
+                             rate=data.get('rate'))
+
+    @staticmethod
+    def from_bytes(message: bytes) -> 'DownlinkFrame':
+        # The reference for decoders in the web clients
+        if len(message) < _HEADER.size:
+            raise InvalidDownlinkFrame('Frame shorter than its header')
+
+        magic, version, encoding, rate, sample_count, stats_length = _HEADER.unpack_from(message)
+        if magic != DOWNLINK_FRAME_MAGIC or version != DOWNLINK_FRAME_VERSION or \
+                encoding not in [_ENCODING_INT16, _ENCODING_INT32, _ENCODING_DELTA]:
+            raise InvalidDownlinkFrame('Unsupported frame')
+
+        stats_end = _HEADER.size + stats_length
+        if encoding == _ENCODING_DELTA:
+            values = _undo_zigzag_deltas(decode_varints(message[stats_end:], sample_count)).astype('int32')
+        else:
+            dtype = _DTYPES[encoding]
+            payload_offset = stats_end + (-stats_end % dtype.itemsize)
+            if len(message) != payload_offset + sample_count * dtype.itemsize:
+                raise InvalidDownlinkFrame('Frame length does not match its header')
+            values = numpy.frombuffer(message, dtype=dtype, count=sample_count, offset=payload_offset)
+
+        return DownlinkFrame(values=values, stats=json.loads(message[_HEADER.size:stats_end]), rate=rate or None)
+
+    @staticmethod
+    def decode(message: Message) -> 'DownlinkFrame':
+        if isinstance(message, bytes):
+            return DownlinkFrame.from_bytes(message)
+        return DownlinkFrame.from_json(message)
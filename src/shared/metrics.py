@@ -0,0 +1,187 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+# Upper bounds in seconds, from 100 us to 10 s
+DEFAULT_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SUMMARY_QUANTILES = [0.5, 0.99]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (key, value) for key, value in labels.items()) + '}'
+
+
+class Histogram(object):
+    name: str
+    help: str
+    buckets: List[float]
+    counts: List[int]
+    total: float
+    count: int
+    _lock: threading.Lock
+
+    def __init__(self, name: str, help: str, buckets: Optional[List[float]] = None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets or DEFAULT_BUCKETS
+        # The last count is for values above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        t1 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t1)
+
+    def quantile(self, q: float) -> float:
+        # The upper bound of the bucket the quantile falls in, exact enough to tell the stages apart
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative > 0:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return 0.0
+
+    def render(self) -> List[str]:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append('%s_bucket{le="%g"} %d' % (self.name, bound, cumulative))
+        lines.append('%s_bucket{le="+Inf"} %d' % (self.name, self.count))
+        lines.append('%s_sum %g' % (self.name, self.total))
+        lines.append('%s_count %d' % (self.name, self.count))
+        return lines
+
+    def summary(self) -> Dict[str, Any]:
+        return {'count': self.count, 'sum': self.total,
+                'quantiles': {str(q): self.quantile(q) for q in SUMMARY_QUANTILES}}
+
+
+class Counter(object):
+    name: str
+    help: str
+    value: float
+    _lock: threading.Lock
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return ['# HELP %s %s' % (self.name, self.help), '# TYPE %s counter' % self.name,
+                '%s %g' % (self.name, self.value)]
+
+    def summary(self) -> float:
+        return self.value
+
+
+class Gauge(object):
+    name: str
+    help: str
+    value: float
+    # Read when the gauge is rendered, for values like queue depths that are cheaper to look up than to track
+    function: Optional[Callable[[], float]]
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+    def render(self) -> List[str]:
+        return ['# HELP %s %s' % (self.name, self.help), '# TYPE %s gauge' % self.name,
+                '%s %g' % (self.name, self.get())]
+
+    def summary(self) -> float:
+        return self.get()
+
+
+Metric = Union[Histogram, Counter, Gauge]
+
+
+class MetricsRegistry(object):
+    metrics: Dict[str, Metric]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, create: Callable[[], Metric]) -> Metric:
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = create()
+                self.metrics[name] = metric
+            return metric
+
+    def histogram(self, name: str, help: str, buckets: Optional[List[float]] = None) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help, buckets))
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help))
+
+    def gauge(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._get_or_create(name, lambda: Gauge(name, help, function))
+        if function is not None:
+            # The newest owner of a queue is the one worth reporting
+            gauge.function = function
+        return gauge
+
+    def render_text(self) -> str:
+        # Prometheus text exposition format
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, Any]:
+        # A compact form of every metric, small enough to travel with the logger's upload stats
+        return {name: metric.summary() for name, metric in list(self.metrics.items())}
+
+
+def render_summary(summary: Dict[str, Any], labels: Dict[str, str]) -> str:
+    # Metrics summarised by another process, rendered as Prometheus summaries and untyped values
+    lines = []
+    for name, value in summary.items():
+        if isinstance(value, dict):
+            for q, quantile in value.get('quantiles', {}).items():
+                lines.append('%s%s %g' % (name, _format_labels({**labels, 'quantile': q}), quantile))
+            lines.append('%s_sum%s %g' % (name, _format_labels(labels), value.get('sum', 0)))
+            lines.append('%s_count%s %d' % (name, _format_labels(labels), value.get('count', 0)))
+        elif isinstance(value, (int, float)):
+            lines.append('%s%s %g' % (name, _format_labels(labels), value))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,102 @@
+import io
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+from typing import Optional
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_ALLOCATION_COUNT = 25
+MAX_PROFILE_SECONDS = 600
+
+
+def _fold_stack(thread_name: str, frame) -> str:
+    # One line of the folded format read by flamegraph.pl and speedscope, outermost call first
+    functions = []
+    while frame is not None:
+        code = frame.f_code
+        functions.append('%s (%s:%d)' % (code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join([thread_name] + functions[::-1])
+
+
+class SamplingProfiler(object):
+    # Samples the stacks of every thread and traces allocations while started, nothing runs in between
+    interval: float
+    allocation_count: int
+    stacks: Counter
+    sample_count: int
+    started_at: float
+    _thread: Optional[threading.Thread] = None
+    _stopping: threading.Event
+    _traces_allocations: bool
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL, allocation_count: int = DEFAULT_ALLOCATION_COUNT):
+        self.interval = interval
+        self.allocation_count = allocation_count
+        self.stacks = Counter()
+        self.sample_count = 0
+        self.started_at = 0
+        self._stopping = threading.Event()
+        self._traces_allocations = False
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        self.stacks = Counter()
+        self.sample_count = 0
+        self.started_at = time.time()
+        self._stopping = threading.Event()
+        # Tracing started by someone else is left running
+        self._traces_allocations = not tracemalloc.is_tracing()
+        if self._traces_allocations:
+            tracemalloc.start()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.stacks[_fold_stack(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.sample_count += 1
+
+    def stop(self) -> bytes:
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        duration = time.time() - self.started_at
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if self._traces_allocations:
+            tracemalloc.stop()
+        return self._artifact(duration, snapshot)
+
+    def _artifact(self, duration: float, snapshot: Optional[tracemalloc.Snapshot]) -> bytes:
+        own_functions = Counter()
+        for stack, count in self.stacks.items():
+            own_functions[stack.rsplit(';', 1)[-1]] += count
+
+        summary = ['Profile started %s, %.1f s, %d samples every %g ms' % (
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)), duration, self.sample_count,
+            self.interval * 1000), '', 'Most sampled functions, in samples of any thread:']
+        summary.extend('%8d  %s' % (count, function) for function, count in own_functions.most_common(25))
+
+        allocations = ['Memory allocated during the profile and still in use, by line:']
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                               tracemalloc.Filter(False, __file__)])
+            allocations.extend(str(statistic) for statistic in
+                               snapshot.statistics('lineno')[:self.allocation_count])
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('summary.txt', '\n'.join(summary) + '\n')
+            archive.writestr('stacks.folded', ''.join('%s %d\n' % (stack, count)
+                                                      for stack, count in self.stacks.most_common()))
+            archive.writestr('allocations.txt', '\n'.join(allocations) + '\n')
+        return buffer.getvalue()
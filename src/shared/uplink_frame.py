@@ -0,0 +1,100 @@
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy
+from numpy.typing import NDArray
+
+UPLINK_FORMAT_JSON = 'json'
+UPLINK_FORMAT_BINARY = 'binary'
+
+UPLINK_FRAME_MAGIC = b'SEIS'
+UPLINK_FRAME_VERSION = 1
+
+# Set on frames holding spooled data sent after an outage, to be stored but not broadcast
+UPLINK_FLAG_REPLAY = 0x01
+
+# magic, version, dtype code, flags, sequence number, first sample time, sampling rate, sample count, stats length
+_HEADER = struct.Struct('<4sBBHIdfII')
+_DTYPE_CODES = {1: numpy.dtype('<i2'), 2: numpy.dtype('<i4')}
+_DTYPE_CODE_BY_DTYPE = {dtype: code for code, dtype in _DTYPE_CODES.items()}
+_INT16_INFO = numpy.iinfo('int16')
+
+
+class InvalidUplinkFrame(Exception):
+    pass
+
+
+@dataclass
+class UplinkFrame(object):
+    sequence_number: int
+    starttime: float
+    sampling_rate: float
+    values: NDArray
+    stats: Dict[str, Any]
+    flags: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'type': 'post_data',
+            'sequence_number': self.sequence_number,
+            'starttime': self.starttime,
+            'sampling_rate': self.sampling_rate,
+            'values': self.values.tolist(),
+            'stats': self.stats,
+            'flags': self.flags
+        })
+
+    @staticmethod
+    def from_json(message: str) -> 'UplinkFrame':
+        data: Dict[str, Any] = json.loads(message)
+        stats = data['stats']
+        return UplinkFrame(
+            # Older loggers only send values and stats
+            sequence_number=data.get('sequence_number', 0),
+            starttime=data.get('starttime', 0.0),
+            sampling_rate=data.get('sampling_rate', stats.get('decimated_sampling_rate', 0)),
+            values=numpy.array(data['values'], dtype='int32'),
+            stats=stats,
+            flags=data.get('flags', 0)
+        )
+
+    def to_bytes(self) -> bytes:
+        if len(self.values) == 0 or (_INT16_INFO.min <= self.values.min() and self.values.max() <= _INT16_INFO.max):
+            dtype = numpy.dtype('<i2')
+        else:
+            dtype = numpy.dtype('<i4')
+
+        stats = json.dumps(self.stats).encode()
+        header = _HEADER.pack(UPLINK_FRAME_MAGIC, UPLINK_FRAME_VERSION, _DTYPE_CODE_BY_DTYPE[dtype], self.flags,
+                              self.sequence_number, self.starttime, self.sampling_rate, len(self.values), len(stats))
+        # Pad so the payload is aligned to its item size and can be used in place by the receiver
+        padding = b'\0' * (-(len(header) + len(stats)) % dtype.itemsize)
+        return header + stats + padding + self.values.astype(dtype, copy=False).tobytes()
+
+    @staticmethod
+    def from_bytes(message: bytes) -> 'UplinkFrame':
+        if len(message) < _HEADER.size:
+            raise InvalidUplinkFrame('Frame shorter than its header')
+
+        magic, version, dtype_code, flags, sequence_number, starttime, sampling_rate, sample_count, stats_length = \
+            _HEADER.unpack_from(message)
+        dtype: Optional[numpy.dtype] = _DTYPE_CODES.get(dtype_code)
+        if magic != UPLINK_FRAME_MAGIC or version != UPLINK_FRAME_VERSION or dtype is None:
+            raise InvalidUplinkFrame('Unsupported frame')
+
+        stats_end = _HEADER.size + stats_length
+        payload_offset = stats_end + (-stats_end % dtype.itemsize)
+        if len(message) != payload_offset + sample_count * dtype.itemsize:
+            raise InvalidUplinkFrame('Frame length does not match its header')
+
+        return UplinkFrame(
+            sequence_number=sequence_number,
+            starttime=starttime,
+            sampling_rate=sampling_rate,
+            # A read-only view straight into the received message
+            values=numpy.frombuffer(message, dtype=dtype, count=sample_count, offset=payload_offset),
+            stats=json.loads(message[_HEADER.size:stats_end]),
+            flags=flags
+        )
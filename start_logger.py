@@ -1,6 +1,8 @@
+import math
 import os
 import sys
 
+from src.client.adc_config import MAX_REPLAY_SPEED
 from src.client.create_web_api_socket import start_websocket_and_logger
 from src.shared.Constants import SEISMOMETER_IDS
 
@@ -13,7 +15,17 @@ if __name__ == "__main__":
     else:
         seismometer_id = sys.argv[1]
         mock_adc = len(sys.argv) > 2 and sys.argv[2] == '--mock-adc'
-        if seismometer_id in SEISMOMETER_IDS:
-            start_websocket_and_logger(seismometer_id, mock_adc)
+        # Replays the archive in files/<seismometer_id>/mseed, or REPLAY_DIRECTORY, at an optional speed-up
+        replay_speed = None
+        if len(sys.argv) > 2 and sys.argv[2] == '--replay-adc':
+            try:
+                replay_speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+            except ValueError:
+                replay_speed = math.nan
+        if replay_speed is not None and not 1 <= replay_speed <= MAX_REPLAY_SPEED:
+            print("Invalid replay speed:", sys.argv[3])
+            print("Usage: python start_logger.py <seismometer_id> --replay-adc [speed from 1 to %d]" % MAX_REPLAY_SPEED)
+        elif seismometer_id in SEISMOMETER_IDS:
+            start_websocket_and_logger(seismometer_id, mock_adc, replay_speed)
         else:
             print("Invalid seismometer_id:", seismometer_id)
@@ -1,9 +1,12 @@
 import os
 
 from src.server.server_request_handler import ServerRequestHandler
+from src.server.sharded_request_handler import ShardedServerRequestHandler
 
 if __name__ == "__main__":
     if 'AUTH_TOKEN' not in os.environ:
         print("Missing AUTH_TOKEN as environment variable")
+    elif os.environ.get('SHARDED_SERVER') == '1':
+        ShardedServerRequestHandler().start_server()
     else:
         ServerRequestHandler().start_server()
@@ -0,0 +1,17 @@
+import pytest
+
+from src.client.adc_config import AdcConfig, SPI_BACKEND_BITBANG, SPI_BACKENDS
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+
+
+@pytest.mark.parametrize('spi_backend', SPI_BACKENDS)
+def test_spi_backend_is_read_from_the_environment(monkeypatch, spi_backend: str):
+    monkeypatch.setenv('SPI_BACKEND', spi_backend)
+    assert AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False).spi_backend == spi_backend
+
+
+def test_spi_backend_defaults_to_bitbang(monkeypatch):
+    monkeypatch.delenv('SPI_BACKEND', raising=False)
+    assert AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False).spi_backend == SPI_BACKEND_BITBANG
+    monkeypatch.setenv('SPI_BACKEND', 'i2c')
+    assert AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False).spi_backend == SPI_BACKEND_BITBANG
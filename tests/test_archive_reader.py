@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+
+import numpy
+from obspy import Trace, UTCDateTime
+
+from src.server.archive_reader import ArchiveReader
+from src.server.seismometer import MSEED_FILES_DIRECTORY
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE, archive_file_path, write_archive_file
+
+SEISMOMETER_ID = 'archive_test'
+# The rate of the archives from before the nominal rate, as they are migrated
+LEGACY_SAMPLING_RATE = 100
+
+
+def _trace(values: numpy.ndarray, starttime: UTCDateTime, sampling_rate: float) -> Trace:
+    return Trace(data=values, header={'network': 'XX', 'station': 'TEST', 'channel': 'BHZ',
+                                      'sampling_rate': sampling_rate, 'starttime': starttime,
+                                      'mseed': {'dataquality': 'D'}})
+
+
+def _reference_min_max(traces, starttime: UTCDateTime, sample_count: int, bucket_size: int) -> tuple:
+    minimum = numpy.full(-(-sample_count // bucket_size), numpy.inf)
+    maximum = numpy.full(len(minimum), -numpy.inf)
+    for trace in traces:
+        times = trace.stats.starttime - starttime + numpy.arange(trace.stats.npts) / trace.stats.sampling_rate
+        positions = numpy.round(times * NOMINAL_SAMPLING_RATE).astype('int64')
+        inside = (positions >= 0) & (positions < sample_count)
+        numpy.minimum.at(minimum, positions[inside] // bucket_size, trace.data[inside])
+        numpy.maximum.at(maximum, positions[inside] // bucket_size, trace.data[inside])
+    return [None if numpy.isinf(value) else value for value in minimum.tolist()], \
+        [None if numpy.isinf(value) else value for value in maximum.tolist()]
+
+
+def test_query_covers_records_at_a_legacy_rate(tmp_path: Path):
+    midnight = UTCDateTime(2024, 3, 1)
+    rng = numpy.random.default_rng(0)
+    # A migrated morning at the legacy rate, then the afternoon at the nominal rate
+    traces = [_trace(rng.integers(-3000, 3000, 6 * 60 * 60 * LEGACY_SAMPLING_RATE).astype('int32'),
+                     midnight + 6 * 60 * 60, LEGACY_SAMPLING_RATE),
+              _trace(rng.integers(-3000, 3000, 6 * 60 * 60 * NOMINAL_SAMPLING_RATE).astype('int32'),
+                     midnight + 12 * 60 * 60, NOMINAL_SAMPLING_RATE)]
+    write_archive_file(archive_file_path(tmp_path / SEISMOMETER_ID / MSEED_FILES_DIRECTORY, midnight.date),
+                       traces, False)
+
+    reader = ArchiveReader(tmp_path)
+    starttime = midnight + 5 * 60 * 60
+    endtime = midnight + 13 * 60 * 60
+    message = json.loads(reader.query(SEISMOMETER_ID, starttime, endtime, 500))
+    reader.close()
+
+    bucket_size = round(message['bucket_seconds'] * NOMINAL_SAMPLING_RATE)
+    minimum, maximum = _reference_min_max(traces, starttime, round((endtime - starttime) * NOMINAL_SAMPLING_RATE),
+                                          bucket_size)
+    assert message['min'] == minimum
+    assert message['max'] == maximum
+    # Only the hour before the legacy records has no samples
+    assert message['min'].count(None) == 60 * 60 * NOMINAL_SAMPLING_RATE // bucket_size
@@ -0,0 +1,50 @@
+import asyncio
+from typing import List
+
+from src.server.broadcaster import Broadcaster
+
+SEISMOMETER_ID = 'broadcast_test'
+
+
+class FailingWebClient(object):
+    messages: List[str]
+    closed: bool
+
+    def __init__(self, fail_on: int):
+        self.messages = []
+        self.closed = False
+        self.fail_on = fail_on
+
+    async def send(self, message: str) -> None:
+        if len(self.messages) == self.fail_on:
+            raise RuntimeError('Encoding failed')
+        self.messages.append(message)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+async def _publish(messages: int) -> tuple:
+    broadcaster = Broadcaster()
+    failing = FailingWebClient(fail_on=1)
+    healthy = FailingWebClient(fail_on=-1)
+    broadcaster.subscribe(SEISMOMETER_ID, failing)
+    broadcaster.subscribe(SEISMOMETER_ID, healthy)
+    for index in range(messages):
+        broadcaster.publish(SEISMOMETER_ID, str(index))
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+    subscriber_count = broadcaster.subscriber_count(SEISMOMETER_ID)
+    feeds = broadcaster.subscribed_feeds(SEISMOMETER_ID)
+    broadcaster.unsubscribe(SEISMOMETER_ID, healthy)
+    return failing, healthy, subscriber_count, feeds
+
+
+def test_failed_send_unsubscribes_and_closes_the_client():
+    failing, healthy, subscriber_count, feeds = asyncio.run(_publish(5))
+    assert failing.messages == ['0']
+    assert failing.closed
+    assert healthy.messages == ['0', '1', '2', '3', '4']
+    assert not healthy.closed
+    assert subscriber_count == 1
+    assert feeds == {(None, 'json')}
@@ -0,0 +1,176 @@
+import queue
+from typing import List, Optional
+
+import numpy
+import pytest
+
+from src.client import data_sampler
+from src.client.adc_config import AdcConfig, SPI_BACKEND_SIMULATED
+from src.client.adc_wrapper import AdcWrapper, MockAdc
+from src.client.data_box import DataBox
+from src.client.data_sampler import DataSampler, MAX_CATCH_UP_SLOTS, TIMING_HISTOGRAM_BINS_US
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+
+SAMPLING_RATE = 750
+PERIOD_NS = 1_000_000_000 // SAMPLING_RATE
+SCALE_FACTOR = 8
+
+
+class FakeClock(object):
+    # Stands in for the time module, sleeping only moves the clock on, by the given overshoots past the deadline
+    now_ns: int
+    overshoots_ns: List[int]
+    sleeps: int
+
+    def __init__(self):
+        self.now_ns = 1_000_000_000
+        self.overshoots_ns = []
+        self.sleeps = 0
+
+    def monotonic_ns(self) -> int:
+        return self.now_ns
+
+    def time_ns(self) -> int:
+        return 1_700_000_000_000_000_000 + self.now_ns
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps += 1
+        self.now_ns += round(seconds * 1_000_000_000)
+        if self.overshoots_ns:
+            self.now_ns += self.overshoots_ns.pop(0)
+
+
+class CountingAdc(MockAdc):
+    # Counts up with every read and stalls the clock during one of them
+    clock: FakeClock
+    reads: int
+    stall_at: int
+    stall_ns: int
+
+    def __init__(self, clock: FakeClock, stall_at: int = -1, stall_ns: int = 0):
+        self.clock = clock
+        self.reads = 0
+        self.stall_at = stall_at
+        self.stall_ns = stall_ns
+
+    def read_adc(self, channel: int) -> int:
+        if self.reads == self.stall_at:
+            self.clock.now_ns += self.stall_ns
+        self.reads += 1
+        return 100 + self.reads
+
+
+def _sampler(monkeypatch, clock: FakeClock, batch_size: int, replay_speed: Optional[float] = None,
+             adc: Optional[MockAdc] = None, block_size: int = 1, spi_backend: Optional[str] = None) -> DataSampler:
+    monkeypatch.setattr(data_sampler, 'time', clock)
+    if spi_backend is not None:
+        monkeypatch.setenv('SPI_BACKEND', spi_backend)
+    wrapper = AdcWrapper(AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, spi_backend is None))
+    if adc is not None:
+        wrapper.adc = adc
+    return DataSampler(wrapper, queue.Queue(), DataBox(batch_size), SCALE_FACTOR, SAMPLING_RATE, block_size,
+                       replay_speed)
+
+
+def test_reads_are_scheduled_against_absolute_deadlines(monkeypatch):
+    clock = FakeClock()
+    sampler = _sampler(monkeypatch, clock, 75)
+    start_ns = clock.now_ns + PERIOD_NS
+    sampler.next_deadline_ns = start_ns
+    # Every wake up is late, the lateness must not add up over the batch
+    clock.overshoots_ns = [40_000] * 75
+    sampler.sample_batch()
+
+    data = sampler.data_queue.get_nowait()
+    assert len(data.values) == 75
+    assert isinstance(sampler.adc.adc, MockAdc)
+    assert numpy.array_equal(sampler._deadlines_ns, start_ns + numpy.arange(75) * PERIOD_NS)
+    assert numpy.array_equal(sampler._read_times_ns, sampler._deadlines_ns + 40_000)
+    assert sampler.next_deadline_ns == start_ns + 75 * PERIOD_NS
+    assert data.timing_stats['missed_slots'] == 0
+    assert data.timing_stats['deadline_error_max_us'] == 40
+    assert data.timing_stats['interval_error_max_us'] == 0
+    assert data.start_time == (start_ns + clock.time_ns() - clock.monotonic_ns()) / 1_000_000_000
+
+
+def test_missed_slots_repeat_the_previous_value(monkeypatch):
+    clock = FakeClock()
+    stalled_slots = MAX_CATCH_UP_SLOTS + 4
+    sampler = _sampler(monkeypatch, clock, 40, adc=CountingAdc(clock, 10, stalled_slots * PERIOD_NS))
+    sampler.next_deadline_ns = clock.now_ns
+    sampler.sample_batch()
+
+    data = sampler.data_queue.get_nowait()
+    # The read after the stall is one slot late, the slots in between hold the eleventh value
+    reads = [100 + read for read in range(1, 12)] + [111] * (stalled_slots - 1) + \
+        [100 + read for read in range(12, 40 - stalled_slots + 2)]
+    assert data.values == [value * SCALE_FACTOR for value in reads]
+    assert data.timing_stats['missed_slots'] == stalled_slots - 1
+    assert numpy.array_equal(sampler._deadlines_ns, sampler._deadlines_ns[0] + numpy.arange(40) * PERIOD_NS)
+    # The counter starts over with the next batch
+    assert sampler.missed_slots == 0
+
+
+def test_falling_behind_by_a_few_slots_catches_up_by_reading_back_to_back(monkeypatch):
+    clock = FakeClock()
+    sampler = _sampler(monkeypatch, clock, 40, adc=CountingAdc(clock, 10, MAX_CATCH_UP_SLOTS * PERIOD_NS))
+    sampler.next_deadline_ns = clock.now_ns
+    sampler.sample_batch()
+
+    data = sampler.data_queue.get_nowait()
+    assert data.values == [(100 + read) * SCALE_FACTOR for read in range(1, 41)]
+    assert data.timing_stats['missed_slots'] == 0
+    assert data.timing_stats['deadline_error_max_us'] == (MAX_CATCH_UP_SLOTS - 1) * PERIOD_NS / 1000
+
+
+def test_block_reads_schedule_only_the_start_of_each_block(monkeypatch):
+    clock = FakeClock()
+    sampler = _sampler(monkeypatch, clock, 100, block_size=30, spi_backend=SPI_BACKEND_SIMULATED)
+    sampler.next_deadline_ns = clock.now_ns + PERIOD_NS
+    start_ns = sampler.next_deadline_ns
+    sampler.sample_batch()
+
+    data = sampler.data_queue.get_nowait()
+    assert clock.sleeps == 4
+    t = numpy.arange(100) / SAMPLING_RATE
+    assert data.values == (numpy.rint(numpy.sin(2 * t) * 100 + 2048) * SCALE_FACTOR).astype(int).tolist()
+    assert numpy.array_equal(sampler._deadlines_ns, start_ns + numpy.arange(100) * PERIOD_NS)
+    assert numpy.array_equal(sampler._read_times_ns, sampler._deadlines_ns)
+    assert sampler.actual_sampling_rate == pytest.approx(1_000_000_000 / PERIOD_NS)
+
+
+def test_replay_runs_the_clock_faster(monkeypatch):
+    clock = FakeClock()
+    stall_ns = 3 * MAX_CATCH_UP_SLOTS * PERIOD_NS
+    sampler = _sampler(monkeypatch, clock, 75, 10, CountingAdc(clock, 110, stall_ns))
+    start_ns = clock.now_ns
+    sampler.next_deadline_ns = sampler._now_ns()
+    sampler.sample_batch()
+
+    # A tenth of the time the batch takes in real time
+    assert abs(clock.now_ns - start_ns - 74 * PERIOD_NS / 10) < PERIOD_NS / 10
+    assert sampler.actual_sampling_rate == pytest.approx(SAMPLING_RATE, rel=1e-3)
+
+    # Falling far behind is caught up on without holding any slot
+    sampler.sample_batch()
+    values = [data.values for data in [sampler.data_queue.get_nowait(), sampler.data_queue.get_nowait()]]
+    assert values == [[(100 + read) * SCALE_FACTOR for read in range(start, start + 75)] for start in [1, 76]]
+    assert sampler.missed_slots == 0
+
+
+def test_timing_stats_and_interval_histogram(monkeypatch):
+    clock = FakeClock()
+    sampler = _sampler(monkeypatch, clock, 5)
+    sampler.next_deadline_ns = clock.now_ns + PERIOD_NS
+    clock.overshoots_ns = [0, 60_000, 60_000, 360_000, 0]
+    sampler.sample_batch()
+
+    stats = sampler.data_queue.get_nowait().timing_stats
+    deadline_errors_us = [0, 60, 60, 360, 0]
+    interval_errors_us = [60, 0, 300, 360]
+    assert stats['deadline_error_max_us'] == 360
+    assert stats['deadline_error_p99_us'] == numpy.percentile(deadline_errors_us, 99)
+    assert stats['interval_error_max_us'] == 360
+    assert stats['interval_error_p99_us'] == numpy.percentile(interval_errors_us, 99)
+    assert stats['interval_error_histogram_bins_us'] == TIMING_HISTOGRAM_BINS_US
+    assert stats['interval_error_histogram'] == [1, 1, 0, 2, 0, 0, 0]
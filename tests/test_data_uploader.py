@@ -0,0 +1,49 @@
+import queue
+from pathlib import Path
+
+import numpy
+
+from src.client import data_uploader
+from src.client.data_processor import DataProcessor
+from src.client.data_uploader import DataUploader
+from src.client.data_uploader_data import DataUploaderData
+from src.client.spool import Spool
+from src.client.streaming_statistics import StreamingStatistics
+from src.shared.uplink_frame import UPLINK_FORMAT_BINARY
+
+SAMPLING_RATE = 30
+TIMING_STATS = {'missed_slots': 0, 'deadline_error_max_us': 12.5, 'interval_error_histogram_bins_us': [0, 10, 100],
+                'interval_error_histogram': [100, 19]}
+
+
+def _uploader(tmp_path: Path) -> DataUploader:
+    statistics = StreamingStatistics(10, invalid_value=-1)
+    return DataUploader(None, queue.Queue(), DataProcessor(SAMPLING_RATE, SAMPLING_RATE, statistics, False, None),
+                        statistics, 2 ** 15, SAMPLING_RATE, SAMPLING_RATE, UPLINK_FORMAT_BINARY,
+                        Spool(tmp_path), metrics_interval=60)
+
+
+def _data(second: int) -> DataUploaderData:
+    return DataUploaderData(values=numpy.full(4 * SAMPLING_RATE, 100), bias_point=None,
+                            actual_sampling_rate=SAMPLING_RATE, start_time=1709251200.0 + second,
+                            timing_stats=TIMING_STATS)
+
+
+def test_metrics_and_histogram_are_sent_once_a_metrics_interval(tmp_path: Path, monkeypatch):
+    uploader = _uploader(tmp_path)
+    frames = []
+    for second in range(0, 124, 4):
+        monkeypatch.setattr(data_uploader.time, 'monotonic', lambda: 1000.0 + second)
+        frames.append(uploader._create_frame(_data(second)))
+
+    with_metrics = [index for index, frame in enumerate(frames) if 'metrics' in frame.stats]
+    assert with_metrics == [0, 15, 30]
+    for frame in frames:
+        assert frame.stats['missed_slots'] == 0
+        assert ('interval_error_histogram' in frame.stats) == ('metrics' in frame.stats)
+    # The histogram counts every batch since the frame that carried it last
+    assert frames[0].stats['interval_error_histogram'] == [100, 19]
+    assert frames[15].stats['interval_error_histogram'] == [1500, 285]
+    assert frames[15].stats['interval_error_histogram_bins_us'] == [0, 10, 100]
+    # The frames in between carry a small, fixed set of stats
+    assert len(frames[1].to_bytes()) < len(frames[0].to_bytes()) - 200
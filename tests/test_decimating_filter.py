@@ -0,0 +1,48 @@
+import numpy
+import pytest
+from scipy import signal
+
+from src.client.data_filter_config import DataFilterConfig
+from src.client.decimating_filter import DecimatingFilter
+
+SAMPLING_RATE = 750
+FILTER_CUTOFF_FREQ = 6
+FILTER_ORDER = 8
+
+
+def _samples(count: int) -> numpy.ndarray:
+    rng = numpy.random.default_rng(0)
+    t = numpy.arange(count) / SAMPLING_RATE
+    return numpy.rint(16000 + 800 * numpy.sin(2 * numpy.pi * 0.5 * t) + rng.normal(0, 300, count))
+
+
+def _reference(filter_config: DataFilterConfig, decimation_factor: int, data: numpy.ndarray) -> numpy.ndarray:
+    # The Butterworth filter as second-order sections at the full rate, then every Mth sample kept
+    sos = signal.butter(filter_config.filter_order, filter_config.filter_cutoff_freq,
+                        fs=filter_config.data_sampling_freq, btype='low', output='sos')
+    filtered, _ = signal.sosfilt(sos, data, zi=signal.sosfilt_zi(sos) * data[0])
+    return filtered[::decimation_factor]
+
+
+@pytest.mark.parametrize('decimated_sampling_rate', [150, 75, 30, 10])
+def test_matches_filtering_at_the_full_rate(decimated_sampling_rate: int):
+    filter_config = DataFilterConfig(True, SAMPLING_RATE, FILTER_CUTOFF_FREQ, FILTER_ORDER)
+    decimation_factor = SAMPLING_RATE // decimated_sampling_rate
+    data = _samples(60 * SAMPLING_RATE)
+
+    # Chunks that are not a multiple of the decimation factor carry the phase over to the next
+    data_filter = DecimatingFilter(filter_config, decimation_factor)
+    rng = numpy.random.default_rng(1)
+    bounds = numpy.concatenate(([0], numpy.sort(rng.choice(numpy.arange(1, len(data)), 40, replace=False)),
+                                [len(data)]))
+    output = numpy.concatenate([data_filter.process(data[start:end]) for start, end in zip(bounds, bounds[1:])])
+
+    expected = _reference(filter_config, decimation_factor, data)
+    assert len(output) == len(expected)
+    numpy.testing.assert_allclose(output, expected, rtol=0, atol=1e-6 * numpy.abs(expected).max())
+
+
+def test_constant_input_passes_unchanged():
+    data_filter = DecimatingFilter(DataFilterConfig(True, SAMPLING_RATE, FILTER_CUTOFF_FREQ, FILTER_ORDER), 25)
+    output = data_filter.process(numpy.full(3000, 16384))
+    numpy.testing.assert_allclose(output, 16384, rtol=1e-9)
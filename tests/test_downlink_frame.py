@@ -0,0 +1,56 @@
+import numpy
+import pytest
+
+from src.shared.downlink_frame import DOWNLINK_FORMAT_BINARY, DOWNLINK_FORMAT_DELTA, DOWNLINK_FORMAT_JSON, \
+    DOWNLINK_FORMATS, DownlinkFrame, InvalidDownlinkFrame, decode_varints, encode_varints
+
+STATS = {'rolling_avg': 16391.3, 'clipped_samples': 0, 'bias_point': None}
+VALUES = [
+    [],
+    [0],
+    [-32768, 0, 32767],
+    [-40000, 40000, -40000],
+    # Deltas as large as the samples allow
+    [-2 ** 31, 2 ** 31 - 1, -2 ** 31],
+    list(range(-3000, 3000, 3)),
+]
+
+
+@pytest.mark.parametrize('downlink_format', DOWNLINK_FORMATS)
+@pytest.mark.parametrize('values', VALUES)
+@pytest.mark.parametrize('rate', [None, 1, 10])
+def test_round_trip(downlink_format: str, values, rate):
+    frame = DownlinkFrame(numpy.array(values, dtype='int32'), STATS, rate)
+    message = frame.encode(downlink_format)
+    assert isinstance(message, str) == (downlink_format == DOWNLINK_FORMAT_JSON)
+
+    decoded = DownlinkFrame.decode(message)
+    numpy.testing.assert_array_equal(decoded.values, frame.values)
+    assert decoded.stats == STATS
+    assert decoded.rate == rate
+
+
+def test_int16_samples_take_two_bytes():
+    values = numpy.arange(-1000, 1000, dtype='int32')
+    assert len(DownlinkFrame(values, STATS).encode(DOWNLINK_FORMAT_BINARY)) < 2 * len(values) + 100
+
+
+def test_slowly_changing_samples_take_a_byte_as_deltas():
+    values = (numpy.sin(numpy.arange(3000) / 100) * 3000).astype('int32')
+    assert len(DownlinkFrame(values, STATS).encode(DOWNLINK_FORMAT_DELTA)) < len(values) + 100
+
+
+def test_varints_round_trip():
+    values = numpy.array([0, 1, 127, 128, 16383, 16384, 2 ** 32, 2 ** 64 - 1], dtype='uint64')
+    encoded = encode_varints(values)
+    assert len(encoded) == 1 + 1 + 1 + 2 + 2 + 3 + 5 + 10
+    numpy.testing.assert_array_equal(decode_varints(encoded, len(values)), values)
+
+
+@pytest.mark.parametrize('downlink_format', [DOWNLINK_FORMAT_BINARY, DOWNLINK_FORMAT_DELTA])
+@pytest.mark.parametrize('corrupt', [lambda message: message[:10], lambda message: b'XXXX' + message[4:],
+                                     lambda message: message[:-1], lambda message: message + b'\1'])
+def test_invalid_frames_are_rejected(downlink_format: str, corrupt):
+    message = DownlinkFrame(numpy.array([1, 200, -3000], dtype='int32'), STATS).encode(downlink_format)
+    with pytest.raises(InvalidDownlinkFrame):
+        DownlinkFrame.decode(corrupt(message))
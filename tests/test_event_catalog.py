@@ -0,0 +1,31 @@
+import asyncio
+from pathlib import Path
+
+from obspy import UTCDateTime
+
+from src.server.event_catalog import EventCatalog, REFRESH_FAILURES
+
+
+def test_refresh_forever_keeps_going_after_a_failed_refresh(tmp_path: Path, monkeypatch):
+    catalog = EventCatalog(tmp_path, ttl=0.01)
+    refreshes = []
+
+    def refresh(now: UTCDateTime) -> bool:
+        refreshes.append(now)
+        if len(refreshes) == 1:
+            raise OSError('No space left on device')
+        return True
+
+    monkeypatch.setattr(catalog, 'refresh', refresh)
+    failures = REFRESH_FAILURES.summary()
+
+    async def run() -> None:
+        task = asyncio.ensure_future(catalog.refresh_forever())
+        while len(refreshes) < 3 and not task.done():
+            await asyncio.sleep(0.01)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert len(refreshes) >= 3
+    assert REFRESH_FAILURES.summary() == failures + 1
@@ -0,0 +1,86 @@
+import numpy
+import pytest
+from obspy import UTCDateTime
+from obspy.signal.trigger import recursive_sta_lta, trigger_onset
+from scipy import signal
+
+from src.server.event_detector import DETECTOR_CLASSIC, DETECTOR_RECURSIVE, EVENT_TRIGGER_OFF, EVENT_TRIGGER_ON, \
+    EventDetector, DC_REMOVAL_SECONDS, LTA_SECONDS, STA_SECONDS, TRIGGER_OFF_RATIO, TRIGGER_ON_RATIO
+
+SAMPLING_RATE = 30
+BATCH_SIZE = 4 * SAMPLING_RATE
+STARTTIME = UTCDateTime(2024, 3, 1, 12).timestamp
+
+
+def _quake(seconds: int, onsets) -> numpy.ndarray:
+    # Noise on a DC offset, with a burst ten times stronger for five seconds at each onset
+    rng = numpy.random.default_rng(0)
+    values = 2000 + rng.normal(0, 20, seconds * SAMPLING_RATE)
+    for onset in onsets:
+        burst = slice(onset * SAMPLING_RATE, (onset + 5) * SAMPLING_RATE)
+        values[burst] += rng.normal(0, 200, burst.stop - burst.start)
+    return numpy.rint(values).astype('int16')
+
+
+def _indices(events) -> list:
+    return [(event.type, round((UTCDateTime(event.time).timestamp - STARTTIME) * SAMPLING_RATE)) for event in events]
+
+
+def _reference(values: numpy.ndarray) -> list:
+    # obspy's own detector on the same high-passed signal
+    values = values.astype(numpy.float64)
+    dc_pole = 1 - 1 / (DC_REMOVAL_SECONDS * SAMPLING_RATE)
+    high_passed, _ = signal.lfilter([1, -1], [1, -dc_pole], values,
+                                    zi=signal.lfilter_zi([1, -1], [1, -dc_pole]) * values[0])
+    ratio = recursive_sta_lta(high_passed, STA_SECONDS * SAMPLING_RATE, LTA_SECONDS * SAMPLING_RATE)
+    events = []
+    for on, off in trigger_onset(ratio, TRIGGER_ON_RATIO, TRIGGER_OFF_RATIO):
+        events += [(EVENT_TRIGGER_ON, on), (EVENT_TRIGGER_OFF, off + 1)]
+    return events
+
+
+def test_triggers_on_and_off_at_the_thresholds():
+    values = _quake(180, [60, 120])
+    detector = EventDetector(SAMPLING_RATE)
+    events = detector.process(values, STARTTIME)
+
+    assert _indices(events) == _reference(values)
+    assert [event.type for event in events] == [EVENT_TRIGGER_ON, EVENT_TRIGGER_OFF] * 2
+    # Triggered at the onsets, within the short term window
+    for event, onset in zip(events[::2], [60, 120]):
+        assert 0 <= UTCDateTime(event.time).timestamp - STARTTIME - onset < STA_SECONDS
+        assert event.ratio > TRIGGER_ON_RATIO
+    # The trigger off reports the peak of the event
+    assert all(off.ratio >= on.ratio for on, off in zip(events[::2], events[1::2]))
+    assert not detector.triggered
+
+
+@pytest.mark.parametrize('method', [DETECTOR_RECURSIVE, DETECTOR_CLASSIC])
+def test_batches_splitting_an_event_give_the_same_triggers(method: str):
+    # The onset falls inside a batch and the event goes on over several of them
+    values = _quake(180, [61, 120])
+    whole = EventDetector(SAMPLING_RATE, method).process(values, STARTTIME)
+
+    detector = EventDetector(SAMPLING_RATE, method)
+    split = []
+    for start in range(0, len(values), BATCH_SIZE):
+        split += detector.process(values[start:start + BATCH_SIZE], STARTTIME + start / SAMPLING_RATE)
+        if start == 62 * SAMPLING_RATE:
+            assert detector.triggered
+
+    assert len(whole) == 4
+    assert [(event.type, event.time) for event in split] == [(event.type, event.time) for event in whole]
+    assert [event.ratio for event in split] == pytest.approx([event.ratio for event in whole])
+
+
+@pytest.mark.parametrize('method', [DETECTOR_RECURSIVE, DETECTOR_CLASSIC])
+def test_no_triggers_while_warming_up(method: str):
+    # A burst before the long term average has seen a full window, and another one after it
+    values = _quake(120, [5, 80])
+    detector = EventDetector(SAMPLING_RATE, method)
+    events = []
+    for start in range(0, len(values), BATCH_SIZE):
+        events += detector.process(values[start:start + BATCH_SIZE], STARTTIME + start / SAMPLING_RATE)
+
+    assert [event.type for event in events] == [EVENT_TRIGGER_ON, EVENT_TRIGGER_OFF]
+    assert UTCDateTime(events[0].time).timestamp - STARTTIME >= 80
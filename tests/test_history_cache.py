@@ -0,0 +1,82 @@
+from multiprocessing import shared_memory
+
+import numpy
+
+from src.server.history_cache import HistoryCache, HISTORY_CACHE_SECONDS
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+from src.shared.downlink_frame import DownlinkFrame, DOWNLINK_FORMAT_BINARY
+
+BATCH_SIZE = 4 * NOMINAL_SAMPLING_RATE
+CAPACITY = HISTORY_CACHE_SECONDS * NOMINAL_SAMPLING_RATE
+
+
+def _ramp(count: int) -> numpy.ndarray:
+    return (numpy.arange(count) % 20000 - 10000).astype('int32')
+
+
+def test_ring_wraps_around_at_thirty_minutes():
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE)
+    assert history_cache.capacity == CAPACITY
+    # Thirty-five minutes in batches, the last batch straddles the end of the ring
+    values = _ramp(35 * 60 * NOMINAL_SAMPLING_RATE + BATCH_SIZE // 2)
+    for start in range(0, len(values), BATCH_SIZE):
+        history_cache.append(values[start:start + BATCH_SIZE])
+
+    assert history_cache.total == len(values)
+    assert history_cache.size == CAPACITY
+    numpy.testing.assert_array_equal(history_cache.last_seconds(HISTORY_CACHE_SECONDS), values[-CAPACITY:])
+    numpy.testing.assert_array_equal(history_cache.last_samples(10 * BATCH_SIZE), values[-10 * BATCH_SIZE:])
+    # Samples that fell out of the ring are left out, not read back from the overwritten slots
+    numpy.testing.assert_array_equal(history_cache.samples_between(0, len(values) - CAPACITY + 5),
+                                     values[len(values) - CAPACITY:len(values) - CAPACITY + 5])
+    assert len(history_cache.samples_between(0, len(values) - CAPACITY)) == 0
+
+
+def test_batch_longer_than_the_ring_keeps_its_newest_samples():
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE, seconds=60)
+    history_cache.append(_ramp(100))
+    values = _ramp(3 * history_cache.capacity + 7)
+    history_cache.append(values)
+    assert history_cache.total == 100 + len(values)
+    numpy.testing.assert_array_equal(history_cache.last_seconds(60), values[-history_cache.capacity:])
+
+
+def test_samples_beyond_int16_are_clipped():
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE, seconds=60)
+    history_cache.append(numpy.array([40000, -40000, 32767, -32768, 12], dtype='int32'))
+    assert history_cache.last_samples(5).tolist() == [32767, -32768, 32767, -32768, 12]
+
+
+def test_cache_in_shared_memory_is_read_by_another_view():
+    size = HistoryCache.buffer_size(NOMINAL_SAMPLING_RATE, 60)
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        writer = HistoryCache(NOMINAL_SAMPLING_RATE, 60, memory.buf)
+        # As a front end process attaches to the worker's buffer by name
+        attached = shared_memory.SharedMemory(memory.name)
+        reader = HistoryCache(NOMINAL_SAMPLING_RATE, 60, attached.buf)
+        values = _ramp(2500)
+        for start in range(0, len(values), BATCH_SIZE):
+            writer.append(values[start:start + BATCH_SIZE])
+            assert reader.total == min(start + BATCH_SIZE, len(values))
+        numpy.testing.assert_array_equal(reader.last_seconds(60), values[-reader.capacity:])
+        del writer, reader
+        attached.close()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_append_clears_the_cached_messages():
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE)
+    history_cache.append(_ramp(BATCH_SIZE), {'batch': 1})
+    message = history_cache.get_message(60, downlink_format=DOWNLINK_FORMAT_BINARY)
+    # Encoded once and then served as is
+    assert history_cache.get_message(60, downlink_format=DOWNLINK_FORMAT_BINARY) is message
+
+    values = _ramp(2 * BATCH_SIZE)[BATCH_SIZE:]
+    history_cache.append(values, {'batch': 2})
+    message = history_cache.get_message(60, downlink_format=DOWNLINK_FORMAT_BINARY)
+    frame = DownlinkFrame.decode(message)
+    numpy.testing.assert_array_equal(frame.values, _ramp(2 * BATCH_SIZE))
+    assert frame.stats == {'batch': 2}
@@ -0,0 +1,52 @@
+import numpy
+
+from src.server.lod_pyramid import LodPyramid, LOD_BUCKET_SIZES
+
+CAPACITY = 100_000
+
+
+def _assert_matches(pyramid: LodPyramid, samples: numpy.ndarray) -> None:
+    for level in pyramid.levels:
+        buckets = samples[:len(samples) // level.bucket_size * level.bucket_size].reshape(-1, level.bucket_size)
+        numpy.testing.assert_array_equal(level.minimum.view(), buckets.min(axis=1))
+        numpy.testing.assert_array_equal(level.maximum.view(), buckets.max(axis=1))
+        numpy.testing.assert_allclose(level.mean(), buckets.mean(axis=1))
+        numpy.testing.assert_allclose(level.rms(), numpy.sqrt(numpy.square(buckets.astype('float64')).mean(axis=1)))
+
+
+def test_batches_gaps_and_late_batches():
+    rng = numpy.random.default_rng(0)
+    samples = numpy.zeros(CAPACITY, dtype='int16')
+    pyramid = LodPyramid(CAPACITY)
+    size = 0
+    for _ in range(200):
+        # Mostly the next batch, sometimes one after a gap, sometimes a late one filling an earlier gap
+        batch = rng.integers(-2000, 2000, rng.integers(1, 300)).astype('int16')
+        choice = rng.random()
+        if choice < 0.6:
+            index = size
+        elif choice < 0.8:
+            index = size + int(rng.integers(1, 200))
+        else:
+            index = int(rng.integers(0, max(size - len(batch), 1)))
+        if index > size:
+            samples[size:index] = samples[size - 1] if size > 0 else 0
+        samples[index:index + len(batch)] = batch
+        start = min(index, size)
+        size = max(size, index + len(batch))
+        pyramid.update(samples[:size], start, index + len(batch))
+        _assert_matches(pyramid, samples[:size])
+
+
+def test_late_batch_only_touches_its_buckets():
+    samples = numpy.arange(CAPACITY, dtype='int64').astype('int16')
+    pyramid = LodPyramid(CAPACITY)
+    pyramid.update(samples, 0, CAPACITY)
+    for level in pyramid.levels:
+        level.minimum.view()[:] = -1
+    samples[50_000:50_010] = 7
+    pyramid.update(samples, 50_000, 50_010)
+    for level in pyramid.levels:
+        touched = numpy.flatnonzero(level.minimum.view() != -1)
+        assert list(touched) == list(range(50_000 // level.bucket_size, -(-50_010 // level.bucket_size)))
+    assert LOD_BUCKET_SIZES[-1] < 50_000
@@ -0,0 +1,149 @@
+import asyncio
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy
+from obspy import UTCDateTime, read
+from websocket import WebSocketException
+
+from src.client.data_filter_config import DataFilterConfig
+from src.client.data_processor import DataProcessor
+from src.client.data_uploader import DataUploader
+from src.client.data_uploader_data import DataUploaderData
+from src.client.decimating_filter import DecimatingFilter
+from src.client.spool import Spool
+from src.client.streaming_statistics import StreamingStatistics
+from src.server.plot_executor import PlotExecutor
+from src.server.seismometer import Seismometer, MSEED_FILES_DIRECTORY
+from src.server.server_request_handler import ServerRequestHandler
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE, archive_file_path
+from src.shared.uplink_frame import UPLINK_FORMAT_BINARY, UPLINK_FLAG_REPLAY, UplinkFrame
+
+SEISMOMETER_ID = 'outage_test'
+SAMPLING_RATE = 750
+UPLOAD_INTERVAL = 4
+LIVE_BATCHES = 30
+OUTAGE_BATCHES = 300
+
+
+class FlakyWebSocket(object):
+    # Collects what the uploader sends, in order, and fails every send while down
+    messages: List[bytes]
+    up: bool
+
+    def __init__(self):
+        self.messages = []
+        self.up = True
+        self.lock = threading.Lock()
+
+    def send(self, message: bytes, opcode: int) -> None:
+        with self.lock:
+            if not self.up:
+                raise WebSocketException('Connection is down')
+            self.messages.append(message)
+
+    def sample_count(self) -> int:
+        with self.lock:
+            return sum(len(UplinkFrame.from_bytes(message).values) for message in self.messages)
+
+
+def _wait_for(condition, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def _send_over_outage(directory: Path, starttime: float) -> List[bytes]:
+    decimation_factor = SAMPLING_RATE // NOMINAL_SAMPLING_RATE
+    statistics = StreamingStatistics(75, invalid_value=-1)
+    data_processor = DataProcessor(SAMPLING_RATE, NOMINAL_SAMPLING_RATE, statistics, False,
+                                   DecimatingFilter(DataFilterConfig(True, SAMPLING_RATE, 6, 8), decimation_factor))
+    data_queue = queue.Queue()
+    ws = FlakyWebSocket()
+    uploader = DataUploader(ws, data_queue, data_processor, statistics, 2 ** 15, SAMPLING_RATE,
+                            NOMINAL_SAMPLING_RATE, UPLINK_FORMAT_BINARY, Spool(directory / 'spool'),
+                            replay_interval=0.02)
+    uploader.on_connection_opened()
+    threading.Thread(target=uploader.run, daemon=True).start()
+    threading.Thread(target=uploader.run_sender, daemon=True).start()
+
+    rng = numpy.random.default_rng(0)
+    batches = 0
+
+    def feed_batch() -> None:
+        nonlocal batches
+        values = numpy.rint(16000 + rng.normal(0, 200, SAMPLING_RATE * UPLOAD_INTERVAL)).astype(numpy.int64)
+        data_queue.put(DataUploaderData(values=values, bias_point=None, actual_sampling_rate=SAMPLING_RATE,
+                                        start_time=starttime + batches * UPLOAD_INTERVAL, timing_stats={}))
+        batches += 1
+        data_queue.join()
+
+    for _ in range(LIVE_BATCHES):
+        feed_batch()
+    _wait_for(lambda: len(ws.messages) == LIVE_BATCHES)
+
+    ws.up = False
+    uploader.on_connection_closed()
+    for _ in range(OUTAGE_BATCHES):
+        feed_batch()
+
+    ws.up = True
+    uploader.on_connection_opened()
+    # Live batches keep arriving, the backlog is sent in the pauses between them
+    while not (uploader.spool.is_empty() and uploader.outbox.empty()):
+        feed_batch()
+        time.sleep(0.1)
+    _wait_for(lambda: ws.sample_count() == batches * SAMPLING_RATE * UPLOAD_INTERVAL // decimation_factor)
+    return ws.messages
+
+
+async def _receive(directory: Path, messages: List[bytes]) -> Dict[str, Any]:
+    # The server's own decoding and storage, as if the messages arrived on the logger's websocket
+    handler = ServerRequestHandler()
+    handler._create_broadcaster()
+    handler.plot_executor = PlotExecutor(1)
+    seismometer = Seismometer(SEISMOMETER_ID, directory / SEISMOMETER_ID, handler.plot_executor)
+    seismometer.create_folders()
+    handler.seismometers = {SEISMOMETER_ID: seismometer}
+    for message in messages:
+        await handler.handle_logger_message(SEISMOMETER_ID, message)
+    await seismometer.stream_manager.save_to_file()
+    while not handler.plot_executor.is_idle():
+        await asyncio.sleep(0.1)
+    handler.plot_executor.shutdown()
+    return handler.logger_metrics[SEISMOMETER_ID]
+
+
+def test_outage_over_midnight_is_archived_in_full(tmp_path: Path):
+    # The outage starts ten minutes before midnight and the backlog is replayed to a server already in the new day
+    midnight = UTCDateTime(UTCDateTime().date)
+    starttime = midnight - LIVE_BATCHES * UPLOAD_INTERVAL - 10 * 60 + 2
+    messages = _send_over_outage(tmp_path, starttime.timestamp)
+    assert any(UplinkFrame.from_bytes(message).flags & UPLINK_FLAG_REPLAY for message in messages)
+
+    # Every sample the logger sent, where it belongs
+    frames = [UplinkFrame.from_bytes(message) for message in messages]
+    end = max(frame.starttime + len(frame.values) / frame.sampling_rate for frame in frames)
+    expected = numpy.zeros(round((end - starttime.timestamp) * NOMINAL_SAMPLING_RATE), dtype='int32')
+    for frame in frames:
+        index = round((frame.starttime - starttime.timestamp) * NOMINAL_SAMPLING_RATE)
+        expected[index:index + len(frame.values)] = frame.values
+
+    logger_metrics = asyncio.run(_receive(tmp_path, messages))
+    # The metrics page shows what the logger sent last live, not what it spooled during the outage
+    live_frames = [frame for frame in frames if not frame.flags & UPLINK_FLAG_REPLAY]
+    assert all('metrics' not in frame.stats for frame in frames if frame.flags & UPLINK_FLAG_REPLAY)
+    assert logger_metrics == [frame.stats['metrics'] for frame in live_frames if 'metrics' in frame.stats][-1]
+
+    mseed_directory = tmp_path / SEISMOMETER_ID / MSEED_FILES_DIRECTORY
+    archived = numpy.full(len(expected), -1, dtype='int32')
+    for day in [(midnight - 1).date, midnight.date]:
+        stream = read(str(archive_file_path(mseed_directory, day)))
+        for trace in stream:
+            index = round((trace.stats.starttime - starttime) * NOMINAL_SAMPLING_RATE)
+            archived[index:index + trace.stats.npts] = trace.data
+    numpy.testing.assert_array_equal(archived, expected)
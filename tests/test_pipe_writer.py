@@ -0,0 +1,72 @@
+import asyncio
+import time
+from multiprocessing import Pipe
+
+from src.server.pipe_writer import PipeWriter
+
+MESSAGE_SIZE = 64 * 1024
+QUEUE_SIZE = 8
+
+
+async def _send_to_stalled_reader(messages: int):
+    reader, connection = Pipe()
+    writer = PipeWriter(connection, 'test', QUEUE_SIZE)
+    t1 = time.monotonic()
+    for index in range(messages):
+        writer.send_bytes(bytes([index]) * MESSAGE_SIZE)
+        await asyncio.sleep(0)
+    elapsed = time.monotonic() - t1
+    dropped = writer.dropped_messages
+
+    # Once the reader catches up the messages that were kept arrive in order
+    received = []
+    deadline = time.monotonic() + 10
+    while len(received) + dropped < messages and time.monotonic() < deadline:
+        if reader.poll():
+            received.append(reader.recv_bytes()[0])
+        else:
+            await asyncio.sleep(0.01)
+    writer.close()
+    connection.close()
+    return elapsed, dropped, received
+
+
+def test_stalled_reader_does_not_block_the_loop():
+    elapsed, dropped, received = asyncio.run(_send_to_stalled_reader(100))
+    assert elapsed < 1
+    assert dropped > 0
+    assert len(received) + dropped == 100
+    assert received == sorted(received)
+    assert received[:QUEUE_SIZE] == list(range(QUEUE_SIZE))
+
+
+async def _send_ingest_to_stalled_reader(messages: int):
+    reader, connection = Pipe()
+    writer = PipeWriter(connection, 'test', QUEUE_SIZE)
+
+    async def send_all() -> None:
+        for index in range(messages):
+            await writer.send(bytes([index]) * MESSAGE_SIZE)
+
+    sender = asyncio.ensure_future(send_all())
+    await asyncio.sleep(0.2)
+    # Held back rather than dropped while nothing is read
+    held_back = not sender.done()
+
+    received = []
+    deadline = time.monotonic() + 10
+    while len(received) < messages and time.monotonic() < deadline:
+        if reader.poll():
+            received.append(reader.recv_bytes()[0])
+        else:
+            await asyncio.sleep(0.01)
+    await sender
+    writer.close()
+    connection.close()
+    return held_back, received
+
+
+def test_ingest_waits_for_a_stalled_reader_instead_of_dropping():
+    held_back, received = asyncio.run(_send_ingest_to_stalled_reader(100))
+    assert held_back
+    assert received == list(range(100))
@@ -0,0 +1,56 @@
+import queue
+import time
+from pathlib import Path
+
+import numpy
+from obspy import Trace, UTCDateTime
+
+from src.client.adc_config import AdcConfig
+from src.client.adc_wrapper import AdcWrapper
+from src.client.data_box import DataBox
+from src.client.data_sampler import DataSampler
+from src.client.replay_adc import ReplayAdc
+from src.client.seismometer_config import SeismometerConfig
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+
+ARCHIVE_SAMPLING_RATE = 30
+SAMPLING_RATE = 150
+SCALE_FACTOR = 8
+REPLAY_SPEED = 100
+# Three seconds of ADC codes rising by two a sample, never halfway between two codes once resampled
+CODES = 100 + 2 * numpy.arange(3 * ARCHIVE_SAMPLING_RATE)
+
+
+def _write_recording(directory: Path) -> None:
+    # Archived as the logger uploads them, filtered and decimated codes times the scale factor
+    trace = Trace(data=(CODES * SCALE_FACTOR).astype('int32'),
+                  header={'network': 'XX', 'station': 'TEST', 'channel': 'BHZ',
+                          'sampling_rate': ARCHIVE_SAMPLING_RATE, 'starttime': UTCDateTime(2024, 3, 1)})
+    trace.write(str(directory / 'recording.mseed'), format='MSEED')
+
+
+def test_logger_replays_at_its_own_sampling_rate():
+    config = SeismometerConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False, REPLAY_SPEED)
+    assert config.adc_config.sampling_rate == config.sampling_rate
+
+
+def test_replay_resamples_the_recording_and_starts_over_at_its_end(tmp_path: Path, monkeypatch):
+    _write_recording(tmp_path)
+    monkeypatch.setenv('REPLAY_DIRECTORY', str(tmp_path))
+    adc = AdcWrapper(AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False, REPLAY_SPEED, SCALE_FACTOR, SAMPLING_RATE))
+    assert isinstance(adc.adc, ReplayAdc)
+
+    # Longer than the recording, which is resampled to 446 samples
+    batch_size = 600
+    sampler = DataSampler(adc, queue.Queue(), DataBox(batch_size), SCALE_FACTOR, SAMPLING_RATE, 50, REPLAY_SPEED)
+    t1 = time.monotonic()
+    sampler.next_deadline_ns = sampler._now_ns()
+    sampler.sample_batch()
+    elapsed = time.monotonic() - t1
+
+    resampled = numpy.rint(numpy.interp(numpy.arange(446) * ARCHIVE_SAMPLING_RATE / SAMPLING_RATE,
+                                        numpy.arange(len(CODES)), CODES)).astype(int)
+    expected = numpy.concatenate([resampled, resampled])[:batch_size] * SCALE_FACTOR
+    assert sampler.data_queue.get_nowait().values == expected.tolist()
+    # Four seconds of samples, read a hundred times faster less the time taken to load the recording
+    assert elapsed < batch_size / SAMPLING_RATE / 4
@@ -0,0 +1,79 @@
+import numpy
+
+from src.server.history_cache import HistoryCache
+from src.server.resolution_tiers import ResolutionTier, ResolutionTiers, is_valid_rate, min_max_envelope
+from src.server.stream_manager import NOMINAL_SAMPLING_RATE
+
+# Not a whole number of buckets at any rate, so every batch leaves samples over
+BATCH_SIZE = 37
+HISTORY_SECONDS = 60
+
+
+def _samples(count: int) -> numpy.ndarray:
+    rng = numpy.random.default_rng(0)
+    return rng.integers(-3000, 3000, count).astype('int16')
+
+
+def test_envelope_holds_the_min_and_max_of_every_bucket():
+    samples = numpy.array([3, -1, 7, 2, 0, 5, -4, 4, 9, 1, 6], dtype='int16')
+    # The last two samples are short of a bucket
+    assert min_max_envelope(samples, 3).tolist() == [-1, 7, 0, 5, -4, 9]
+    assert min_max_envelope(samples, 1).tolist() == numpy.repeat(samples, 2).tolist()
+    assert len(min_max_envelope(samples[:2], 3)) == 0
+
+
+def test_leftover_samples_are_carried_into_the_next_batch():
+    samples = _samples(20 * BATCH_SIZE)
+    tier = ResolutionTier(NOMINAL_SAMPLING_RATE // 6)
+    envelopes = []
+    for start in range(0, len(samples), BATCH_SIZE):
+        envelopes.append(tier.envelope(samples[start:start + BATCH_SIZE]))
+        assert len(tier.pending) == (start + BATCH_SIZE) % tier.bucket_size
+    numpy.testing.assert_array_equal(numpy.concatenate(envelopes), min_max_envelope(samples, tier.bucket_size))
+
+
+def test_tiers_are_kept_only_for_subscribed_rates():
+    tiers = ResolutionTiers(NOMINAL_SAMPLING_RATE)
+    assert [rate for rate in range(1, 31) if is_valid_rate(NOMINAL_SAMPLING_RATE, rate)] == [1, 2, 3, 5, 6, 10, 15]
+    samples = _samples(BATCH_SIZE)
+    envelopes = tiers.envelopes(samples, [1, 10])
+    assert sorted(envelopes) == [1, 10]
+    assert len(envelopes[10]) == 2 * (BATCH_SIZE // 3)
+    assert tiers.pending(10) == BATCH_SIZE % 3
+    tiers.envelopes(samples, [10])
+    assert tiers.pending(1) == 0
+    assert list(tiers.tiers) == [10]
+
+
+def _history_then_live(subscribed_before: bool) -> None:
+    rate = 2
+    bucket_size = NOMINAL_SAMPLING_RATE // rate
+    samples = _samples(200 * BATCH_SIZE)
+    history_cache = HistoryCache(NOMINAL_SAMPLING_RATE)
+    tiers = ResolutionTiers(NOMINAL_SAMPLING_RATE)
+    # Part way through a bucket of the running tier
+    subscribe_at = 121 * BATCH_SIZE
+
+    # The server publishes every batch to the tiers with subscribers, then appends it to the history
+    for start in range(0, subscribe_at, BATCH_SIZE):
+        tiers.envelopes(samples[start:start + BATCH_SIZE], [rate] if subscribed_before else [])
+        history_cache.append(samples[start:start + BATCH_SIZE])
+
+    received = [history_cache._envelope(HISTORY_SECONDS, rate, tiers.pending(rate))]
+    for start in range(subscribe_at, len(samples), BATCH_SIZE):
+        received.append(tiers.envelopes(samples[start:start + BATCH_SIZE], [rate])[rate])
+        history_cache.append(samples[start:start + BATCH_SIZE])
+    received = numpy.concatenate(received)
+
+    # A client sees one envelope without a seam, the history's buckets end where the live ones start
+    history_end = subscribe_at - (subscribe_at % bucket_size if subscribed_before else 0)
+    first = history_end - HISTORY_SECONDS * NOMINAL_SAMPLING_RATE
+    numpy.testing.assert_array_equal(received, min_max_envelope(samples[first:], bucket_size))
+
+
+def test_history_lines_up_with_a_tier_already_running():
+    _history_then_live(True)
+
+
+def test_history_lines_up_with_a_tier_started_for_the_subscriber():
+    _history_then_live(False)
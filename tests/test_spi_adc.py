@@ -0,0 +1,103 @@
+import ctypes
+import struct
+
+import numpy
+import pytest
+
+from src.client import spi_bus
+from src.client.spi_adc import SpiAdc
+from src.client.spi_bus import FRAME_SIZE, MAX_TRANSFERS_PER_MESSAGE, SPI_IOC_TRANSFER_DTYPE, SPI_IOC_WR_MODE, \
+    SimulatedMcp3x08Bus, SpidevBus
+
+SAMPLING_RATE = 750
+
+
+def _codes(bit_resolution: int):
+    # Every code of the range, the ends included, whatever the time
+    def signal(t: numpy.ndarray) -> numpy.ndarray:
+        return numpy.round(t * SAMPLING_RATE) % 2 ** bit_resolution - 2 ** (bit_resolution - 1)
+    return signal
+
+
+@pytest.mark.parametrize('bit_resolution', [10, 12])
+def test_decodes_every_code_of_the_simulated_adc(bit_resolution: int):
+    adc = SpiAdc(SimulatedMcp3x08Bus(bit_resolution, SAMPLING_RATE, _codes(bit_resolution)), bit_resolution)
+    count = 2 ** bit_resolution
+    assert adc.read_adc_block(0, count).tolist() == list(range(count))
+    # Single reads continue where the block left off
+    assert [adc.read_adc(7) for _ in range(3)] == [0, 1, 2]
+
+
+def test_commands_select_the_channel():
+    commands = SpiAdc._commands(5, 4)
+    assert commands.shape == (4, FRAME_SIZE)
+    # Start bit, single ended, then the three channel bits
+    assert commands[:, 0].tolist() == [0b11101000] * 4
+    assert commands[:, 1:].tolist() == [[0, 0]] * 4
+    assert SpiAdc._commands(0, 1)[0, 0] == 0b11000000
+    assert SpiAdc._commands(7, 1)[0, 0] == 0b11111000
+    with pytest.raises(AssertionError):
+        SpiAdc._commands(8, 1)
+
+
+def test_transfer_struct_matches_spidev_h():
+    # struct spi_ioc_transfer from linux/spi/spidev.h, 32 bytes with these field offsets
+    assert SPI_IOC_TRANSFER_DTYPE.itemsize == 32
+    assert {name: SPI_IOC_TRANSFER_DTYPE.fields[name][1] for name in SPI_IOC_TRANSFER_DTYPE.names} == {
+        'tx_buf': 0, 'rx_buf': 8, 'len': 16, 'speed_hz': 20, 'delay_usecs': 24, 'bits_per_word': 26,
+        'cs_change': 27, 'tx_nbits': 28, 'rx_nbits': 29, 'word_delay_usecs': 30, 'pad': 31}
+    # _IOW('k', 1, __u8) and _IOW('k', 0, char[32]) as the kernel headers define them
+    assert SPI_IOC_WR_MODE == 0x40016B01
+    assert spi_bus._spi_ioc_write(0, SPI_IOC_TRANSFER_DTYPE.itemsize) == 0x40206B00
+
+
+class FakeSpidev(object):
+    # Answers SPI_IOC_MESSAGE ioctls as the kernel would, from the transfers' buffer addresses, with a simulated ADC
+    device: SimulatedMcp3x08Bus
+    modes: list
+    messages: list
+
+    def __init__(self, device: SimulatedMcp3x08Bus):
+        self.device = device
+        self.modes = []
+        self.messages = []
+
+    def ioctl(self, fd: int, request: int, arg, mutate_flag: bool = True):
+        if request == SPI_IOC_WR_MODE:
+            self.modes.append(struct.unpack('B', arg)[0])
+            return 0
+        transfers = numpy.frombuffer(bytes(arg), dtype=SPI_IOC_TRANSFER_DTYPE)
+        assert request == spi_bus._spi_ioc_write(0, transfers.nbytes)
+        self.messages.append(transfers.copy())
+        for transfer in transfers:
+            tx = numpy.frombuffer(ctypes.string_at(int(transfer['tx_buf']), int(transfer['len'])), dtype=numpy.uint8)
+            rx = self.device.transfer_frames(tx).tobytes()
+            ctypes.memmove(int(transfer['rx_buf']), rx, len(rx))
+        return 0
+
+
+def test_spidev_bus_submits_one_transfer_per_conversion(monkeypatch):
+    fake = FakeSpidev(SimulatedMcp3x08Bus(12, SAMPLING_RATE, _codes(12)))
+    monkeypatch.setattr(spi_bus.os, 'open', lambda path, flags: 99)
+    monkeypatch.setattr(spi_bus.os, 'close', lambda fd: None)
+    monkeypatch.setattr(spi_bus.fcntl, 'ioctl', fake.ioctl)
+    bus = SpidevBus(0, 0, 1_000_000)
+    adc = SpiAdc(bus, 12)
+
+    count = MAX_TRANSFERS_PER_MESSAGE + 10
+    interval_us = 1_000_000 // SAMPLING_RATE
+    assert adc.read_adc_block(3, count, interval_us).tolist() == list(range(count))
+    bus.close()
+
+    assert fake.modes == [0]
+    # Split where the ioctl size field runs out
+    assert [len(transfers) for transfers in fake.messages] == [MAX_TRANSFERS_PER_MESSAGE, 10]
+    transfers = numpy.concatenate(fake.messages)
+    assert numpy.all(numpy.diff(transfers['tx_buf'].astype(numpy.int64)) == FRAME_SIZE)
+    assert numpy.all(numpy.diff(transfers['rx_buf'].astype(numpy.int64)) == FRAME_SIZE)
+    assert numpy.all(transfers['len'] == FRAME_SIZE)
+    assert numpy.all(transfers['speed_hz'] == 1_000_000)
+    # The conversions are spaced at the sampling interval, less the 24 us a frame takes at 1 MHz
+    assert numpy.all(transfers['delay_usecs'] == interval_us - 24)
+    assert numpy.all(transfers['bits_per_word'] == 8)
+    assert numpy.all(transfers['cs_change'] == 1)
@@ -0,0 +1,84 @@
+from pathlib import Path
+from typing import List
+
+from src.client.spool import CURSOR_FILE, SEGMENT_SUFFIX, Spool
+
+SEGMENT_SIZE = 4096
+
+
+def _records(count: int, start: int = 0) -> List[bytes]:
+    return [(b'frame %d ' % index) * 20 for index in range(start, start + count)]
+
+
+def _read_all(spool: Spool) -> List[bytes]:
+    records = []
+    while True:
+        batch = spool.read_batch(7)
+        if not batch:
+            return records
+        records.extend(batch)
+        spool.commit()
+
+
+def _segments(directory: Path) -> List[Path]:
+    return sorted(directory.glob('*' + SEGMENT_SUFFIX))
+
+
+def test_crash_resumes_after_the_last_commit(tmp_path: Path):
+    records = _records(100)
+    spool = Spool(tmp_path, SEGMENT_SIZE)
+    for record in records:
+        spool.append(record)
+    assert len(_segments(tmp_path)) > 3
+
+    # A batch never goes past the end of a segment
+    committed = spool.read_batch(100)
+    assert committed == records[:len(committed)]
+    spool.commit()
+    # Read but never confirmed as sent, the process dies before commit
+    assert spool.read_batch(10) == records[len(committed):len(committed) + 10]
+
+    recovered = Spool(tmp_path, SEGMENT_SIZE)
+    assert _read_all(recovered) == records[len(committed):]
+    assert recovered.is_empty()
+    # Segments read to their end are removed
+    assert len(_segments(tmp_path)) == 1
+    spool.close()
+    recovered.close()
+
+
+def test_record_torn_by_a_power_cut_is_dropped_and_overwritten(tmp_path: Path):
+    records = _records(5)
+    spool = Spool(tmp_path, SEGMENT_SIZE)
+    for record in records:
+        spool.append(record)
+    spool.close()
+
+    # The last record's payload was only partly written
+    segment = _segments(tmp_path)[0]
+    data = bytearray(segment.read_bytes())
+    end = sum(8 + len(record) for record in records)
+    data[end - 10:end] = b'\0' * 10
+    segment.write_bytes(bytes(data))
+
+    recovered = Spool(tmp_path, SEGMENT_SIZE)
+    assert recovered.read_batch(10) == records[:4]
+    recovered.append(b'after the restart')
+    assert recovered.read_batch(10) == records[:4] + [b'after the restart']
+    recovered.close()
+
+
+def test_lost_cursor_replays_from_the_oldest_segment(tmp_path: Path):
+    records = _records(40)
+    spool = Spool(tmp_path, SEGMENT_SIZE)
+    for record in records:
+        spool.append(record)
+    spool.read_batch(3)
+    spool.commit()
+    spool.close()
+
+    (tmp_path / CURSOR_FILE).write_bytes(b'\1\2')
+    recovered = Spool(tmp_path, SEGMENT_SIZE)
+    # Sent twice rather than lost, the server drops the samples it already holds
+    assert _read_all(recovered) == records
+    recovered.close()
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import numpy
+from obspy import UTCDateTime, read
+
+from src.server.stream_manager import StreamManager, NOMINAL_SAMPLING_RATE, SAMPLE_FLUSHED, SAMPLE_MISSING, \
+    SAMPLE_UNFLUSHED, SAMPLES_PER_DAY, archive_file_path
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def _today() -> UTCDateTime:
+    return UTCDateTime(UTCDateTime().date)
+
+
+def _append(stream_manager: StreamManager, values: numpy.ndarray, second: float) -> None:
+    _run(stream_manager.append_values(values, (_today() + second).timestamp, NOMINAL_SAMPLING_RATE))
+
+
+def _archived(directory: Path) -> numpy.ndarray:
+    # The day's file as samples of the day, -1 where it holds none
+    samples = numpy.full(SAMPLES_PER_DAY, -1, dtype='int32')
+    for trace in read(str(archive_file_path(directory, _today().date))):
+        index = round((trace.stats.starttime - _today()) * NOMINAL_SAMPLING_RATE)
+        assert numpy.all(samples[index:index + trace.stats.npts] == -1)
+        samples[index:index + trace.stats.npts] = trace.data
+    return samples
+
+
+def test_gaps_overlaps_and_flushes(tmp_path: Path):
+    stream_manager = StreamManager(tmp_path)
+    _run(stream_manager.get_wrapped_stream())
+    stream_manager.begin_new_stream()
+    second = NOMINAL_SAMPLING_RATE
+    values = numpy.arange(1, 101 * second, dtype='int16')
+
+    _append(stream_manager, values[:10 * second], 0)
+    # Ten seconds missing, held at the last value
+    _append(stream_manager, values[20 * second:30 * second], 20)
+    samples = stream_manager.trace_buffer.samples.view()
+    states = stream_manager.sample_states.view()
+    assert len(samples) == 30 * second
+    assert numpy.all(samples[10 * second:20 * second] == values[10 * second - 1])
+    assert numpy.all(states[10 * second:20 * second] == SAMPLE_MISSING)
+
+    _run(stream_manager.save_to_file())
+    assert numpy.all(stream_manager.sample_states.view()[:10 * second] == SAMPLE_FLUSHED)
+    archived = _archived(tmp_path)
+    numpy.testing.assert_array_equal(archived[:10 * second], values[:10 * second])
+    assert numpy.all(archived[10 * second:20 * second] == -1)
+    numpy.testing.assert_array_equal(archived[20 * second:30 * second], values[20 * second:30 * second])
+
+    # A late batch over the gap and both its edges only fills the gap, the received samples are kept
+    late = values[5 * second:25 * second].copy()
+    late[:] = -7
+    late[5 * second:15 * second] = values[10 * second:20 * second]
+    _append(stream_manager, late, 5)
+    states = stream_manager.sample_states.view()
+    numpy.testing.assert_array_equal(stream_manager.trace_buffer.samples.view(), values[:30 * second])
+    assert numpy.all(states[10 * second:20 * second] == SAMPLE_UNFLUSHED)
+    assert numpy.all(states[20 * second:30 * second] == SAMPLE_FLUSHED)
+
+    # Only what is new is appended to the file, nothing is written twice
+    _append(stream_manager, values[30 * second:40 * second], 30)
+    _run(stream_manager.save_to_file())
+    _run(stream_manager.save_to_file())
+    archived = _archived(tmp_path)
+    numpy.testing.assert_array_equal(archived[:40 * second], values[:40 * second])
+    assert numpy.all(archived[40 * second:] == -1)
+
+    # A restarted server picks up the day from the file
+    reloaded = StreamManager(tmp_path)
+    _run(reloaded.get_wrapped_stream())
+    numpy.testing.assert_array_equal(reloaded.trace_buffer.samples.view(), values[:40 * second])
+    assert numpy.all(reloaded.sample_states.view() == SAMPLE_FLUSHED)
+
+
+def test_batch_over_midnight_is_kept_for_the_next_day(tmp_path: Path):
+    stream_manager = StreamManager(tmp_path)
+    _run(stream_manager.get_wrapped_stream())
+    stream_manager.begin_new_stream()
+    values = numpy.arange(4 * NOMINAL_SAMPLING_RATE, dtype='int16')
+    _append(stream_manager, values, 24 * 60 * 60 - 1)
+
+    assert stream_manager.trace_buffer.samples.size == SAMPLES_PER_DAY
+    numpy.testing.assert_array_equal(stream_manager.trace_buffer.samples.view()[-NOMINAL_SAMPLING_RATE:],
+                                     values[:NOMINAL_SAMPLING_RATE])
+    stream_manager.begin_new_stream()
+    assert stream_manager.trace_buffer.trace.stats.starttime == _today() + 24 * 60 * 60
+    numpy.testing.assert_array_equal(stream_manager.trace_buffer.samples.view(), values[NOMINAL_SAMPLING_RATE:])
+
+
+def test_batch_at_another_rate_is_dropped(tmp_path: Path):
+    stream_manager = StreamManager(tmp_path)
+    _run(stream_manager.get_wrapped_stream())
+    stream_manager.begin_new_stream()
+    _run(stream_manager.append_values(numpy.ones(100, dtype='int16'), _today().timestamp, 100))
+    assert stream_manager.trace_buffer.samples.size == 0
+
+
+def test_batch_from_before_midnight_is_archived_in_its_day(tmp_path: Path):
+    stream_manager = StreamManager(tmp_path)
+    _run(stream_manager.get_wrapped_stream())
+    stream_manager.begin_new_stream()
+
+    # Ten minutes of a logger's backlog, the first half from the day before
+    values = numpy.arange(10 * 60 * NOMINAL_SAMPLING_RATE, dtype='int16')
+    starttime = _today() - 5 * 60
+    _run(stream_manager.append_values(values, starttime.timestamp, NOMINAL_SAMPLING_RATE))
+
+    half = len(values) // 2
+    yesterday = read(str(archive_file_path(tmp_path, (_today() - 1).date)))
+    assert len(yesterday) == 1
+    assert yesterday[0].stats.starttime == starttime
+    numpy.testing.assert_array_equal(yesterday[0].data, values[:half])
+    numpy.testing.assert_array_equal(stream_manager.trace_buffer.samples.view()[:half], values[half:])
+
+    # Sent again, the samples the file already holds are not written twice
+    _run(stream_manager.append_values(values, starttime.timestamp, NOMINAL_SAMPLING_RATE))
+    assert read(str(archive_file_path(tmp_path, (_today() - 1).date)))[0].stats.npts == half
+
+
+def test_batch_arriving_while_the_day_is_compacted_is_kept(tmp_path: Path, monkeypatch):
+    stream_manager = StreamManager(tmp_path)
+    _run(stream_manager.get_wrapped_stream())
+    stream_manager.begin_new_stream()
+    minutes = 10 * 60 * NOMINAL_SAMPLING_RATE
+    values = numpy.arange(3 * minutes, dtype='int16')
+
+    writing = threading.Event()
+    written = threading.Event()
+    replace_archive_file = StreamManager._replace_archive_file
+
+    def slow_replace_archive_file(file_name: Path, traces) -> None:
+        writing.set()
+        assert written.wait(10)
+        replace_archive_file(file_name, traces)
+
+    monkeypatch.setattr(StreamManager, '_replace_archive_file', staticmethod(slow_replace_archive_file))
+
+    async def compact_with_late_batch() -> None:
+        # The first and last ten minutes are flushed, the ones between arrive while the file is rewritten. The ingest
+        # path awaits the compaction, this keeps a batch placed by any other caller meanwhile.
+        for start in [0, 2 * minutes]:
+            await stream_manager.append_values(values[start:start + minutes],
+                                               (_today() + start / NOMINAL_SAMPLING_RATE).timestamp,
+                                               NOMINAL_SAMPLING_RATE)
+            await stream_manager.save_to_file()
+        compaction = asyncio.ensure_future(stream_manager.compact_file())
+        while not writing.is_set():
+            await asyncio.sleep(0.01)
+        await stream_manager.append_values(values[minutes:2 * minutes], (_today() + 10 * 60).timestamp,
+                                           NOMINAL_SAMPLING_RATE)
+        written.set()
+        await compaction
+
+    _run(compact_with_late_batch())
+    stream = read(str(archive_file_path(tmp_path, _today().date)))
+    stream.merge()
+    assert len(stream) == 1
+    assert stream[0].stats.starttime == _today()
+    numpy.testing.assert_array_equal(stream[0].data, values)
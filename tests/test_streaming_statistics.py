@@ -0,0 +1,44 @@
+import numpy
+import pytest
+
+from src.client.adc_config import AdcConfig, SPI_BACKEND_SIMULATED
+from src.client.adc_wrapper import AdcWrapper
+from src.client.streaming_statistics import StreamingStatistics
+from src.shared.Constants import SEISMOMETER_ID_VERTICAL_PENDULUM
+
+SCALE_FACTOR = 16
+
+
+class RailAdc(object):
+    # Codes at both ends of a 12 bit range between valid ones
+    def read_adc_block(self, channel: int, count: int, interval_us: int) -> numpy.ndarray:
+        return numpy.tile(numpy.array([2048, 0, 1, 4094, 4095, 4095], dtype=numpy.int64), count // 6)
+
+
+def test_reads_at_either_end_of_the_range_are_counted_as_clipped(monkeypatch):
+    monkeypatch.setenv('SPI_BACKEND', SPI_BACKEND_SIMULATED)
+    adc = AdcWrapper(AdcConfig(SEISMOMETER_ID_VERTICAL_PENDULUM, False))
+    adc.adc = RailAdc()
+    statistics = StreamingStatistics(10, invalid_value=-SCALE_FACTOR)
+    statistics.add_batch(adc.read_coil_block(600, 1000) * SCALE_FACTOR)
+    assert statistics.clipped_samples == 300
+    assert statistics.get_stats()['clipped_samples'] == 300
+
+
+def test_rolling_average_weighs_the_newest_batch_most():
+    statistics = StreamingStatistics(3, invalid_value=-SCALE_FACTOR)
+    expected = [
+        # 10 / 2 / (1/2)
+        10,
+        # (20/2 + 10/3) / (1/2 + 1/3)
+        16,
+        # (40/2 + 20/3 + 10/4) / (1/2 + 1/3 + 1/4)
+        350 / 13,
+        # The first batch has left the window: (80/2 + 40/3 + 20/4) / (1/2 + 1/3 + 1/4)
+        700 / 13
+    ]
+    for batch, average in zip([[5, 15], [20, 20], [30, 50], [70, 90]], expected):
+        statistics.add_batch(numpy.array(batch))
+        assert statistics.get_average() == pytest.approx(average)
+    assert statistics.rolling_min == 20
+    assert statistics.rolling_max == 90
@@ -0,0 +1,54 @@
+import json
+
+import numpy
+import pytest
+
+from src.shared.uplink_frame import UPLINK_FLAG_REPLAY, InvalidUplinkFrame, UplinkFrame
+
+STATS = {'bias_point': None, 'batch_avg': 16388.9, 'clipped_samples': 0, 'metrics': {'logger_frames': 3}}
+
+
+def _frame(values, flags: int = 0) -> UplinkFrame:
+    return UplinkFrame(sequence_number=2 ** 32 - 1, starttime=1709251200.0333333, sampling_rate=30,
+                       values=numpy.array(values, dtype='int32'), stats=STATS, flags=flags)
+
+
+def _assert_equal(decoded: UplinkFrame, frame: UplinkFrame) -> None:
+    assert decoded.sequence_number == frame.sequence_number
+    assert decoded.starttime == frame.starttime
+    assert decoded.sampling_rate == frame.sampling_rate
+    assert decoded.stats == frame.stats
+    assert decoded.flags == frame.flags
+    numpy.testing.assert_array_equal(decoded.values, frame.values)
+
+
+@pytest.mark.parametrize('values, itemsize', [([], 2), ([-32768, 0, 32767], 2), ([-32769, 5, 40000], 4),
+                                              (list(range(-70000, 70000, 7)), 4)])
+@pytest.mark.parametrize('flags', [0, UPLINK_FLAG_REPLAY])
+def test_binary_round_trip(values, itemsize: int, flags: int):
+    frame = _frame(values, flags)
+    message = frame.to_bytes()
+    decoded = UplinkFrame.from_bytes(message)
+    _assert_equal(decoded, frame)
+    assert decoded.values.itemsize == itemsize
+    # The samples are aligned in the message, so they are used without a copy
+    assert decoded.values.ctypes.data % itemsize == 0 or len(values) == 0
+
+
+@pytest.mark.parametrize('flags', [0, UPLINK_FLAG_REPLAY])
+def test_json_round_trip(flags: int):
+    frame = _frame([-40000, 0, 12, 40000], flags)
+    _assert_equal(UplinkFrame.from_json(frame.to_json()), frame)
+
+
+def test_json_from_older_loggers():
+    frame = UplinkFrame.from_json(json.dumps({'values': [1, 2, 3], 'stats': {'decimated_sampling_rate': 30}}))
+    assert (frame.sequence_number, frame.starttime, frame.sampling_rate, frame.flags) == (0, 0.0, 30, 0)
+    numpy.testing.assert_array_equal(frame.values, [1, 2, 3])
+
+
+@pytest.mark.parametrize('corrupt', [lambda message: message[:10], lambda message: b'XXXX' + message[4:],
+                                     lambda message: message[:-1], lambda message: message + b'\0\0'])
+def test_invalid_binary_frames_are_rejected(corrupt):
+    with pytest.raises(InvalidUplinkFrame):
+        UplinkFrame.from_bytes(corrupt(_frame([1, 2, 3]).to_bytes()))
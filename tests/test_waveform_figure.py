@@ -0,0 +1,30 @@
+from pathlib import Path
+
+import numpy
+from matplotlib.image import imread
+from obspy import Stream, Trace, UTCDateTime
+
+from src.server.waveform_figure import WaveformFigure
+
+SIZE = (800, 250)
+DPI = 100
+
+
+def test_render_draws_the_window_with_date_ticks(tmp_path: Path):
+    starttime = UTCDateTime(2024, 3, 1, 12)
+    trace = Trace(data=(numpy.sin(numpy.arange(20 * 60 * 30) / 30) * 1000).astype('int32'),
+                  header={'network': 'XX', 'station': 'TEST', 'channel': 'BHZ', 'sampling_rate': 30,
+                          'starttime': starttime})
+    figure = WaveformFigure(SIZE, DPI)
+    # The same figure is drawn again for the next window
+    for minutes in [0, 10]:
+        outfile = tmp_path / ('window_%d.png' % minutes)
+        figure.render(Stream([trace]), 'k', starttime + minutes * 60, starttime + (minutes + 10) * 60, outfile,
+                      'png')
+        assert imread(str(outfile)).shape[:2] == (SIZE[1], SIZE[0])
+
+    assert figure.title.get_text() == '2024-03-01T12:10:00  -  2024-03-01T12:20:00'
+    assert figure.label.get_text() == 'XX.TEST..BHZ'
+    labels = [label.get_text() for label in figure.axes.get_xticklabels()]
+    assert len(labels) >= 3
+    assert all(label.startswith('12:') for label in labels)
@@ -0,0 +1,36 @@
+from urllib.parse import parse_qs
+
+import pytest
+
+from src.server.history_cache import HISTORY_CACHE_SECONDS
+from src.server.server_request_handler import DEFAULT_HISTORY_LENGTH, WebClientParams
+from src.shared.downlink_frame import DOWNLINK_FORMAT_BINARY, DOWNLINK_FORMAT_DELTA, DOWNLINK_FORMAT_JSON
+
+
+def _params(query: str) -> WebClientParams:
+    return WebClientParams.from_query(parse_qs(query))
+
+
+def test_defaults():
+    assert _params('seismometer_id=lehman') == WebClientParams(DEFAULT_HISTORY_LENGTH, None, DOWNLINK_FORMAT_JSON, True)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('history_length=60', WebClientParams(60, None, DOWNLINK_FORMAT_JSON, True)),
+    ('history_length=%d' % (HISTORY_CACHE_SECONDS * 10), WebClientParams(HISTORY_CACHE_SECONDS, None,
+                                                                          DOWNLINK_FORMAT_JSON, True)),
+    ('rate=30', WebClientParams(DEFAULT_HISTORY_LENGTH, None, DOWNLINK_FORMAT_JSON, True)),
+    ('rate=10', WebClientParams(DEFAULT_HISTORY_LENGTH, 10, DOWNLINK_FORMAT_JSON, True)),
+    ('rate=1&format=delta', WebClientParams(DEFAULT_HISTORY_LENGTH, 1, DOWNLINK_FORMAT_DELTA, True)),
+    ('format=binary&compression=none', WebClientParams(DEFAULT_HISTORY_LENGTH, None, DOWNLINK_FORMAT_BINARY, False)),
+])
+def test_valid_queries(query: str, expected: WebClientParams):
+    assert _params(query) == expected
+
+
+@pytest.mark.parametrize('query', ['history_length=0', 'history_length=-5', 'history_length=abc',
+                                   'rate=0', 'rate=7', 'rate=60', 'rate=-10', 'rate=1.5',
+                                   'format=xml', 'format=JSON', 'compression=gzip'])
+def test_invalid_queries(query: str):
+    with pytest.raises(ValueError):
+        _params(query)